@@ -0,0 +1,172 @@
+"""Peak memory of uploading files of growing size
+
+Uploads `--files` files of each size at once, like that many upload workers,
+to a local S3 stand-in, each size in a fresh process, and reports that
+process's peak resident memory before and after the uploads. With parts read
+into buffers from the memory budget, the peak should stay flat however large
+the files are and however many are uploaded at once. The default config is
+always run, and the benchmark fails if any config's memory grows by more
+than its budget plus `--rss-slack-mb` for the client and threads.
+
+    python -m benchmarks.memory_benchmark --sizes-mb 64 256 1024 \\
+        --config '{"memoryBudgetMb": 32}'
+"""
+
+import argparse
+from contextlib import redirect_stdout
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from benchmarks.s3_stand_in import S3StandIn
+from benchmarks.upload_benchmark import MB, format_value, get_peak_rss, parse_config
+
+
+def upload_files(endpoint_url: str, config: dict, size: int, file_count: int) -> dict:
+    """Upload `file_count` files of `size` bytes at once. Runs in its own process"""
+    import main
+    from services.upload_journal import UploadJournal
+
+    account = {
+        "awsAccessKeyId": "benchmark",
+        "awsSecretAccessKey": "benchmark",
+        "bucket": "benchmark",
+        "endpointUrl": endpoint_url,
+        **config,
+    }
+    with tempfile.TemporaryDirectory() as directory, redirect_stdout(open(os.devnull, "w")):
+        file_paths = [os.path.join(directory, f"mosaic{index}.tif") for index in range(file_count)]
+        for file_path in file_paths:
+            with open(file_path, "wb") as file:
+                # Sparse, so writing it doesn't count towards the upload's memory
+                file.truncate(size)
+
+        journal = UploadJournal(directory)
+        file_manager = main.create_s3_file_manager(account)
+        file_manager.multipart_store = journal
+        file_manager.warm_up()
+        rss_before = get_peak_rss()
+
+        started_at = time.monotonic()
+        uploads = [
+            threading.Thread(
+                target=file_manager.upload_file,
+                args=(file_path, f"IMAGERY/{os.path.basename(file_path)}", "image"),
+            )
+            for file_path in file_paths
+        ]
+        for upload in uploads:
+            upload.start()
+        for upload in uploads:
+            upload.join()
+        duration = time.monotonic() - started_at
+        journal.close()
+
+    return {
+        "rss_before": rss_before,
+        "peak_rss": get_peak_rss(),
+        "budget": file_manager.memory_budget.max_bytes,
+        "budget_peak": file_manager.memory_budget.peak,
+        "duration": duration,
+    }
+
+
+def run_size(config: dict, size_mb: float, file_count: int) -> dict:
+    with S3StandIn() as stand_in:
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            run = pool.apply(
+                upload_files, (stand_in.endpoint_url, config, int(size_mb * MB), file_count)
+            )
+        committed = len(stand_in.objects) == file_count
+
+    return {
+        "config": config,
+        "files": file_count,
+        "size_mb": size_mb,
+        "committed": committed,
+        "rss_before_mb": run["rss_before"] / MB if run["rss_before"] else None,
+        "peak_rss_mb": run["peak_rss"] / MB if run["peak_rss"] else None,
+        "budget_mb": run["budget"] / MB,
+        "budget_peak_mb": run["budget_peak"] / MB,
+        "duration": run["duration"],
+    }
+
+
+def check_bound(result: dict, slack_mb: float) -> Optional[str]:
+    """Why a result's memory wasn't bounded by its budget, or None if it was"""
+    if result["budget_peak_mb"] > result["budget_mb"]:
+        return f"held {result['budget_peak_mb']:.2f} MB, over its {result['budget_mb']:g} MB budget"
+    if result["peak_rss_mb"] and result["rss_before_mb"]:
+        growth = result["peak_rss_mb"] - result["rss_before_mb"]
+        if growth > result["budget_mb"] + slack_mb:
+            return f"grew by {growth:.2f} MB, over its {result['budget_mb']:g} MB budget and {slack_mb:g} MB of slack"
+    return None
+
+
+def print_results(results: List[dict]) -> None:
+    print(f"{'config':<30} {'files':>5} {'size MB':>8} {'budget MB':>10} {'RSS before':>11} {'peak RSS':>9} {'time':>8}")
+    for result in results:
+        print(
+            f"{json.dumps(result['config']):<30.30} "
+            f"{result['files']:>5} "
+            f"{result['size_mb']:>8g} "
+            f"{format_value(result['budget_peak_mb']):>10} "
+            f"{format_value(result['rss_before_mb']):>11} "
+            f"{format_value(result['peak_rss_mb']):>9} "
+            f"{format_value(result['duration'], 's'):>8}"
+            + ("" if result["committed"] else "  not committed")
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes-mb", type=float, nargs="+", default=[64, 256, 1024], help="file sizes to upload"
+    )
+    parser.add_argument(
+        "--files", type=int, default=4, help="files of each size uploaded at once"
+    )
+    parser.add_argument(
+        "--config",
+        type=parse_config,
+        action="append",
+        help="account settings to benchmark, as JSON or a JSON file. Repeat to compare configs",
+    )
+    parser.add_argument(
+        "--rss-slack-mb",
+        type=float,
+        default=64,
+        help="memory growth allowed on top of the budget, for the S3 client and upload threads",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = []
+    configs = [{}] + [config for config in args.config or [] if config]
+    for config in configs:
+        for size_mb in args.sizes_mb:
+            print(f"Uploading {args.files} files of {size_mb:g} MB with {json.dumps(config)}")
+            results.append(run_size(config, size_mb, args.files))
+    print()
+    print_results(results)
+
+    failures = [
+        f"{json.dumps(result['config'])} with {result['size_mb']:g} MB files {reason}"
+        for result in results
+        for reason in [check_bound(result, args.rss_slack_mb)]
+        if reason
+    ]
+    for failure in failures:
+        print(failure)
+    return 0 if all(result["committed"] for result in results) and not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
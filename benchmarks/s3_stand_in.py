@@ -0,0 +1,310 @@
+"""Minimal S3 compatible server for benchmarks, with injectable network conditions
+
+Implements just the requests the uploader makes (HeadBucket, PutObject, the
+multipart upload calls and ListObjectsV2) for any bucket, over plain HTTP on
+localhost. Object contents are discarded unless `keep_data` is set; the size
+and the time each object was committed are always recorded.
+"""
+
+from dataclasses import dataclass
+import base64
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, unquote, urlparse
+import uuid
+from xml.sax.saxutils import escape
+
+from services.bandwidth_limiter import TokenBucket, kbps_to_bytes_per_second
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class StoredObject:
+    size: int
+    etag: str
+    committed_at: float
+    data: Optional[bytes] = None
+    # Value of the x-amz-checksum-sha256 header it was uploaded with
+    checksum_sha256: Optional[str] = None
+
+
+class S3StandIn:
+    """S3 stand-in running on a background thread
+
+    `latency` seconds are added before every response, request bodies are read
+    at no more than `bandwidth_kbps` shared by all connections, and each
+    request has a `loss_rate` chance of the connection being dropped part way
+    through and an `error_rate` chance of a 503 response.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0,
+        bandwidth_kbps: Optional[float] = None,
+        loss_rate: float = 0,
+        error_rate: float = 0,
+        keep_data: bool = False,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.bandwidth = (
+            TokenBucket(kbps_to_bytes_per_second(bandwidth_kbps)) if bandwidth_kbps else None
+        )
+        self.loss_rate = loss_rate
+        self.error_rate = error_rate
+        self.keep_data = keep_data
+        self.random = random.Random(seed)
+
+        self.objects: Dict[str, StoredObject] = {}
+        # Part contents, or only their sizes and MD5s unless `keep_data` is set
+        self.multipart_uploads: Dict[str, Dict[int, Union[bytes, Tuple[int, bytes]]]] = {}
+        self.request_count = 0
+        self.dropped_count = 0
+        self.error_count = 0
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "S3StandIn":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="s3-stand-in", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "S3StandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    def _commit(
+        self, key: str, data: Optional[bytes], etag: str, checksum_sha256: Optional[str] = None, size: Optional[int] = None
+    ) -> None:
+        with self._lock:
+            self.objects[key] = StoredObject(
+                len(data) if size is None else size, etag, time.time(), data if self.keep_data else None, checksum_sha256
+            )
+
+
+class _DroppedConnection(Exception):
+    pass
+
+
+def _make_handler(stand_in: S3StandIn):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 so botocore keeps connections open and `Expect: 100-continue` works
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+        def _parse(self):
+            url = urlparse(self.path)
+            bucket, _, key = url.path.lstrip("/").partition("/")
+            query = {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+            return bucket, unquote(key), query
+
+        def _read_body(self, drop: bool) -> bytes:
+            remaining = int(self.headers.get("Content-Length") or 0)
+            drop_after = stand_in.random.randint(0, remaining) if drop else None
+            chunks = []
+            while remaining:
+                size = min(READ_CHUNK_SIZE, remaining)
+                if stand_in.bandwidth:
+                    stand_in.bandwidth.consume(size)
+                chunk = self.rfile.read(size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+                if drop_after is not None and remaining <= drop_after:
+                    raise _DroppedConnection()
+            return b"".join(chunks)
+
+        def _respond(self, status: int, body: bytes = b"", headers: Optional[dict] = None) -> None:
+            if stand_in.latency:
+                time.sleep(stand_in.latency)
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if body:
+                self.send_header("Content-Type", "application/xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body and self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _error(self, status: int, code: str) -> None:
+            self._respond(
+                status,
+                f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>{code}</Code><Message>{code}</Message></Error>".encode(),
+            )
+
+        def _handle(self, operation) -> None:
+            with stand_in._lock:
+                stand_in.request_count += 1
+            drop = stand_in._roll(stand_in.loss_rate)
+            try:
+                body = self._read_body(drop)
+            except _DroppedConnection:
+                with stand_in._lock:
+                    stand_in.dropped_count += 1
+                self.close_connection = True
+                return
+            if stand_in._roll(stand_in.error_rate):
+                with stand_in._lock:
+                    stand_in.error_count += 1
+                self._error(503, "SlowDown")
+                return
+            if not self._checksums_match(body):
+                self._error(400, "BadDigest")
+                return
+            operation(*self._parse(), body)
+
+        def _checksums_match(self, body: bytes) -> bool:
+            """Checks the Content-MD5 and SHA-256 checksum headers, like S3 does"""
+            expected = {
+                hashlib.md5: self.headers.get("Content-MD5"),
+                hashlib.sha256: self.headers.get("x-amz-checksum-sha256"),
+            }
+            return all(
+                base64.b64encode(digest(body).digest()).decode() == value
+                for digest, value in expected.items()
+                if value
+            )
+
+        def do_HEAD(self) -> None:
+            def head(bucket, key, query, body):
+                if not key:
+                    self._respond(200)
+                elif key in stand_in.objects:
+                    stored = stand_in.objects[key]
+                    self._respond(200, headers={"ETag": stored.etag, "Content-Length": stored.size})
+                else:
+                    self._respond(404)
+
+            self._handle(head)
+
+        def do_GET(self) -> None:
+            def get(bucket, key, query, body):
+                if key:
+                    stored = stand_in.objects.get(key)
+                    if stored is None:
+                        self._error(404, "NoSuchKey")
+                    else:
+                        self._respond(200, stored.data or b"", {"ETag": stored.etag})
+                    return
+
+                prefix = query.get("prefix", "")
+                with stand_in._lock:
+                    matches = sorted(
+                        (key, stored) for key, stored in stand_in.objects.items() if key.startswith(prefix)
+                    )
+                contents = "".join(
+                    f"<Contents><Key>{escape(key)}</Key><Size>{stored.size}</Size><ETag>{escape(stored.etag)}</ETag></Contents>"
+                    for key, stored in matches
+                )
+                self._respond(
+                    200,
+                    (
+                        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+                        f"<ListBucketResult><Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>"
+                        f"<KeyCount>{len(matches)}</KeyCount><IsTruncated>false</IsTruncated>{contents}</ListBucketResult>"
+                    ).encode(),
+                )
+
+            self._handle(get)
+
+        def do_PUT(self) -> None:
+            def put(bucket, key, query, body):
+                etag = f"\"{hashlib.md5(body).hexdigest()}\""
+                if "uploadId" in query:
+                    parts = stand_in.multipart_uploads.get(query["uploadId"])
+                    if parts is None:
+                        self._error(404, "NoSuchUpload")
+                        return
+                    parts[int(query["partNumber"])] = (
+                        body if stand_in.keep_data else (len(body), hashlib.md5(body).digest())
+                    )
+                else:
+                    stand_in._commit(key, body, etag, self.headers.get("x-amz-checksum-sha256"))
+                self._respond(200, headers={"ETag": etag})
+
+            self._handle(put)
+
+        def do_POST(self) -> None:
+            def post(bucket, key, query, body):
+                if "uploads" in query:
+                    upload_id = uuid.uuid4().hex
+                    with stand_in._lock:
+                        stand_in.multipart_uploads[upload_id] = {}
+                    self._respond(
+                        200,
+                        (
+                            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+                            f"<InitiateMultipartUploadResult><Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>"
+                            f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+                        ).encode(),
+                    )
+                    return
+
+                with stand_in._lock:
+                    parts = stand_in.multipart_uploads.pop(query.get("uploadId"), None)
+                if parts is None:
+                    self._error(404, "NoSuchUpload")
+                    return
+                if stand_in.keep_data:
+                    data = b"".join(parts[number] for number in sorted(parts))
+                    etag = f"\"{hashlib.md5(data).hexdigest()}-{len(parts)}\""
+                    stand_in._commit(key, data, etag)
+                else:
+                    # S3's multipart ETag, the MD5 of the parts' MD5s
+                    digests = b"".join(parts[number][1] for number in sorted(parts))
+                    etag = f"\"{hashlib.md5(digests).hexdigest()}-{len(parts)}\""
+                    stand_in._commit(key, None, etag, size=sum(size for size, _ in parts.values()))
+                self._respond(
+                    200,
+                    (
+                        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+                        f"<CompleteMultipartUploadResult><Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>"
+                        f"<ETag>{escape(etag)}</ETag></CompleteMultipartUploadResult>"
+                    ).encode(),
+                )
+
+            self._handle(post)
+
+        def do_DELETE(self) -> None:
+            def delete(bucket, key, query, body):
+                with stand_in._lock:
+                    if "uploadId" in query:
+                        stand_in.multipart_uploads.pop(query["uploadId"], None)
+                    else:
+                        stand_in.objects.pop(key, None)
+                self._respond(204)
+
+            self._handle(delete)
+
+    return Handler
@@ -0,0 +1,130 @@
+"""Startup time and import cost of the app
+
+Imports main.py the way the app starts, in fresh processes, and reports the
+median time until the operator would see the first prompt, the modules that
+take longest to import (from `python -X importtime`), and any heavy
+dependency that was loaded before it is needed. boto3 should only be loaded
+once an S3 account is selected, and the watcher and image libraries once the
+mission is known.
+
+    python -m benchmarks.startup_benchmark --runs 10 --top 15
+
+Exits with an error when the median is over `--budget` seconds or a heavy
+dependency is imported at startup.
+"""
+
+import argparse
+from dataclasses import dataclass
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+# Well under the time one-file unpacking takes on the aircraft PCs, which comes on top
+STARTUP_BUDGET_SECONDS = 1.0
+
+# Dependencies only some runs need, loaded when they are used
+HEAVY_MODULES = ("boto3", "botocore", "s3transfer", "watchdog", "PIL", "zstandard")
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class ImportTime:
+    module: str
+    # Microseconds spent importing the module itself, and with everything it imported
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def run_python(code: str, *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        cwd=ROOT_DIRECTORY,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def measure_startup(module: str = "main", runs: int = 5) -> List[float]:
+    """Seconds taken by fresh interpreters to import `module`"""
+    # The first run writes the bytecode caches, which the app ships with
+    run_python(f"import {module}")
+    durations = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        run_python(f"import {module}")
+        durations.append(time.perf_counter() - started_at)
+    return durations
+
+
+def parse_importtime(output: str) -> List[ImportTime]:
+    """Import times from the stderr of `python -X importtime`"""
+    import_times = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        import_times.append(
+            ImportTime(
+                name.strip(),
+                int(self_us),
+                int(cumulative_us),
+                (len(name) - len(name.lstrip())) // 2,
+            )
+        )
+    return import_times
+
+
+def get_import_times(module: str = "main") -> List[ImportTime]:
+    return parse_importtime(run_python(f"import {module}", "-X", "importtime").stderr)
+
+
+def get_heavy_modules(module: str = "main") -> List[str]:
+    """Heavy dependencies loaded by importing `module`"""
+    loaded = run_python(f"import sys, {module}; print('\\n'.join(sys.modules))").stdout.split()
+    return sorted({name.split(".")[0] for name in loaded} & set(HEAVY_MODULES))
+
+
+def print_import_times(import_times: List[ImportTime], top: int) -> None:
+    print(f"{'module':<50} {'self ms':>8} {'total ms':>9}")
+    for import_time in sorted(import_times, key=lambda item: item.cumulative_us, reverse=True)[:top]:
+        print(
+            f"{'  ' * import_time.depth + import_time.module:<50.50} "
+            f"{import_time.self_us / 1000:>8.1f} "
+            f"{import_time.cumulative_us / 1000:>9.1f}"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main", help="module the app starts from")
+    parser.add_argument("--runs", type=int, default=10, help="fresh processes to time")
+    parser.add_argument("--top", type=int, default=20, help="slowest imports to list")
+    parser.add_argument(
+        "--budget", type=float, default=STARTUP_BUDGET_SECONDS, help="most seconds the median may take"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    print_import_times(get_import_times(args.module), args.top)
+
+    durations = measure_startup(args.module, args.runs)
+    median = statistics.median(durations)
+    print()
+    print(f"Startup: median {median:.3f}s, fastest {min(durations):.3f}s over {args.runs} runs (budget {args.budget:g}s)")
+
+    heavy_modules = get_heavy_modules(args.module)
+    if heavy_modules:
+        print(f"Loaded at startup: {', '.join(heavy_modules)}")
+    return 0 if median <= args.budget and not heavy_modules else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,450 @@
+"""End-to-end upload benchmark with synthetic sensor workloads
+
+Writes bursts of products into a scaffolded mission the way the sensors do,
+uploads them with the same pipeline main.py runs against a local S3 stand-in,
+and reports the latency from each file landing to its object being committed,
+throughput, and CPU and memory use for each config.
+
+    python -m benchmarks.upload_benchmark --latency-ms 50 --bandwidth-kbps 50000 \\
+        --config '{"uploadWorkers": 2}' --config '{"uploadWorkers": 8}'
+
+Each config is run in a fresh process so its peak memory is measured on its
+own. With `--engine async` too, each config is also uploaded through an
+AsyncStorageBackend on an event loop instead of the pipeline's worker threads.
+Save the results with --output and pass them as --baseline to a later run to
+fail when latency or throughput regress.
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import Future, wait
+from contextlib import redirect_stdout
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.s3_stand_in import S3StandIn
+
+KB = 1024
+MB = 1024 * KB
+
+MISSION_NAME = "BENCH"
+
+# How files are uploaded: the pipeline main.py runs, or asyncio tasks
+ENGINES = ("pipeline", "async")
+
+
+@dataclass
+class Stream:
+    """Products of one sensor, written in bursts"""
+
+    folder: str
+    extension: str
+    count: int
+    size: int
+    burst_size: int
+    interval: float
+
+
+# Scale 1 is roughly one busy minute of a fire mapping flight
+WORKLOADS: Dict[str, List[Stream]] = {
+    "eo": [Stream("images/EO", ".jpg", 300, 256 * KB, 50, 2)],
+    "ir": [Stream("images/IR", ".tif", 3, 96 * MB, 1, 5)],
+    "video": [Stream("videos", ".ts", 12, 16 * MB, 1, 2.5)],
+    "tactical": [Stream("tactical/Detection", ".kml", 20, 8 * KB, 1, 0.5)],
+}
+WORKLOADS["mixed"] = [stream for streams in list(WORKLOADS.values()) for stream in streams]
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest rank percentile, or None without values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def get_peak_rss() -> Optional[int]:
+    """Peak resident memory of this process in bytes, where it can be measured"""
+    try:
+        # Unlike ru_maxrss on Linux, not carried over from the process that spawned this one
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * KB
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes everywhere else
+    return peak if sys.platform == "darwin" else peak * KB
+
+
+def write_stream(stream: Stream, directory: str, scale: float, landed: Dict[str, float], lock: threading.Lock) -> None:
+    """Write a stream's products, recording when the file for each key finished landing"""
+    count = max(1, round(stream.count * scale))
+    size = max(1, round(stream.size * scale))
+    block = os.urandom(min(size, MB))
+    name = os.path.basename(stream.folder).lower()
+
+    for index in range(count):
+        file_path = os.path.join(directory, stream.folder, f"{name}_{index:05d}{stream.extension}")
+        with open(file_path, "wb") as file:
+            # A unique header keeps the contents from being deduplicated
+            file.write(os.urandom(16))
+            remaining = size
+            while remaining > 0:
+                remaining -= file.write(block[:remaining])
+        landed_at = time.time()
+        key = get_benchmark_product_and_key(file_path)[1]
+        with lock:
+            landed[key] = landed_at
+
+        if (index + 1) % stream.burst_size == 0:
+            time.sleep(stream.interval)
+
+
+def get_benchmark_product_and_key(file_path: str):
+    """Product and key for a file, with the file name in the key
+
+    Products landing in the same second map to the same key in production, so
+    the file name is added to measure every file on its own.
+    """
+    import main
+
+    product, key = main.get_product_and_key(file_path, MISSION_NAME)
+    root, extension = os.path.splitext(key)
+    return product, f"{root}_{os.path.splitext(os.path.basename(file_path))[0]}{extension}"
+
+
+class AsyncUploads:
+    """Uploads completed files as tasks on an event loop thread
+
+    The asyncio counterpart of the pipeline's upload queue and worker threads,
+    with the same `uploadWorkers` uploads at once, but no journal, retries or
+    priorities.
+    """
+
+    def __init__(self, backend, max_concurrency: int) -> None:
+        from services.storage_backend import AsyncStorageBackend
+
+        self.backend = AsyncStorageBackend(backend, max_concurrency)
+        self.loop = asyncio.new_event_loop()
+        self.finished = 0
+        self.failed = 0
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-uploads", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def queue_products(self, file_paths: List[str]) -> None:
+        for file_path in file_paths:
+            product, key = get_benchmark_product_and_key(file_path)
+            future = asyncio.run_coroutine_threadsafe(
+                self.backend.upload_file(file_path, key, product.type), self.loop
+            )
+            future.add_done_callback(self._done)
+            with self._lock:
+                self._futures.append(future)
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self.finished += 1
+            self.failed += int(future.exception() is not None)
+
+    def stop(self) -> None:
+        """Wait for the uploads started so far and stop the event loop"""
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+def run_workload(
+    endpoint_url: str,
+    config: dict,
+    workload: str,
+    scale: float,
+    timeout: float,
+    verbose: bool,
+    engine: str = "pipeline",
+) -> dict:
+    """Upload a workload with a config. Runs in its own process"""
+    import main
+    from services.mission_watcher import MissionWatcher
+    from services.upload_journal import DONE, FAILED
+    from services.upload_pipeline import UploadPipeline
+
+    account = {
+        "awsAccessKeyId": "benchmark",
+        "awsSecretAccessKey": "benchmark",
+        "bucket": "benchmark",
+        "endpointUrl": endpoint_url,
+        **config,
+    }
+    landed: Dict[str, float] = {}
+    lock = threading.Lock()
+
+    with tempfile.TemporaryDirectory() as root_directory, redirect_stdout(
+        sys.stdout if verbose else open(os.devnull, "w")
+    ):
+        main.root_directory = root_directory
+        mission_base_path = main.create_mission_scaffolding(
+            MISSION_NAME, datetime.now(timezone.utc)
+        )
+
+        file_manager = main.create_s3_file_manager(account)
+        file_manager.warm_up()
+        if engine == "async":
+            uploads = AsyncUploads(file_manager, int(account.get("uploadWorkers", 4)))
+            watcher = MissionWatcher(mission_base_path, uploads.queue_products, account)
+        else:
+            pipeline = UploadPipeline(
+                account, file_manager, MISSION_NAME, mission_base_path, get_benchmark_product_and_key
+            )
+
+        started_at = time.time()
+        cpu_started_at = time.process_time()
+        if engine == "async":
+            uploads.start()
+            watcher.start()
+        else:
+            pipeline.start()
+
+        writers = [
+            threading.Thread(
+                target=write_stream, args=(stream, mission_base_path, scale, landed, lock)
+            )
+            for stream in WORKLOADS[workload]
+        ]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+
+        def get_finished_count() -> int:
+            if engine == "async":
+                return uploads.finished
+            return len(pipeline.journal.get_paths(DONE, FAILED))
+
+        deadline = time.time() + timeout
+        while get_finished_count() < len(landed) and time.time() < deadline:
+            time.sleep(0.1)
+
+        if engine == "async":
+            watcher.stop()
+            uploads.stop()
+            failed_count = uploads.failed
+        else:
+            pipeline.stop_watching()
+            pipeline.drain()
+            failed_count = len(pipeline.journal.get_failed_uploads())
+            pipeline.close()
+        cpu_seconds = time.process_time() - cpu_started_at
+
+    return {
+        "landed": landed,
+        "started_at": started_at,
+        "failed": failed_count,
+        "cpu_seconds": cpu_seconds,
+        "peak_rss": get_peak_rss(),
+    }
+
+
+def run_config(args: argparse.Namespace, config: dict, engine: str = "pipeline") -> dict:
+    """Benchmark one config with one engine against a fresh stand-in and summarize the results"""
+    with S3StandIn(
+        latency=args.latency_ms / 1000,
+        bandwidth_kbps=args.bandwidth_kbps,
+        loss_rate=args.loss_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    ) as stand_in:
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            run = pool.apply(
+                run_workload,
+                (
+                    stand_in.endpoint_url,
+                    config,
+                    args.workload,
+                    args.scale,
+                    args.timeout,
+                    args.verbose,
+                    engine,
+                ),
+            )
+        objects = dict(stand_in.objects)
+        request_count = stand_in.request_count
+
+    committed = {key: objects[key] for key in run["landed"] if key in objects}
+    latencies = [
+        committed[key].committed_at - landed_at
+        for key, landed_at in run["landed"].items()
+        if key in committed
+    ]
+    total_bytes = sum(stored.size for stored in committed.values())
+    duration = (
+        max(stored.committed_at for stored in committed.values()) - run["started_at"]
+        if committed
+        else 0
+    )
+
+    return {
+        "config": config,
+        "engine": engine,
+        "files": len(run["landed"]),
+        "committed": len(committed),
+        "failed": run["failed"],
+        "requests": request_count,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "throughput_mbps": total_bytes / MB / duration if duration else None,
+        "cpu_seconds": run["cpu_seconds"],
+        "peak_rss_mb": run["peak_rss"] / MB if run["peak_rss"] else None,
+    }
+
+
+def format_value(value, suffix: str = "") -> str:
+    return "-" if value is None else f"{value:.2f}{suffix}"
+
+
+def print_results(results: List[dict]) -> None:
+    print(
+        f"{'config':<40} {'files':>11} {'p50':>8} {'p95':>8} {'p99':>8} {'MB/s':>8} {'CPU':>8} {'RSS MB':>8}"
+    )
+    for result in results:
+        print(
+            f"{get_label(result):<40.40} "
+            f"{result['committed']:>5}/{result['files']:<5} "
+            f"{format_value(result['p50'], 's'):>8} "
+            f"{format_value(result['p95'], 's'):>8} "
+            f"{format_value(result['p99'], 's'):>8} "
+            f"{format_value(result['throughput_mbps']):>8} "
+            f"{format_value(result['cpu_seconds'], 's'):>8} "
+            f"{format_value(result['peak_rss_mb']):>8}"
+        )
+
+
+def get_label(result: dict) -> str:
+    """Config of a result, with the engine unless it is the pipeline"""
+    engine = result.get("engine", "pipeline")
+    label = json.dumps(result["config"])
+    return label if engine == "pipeline" else f"{engine} {label}"
+
+
+def find_regressions(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """Descriptions of configs whose p95 latency or throughput got worse than the baseline"""
+
+    def get_id(result: dict) -> str:
+        return f"{result.get('engine', 'pipeline')} {json.dumps(result['config'], sort_keys=True)}"
+
+    baseline_by_config = {get_id(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_by_config.get(get_id(result))
+        if previous is None:
+            continue
+        label = get_label(result)
+        if result["committed"] < previous["committed"]:
+            regressions.append(f"{label}: {result['committed']} files committed, was {previous['committed']}")
+        if previous["p95"] and result["p95"] and result["p95"] > previous["p95"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 latency {result['p95']:.2f}s, was {previous['p95']:.2f}s")
+        if (
+            previous["throughput_mbps"]
+            and result["throughput_mbps"]
+            and result["throughput_mbps"] < previous["throughput_mbps"] * (1 - tolerance)
+        ):
+            regressions.append(
+                f"{label}: throughput {result['throughput_mbps']:.2f} MB/s, was {previous['throughput_mbps']:.2f} MB/s"
+            )
+    return regressions
+
+
+def parse_config(value: str) -> dict:
+    """Account settings from JSON text or a JSON file"""
+    if os.path.isfile(value):
+        with open(value) as file:
+            return json.load(file)
+    return json.loads(value)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="mixed")
+    parser.add_argument(
+        "--scale", type=float, default=1, help="multiplier for the number and size of files"
+    )
+    parser.add_argument(
+        "--config",
+        type=parse_config,
+        action="append",
+        help="account settings to benchmark, as JSON or a JSON file. Repeat to compare configs",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        action="append",
+        help="upload with the pipeline's worker threads or asyncio tasks, repeat to compare (default pipeline)",
+    )
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every response")
+    parser.add_argument("--bandwidth-kbps", type=float, help="link capacity, unlimited by default")
+    parser.add_argument(
+        "--loss-rate", type=float, default=0, help="chance of a request's connection being dropped"
+    )
+    parser.add_argument("--error-rate", type=float, default=0, help="chance of a 503 response")
+    parser.add_argument("--seed", type=int, help="seed for the injected losses and errors")
+    parser.add_argument(
+        "--timeout", type=float, default=600, help="seconds to wait for a workload to upload"
+    )
+    parser.add_argument("--output", help="write the results to a JSON file")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="fraction a result may be worse than the baseline"
+    )
+    parser.add_argument("--verbose", action="store_true", help="show the uploader's output")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = []
+    for config in args.config or [{}]:
+        for engine in args.engine or ["pipeline"]:
+            print(f"Running {args.workload} workload with {json.dumps(config)} ({engine})")
+            results.append(run_config(args, config, engine))
+    print()
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(results, json.load(file), args.tolerance)
+        if regressions:
+            print()
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,31 @@
 """Main file"""
 
+import argparse
 from datetime import datetime, timezone
+from functools import partial
+import multiprocessing
 from pathlib import Path
 import re
+import signal
 import sys
 import os
 import time
-from typing import Tuple
-from watchdog.observers import Observer
+from typing import List, Set, Tuple
 from models.product import Product
+from models.product_type import (
+    PRODUCT_TYPES,
+    get_product_type,
+    get_product_type_for_directory,
+)
+from services.bandwidth_limiter import BandwidthLimiter
+from services.compression import Compressor
 from services.config_manager import ConfigManager
-from services.file_watcher import FileWatcher
 from services.local_file_manager import LocalFileManager
-from services.s3_file_manager import S3FileManager
+from services.memory_budget import MemoryBudget
+from services.mission_manifest import get_mission_key
+from services.progress_reporter import ProgressReporter, StatusConsole
+from services.s3_file_manager import MB, S3FileManager
+from services.structured_log import configure_logging
 
 # If running from executable file, path is determined differently
 root_directory = os.path.dirname(
@@ -21,6 +34,11 @@ root_directory = os.path.dirname(
     else os.path.realpath(__file__)
 )
 
+# How often new mission folders are looked for when watching all missions
+MISSION_SCAN_SECONDS = 10
+# Most memory uploads hold file contents in unless memoryBudgetMb says otherwise
+DEFAULT_MEMORY_BUDGET = 64 * MB
+
 
 def get_mission_details(tail_number: str) -> Tuple[str, datetime]:
     """Get mission name and time from input"""
@@ -34,31 +52,13 @@ def get_mission_details(tail_number: str) -> Tuple[str, datetime]:
     else:
         print(f"Example mission name: {GREEN}AZ-ASF-FIRENAME-TAILNUMBER{RESET}")
     print(f"{GREEN}Enter Mission Name:{RESET}")
-    # Replace special characters in input with a dash
-    mission_name = re.sub(r"[^a-zA-Z0-9\s-]", "-", input().replace(" ", "-"))
-    if tail_number:
-        mission_name = f"{mission_name}-{tail_number}"
+    mission_name = input()
 
     print()
     print(f"{GREEN}Enter local time (format: YYYY-MM-DD HH:MM) [default now]:{RESET}")
     try:
-        mission_time = (
-            datetime.now()
-            .replace(second=0)
-            .replace(microsecond=0)
-            .astimezone(timezone.utc)
-            .replace(tzinfo=None)
-        )
-
-        # If input provided, use that instead of current time
-        if mission_time_input := input():
-            mission_time = (
-                datetime.strptime(mission_time_input, "%Y-%m-%d %H:%M")
-                .astimezone(timezone.utc)
-                .replace(tzinfo=None)
-            )
-
-        mission_name = mission_name.upper()
+        mission_time = parse_mission_time(input())
+        mission_name = normalize_mission_name(mission_name, tail_number)
     except ValueError:
         print("Invalid datetime provided")
         sys.exit(1)
@@ -67,6 +67,32 @@ def get_mission_details(tail_number: str) -> Tuple[str, datetime]:
     return mission_name, mission_time
 
 
+def normalize_mission_name(mission_name: str, tail_number: str | None) -> str:
+    """Mission name as used in keys and folder names, with the tail number appended"""
+    # Replace special characters in input with a dash
+    mission_name = re.sub(r"[^a-zA-Z0-9\s-]", "-", mission_name.replace(" ", "-"))
+    if tail_number:
+        mission_name = f"{mission_name}-{tail_number}"
+    return mission_name.upper()
+
+
+def parse_mission_time(mission_time_input: str | None) -> datetime:
+    """UTC mission time from a local YYYY-MM-DD HH:MM time, or now if none is given"""
+    if mission_time_input:
+        return (
+            datetime.strptime(mission_time_input, "%Y-%m-%d %H:%M")
+            .astimezone(timezone.utc)
+            .replace(tzinfo=None)
+        )
+    return (
+        datetime.now()
+        .replace(second=0)
+        .replace(microsecond=0)
+        .astimezone(timezone.utc)
+        .replace(tzinfo=None)
+    )
+
+
 def mkdir_ignore_file_exist(file_path: str) -> None:
     """Creates a directory using a file path and ignores FileExistsError"""
     try:
@@ -75,6 +101,38 @@ def mkdir_ignore_file_exist(file_path: str) -> None:
         pass
 
 
+def get_mission_folder_name(mission_name: str, mission_time: datetime) -> str:
+    """Folder name of a mission, e.g. 2024-01-01T1000_NAME"""
+    return f"{mission_time.isoformat()[:-3].replace(':', '')}_{mission_name}"
+
+
+def parse_mission_folder_name(folder_name: str) -> Tuple[str, datetime] | None:
+    """Mission name and time from a mission folder name, or None if it isn't one"""
+    mission_time, separator, mission_name = folder_name.partition("_")
+    if not separator or not mission_name:
+        return None
+    try:
+        return mission_name, datetime.strptime(mission_time, "%Y-%m-%dT%H%M")
+    except ValueError:
+        return None
+
+
+def find_missions() -> List[Tuple[str, datetime, str]]:
+    """Name, time and path of every mission folder under missions/"""
+    missions_directory = os.path.join(root_directory, "missions")
+    try:
+        entries = sorted(os.scandir(missions_directory), key=lambda entry: entry.name)
+    except OSError:
+        return []
+
+    missions = []
+    for entry in entries:
+        mission = parse_mission_folder_name(entry.name) if entry.is_dir() else None
+        if mission:
+            missions.append((*mission, os.path.normpath(entry.path)))
+    return missions
+
+
 def create_mission_scaffolding(mission_name: str, mission_time: datetime) -> str:
     """Create mission folder scaffolding for upload. Returns the mission base path"""
 
@@ -82,27 +140,15 @@ def create_mission_scaffolding(mission_name: str, mission_time: datetime) -> str
     mission_base_path = os.path.join(
         root_directory,
         "missions",
-        f"{mission_time.isoformat()[:-3].replace(':', '')}_{mission_name}",
+        get_mission_folder_name(mission_name, mission_time),
     )
     mkdir_ignore_file_exist(mission_base_path)
 
-    mkdir_ignore_file_exist(os.path.join(mission_base_path, "images"))
-    mkdir_ignore_file_exist(os.path.join(mission_base_path, "images", "EO"))
-    mkdir_ignore_file_exist(os.path.join(mission_base_path, "images", "HS"))
-    mkdir_ignore_file_exist(os.path.join(mission_base_path, "images", "IR"))
-
-    mkdir_ignore_file_exist(os.path.join(mission_base_path, "tactical"))
-    mkdir_ignore_file_exist(os.path.join(mission_base_path, "tactical", "Detection"))
-    mkdir_ignore_file_exist(
-        os.path.join(mission_base_path, "tactical", "HeatPerimeter")
-    )
-    mkdir_ignore_file_exist(os.path.join(mission_base_path, "tactical", "IntenseHeat"))
-    mkdir_ignore_file_exist(os.path.join(mission_base_path, "tactical", "IsolatedHeat"))
-    mkdir_ignore_file_exist(
-        os.path.join(mission_base_path, "tactical", "ScatteredHeat")
-    )
-
-    mkdir_ignore_file_exist(os.path.join(mission_base_path, "videos"))
+    for product_type in PRODUCT_TYPES:
+        folder_path = mission_base_path
+        for folder in product_type.folder:
+            folder_path = os.path.join(folder_path, folder)
+            mkdir_ignore_file_exist(folder_path)
 
     return os.path.normpath(mission_base_path)
 
@@ -110,64 +156,74 @@ def create_mission_scaffolding(mission_name: str, mission_time: datetime) -> str
 def create_product_from_file_path(file_path: str) -> Product:
     """Takes in a file path and returns a Product"""
 
-    product = None
     last_modified_on = datetime.fromtimestamp(os.path.getmtime(file_path)).astimezone(
         timezone.utc
     )
 
-    folders_in_path = file_path.split(os.path.sep)
-    # We only want to check the mission path, without filename and user's path
-    mission_path = folders_in_path[folders_in_path.index("missions") + 2 : -1]
-
-    if "images" in mission_path:
-        if "EO" in mission_path:
-            product = Product("image", "EO", last_modified_on)
-        if "HS" in mission_path:
-            product = Product("image", "HS", last_modified_on)
-        if "IR" in mission_path:
-            product = Product("image", "IR", last_modified_on)
-    elif "tactical" in mission_path:
-        if "Detection" in mission_path:
-            product = Product("tactical", "Detection", last_modified_on)
-        if "HeatPerimeter" in mission_path:
-            product = Product("tactical", "HeatPerimeter", last_modified_on)
-        if "IntenseHeat" in mission_path:
-            product = Product("tactical", "IntenseHeat", last_modified_on)
-        if "IsolatedHeat" in mission_path:
-            product = Product("tactical", "IsolatedHeat", last_modified_on)
-        if "ScatteredHeat" in mission_path:
-            product = Product("tactical", "ScatteredHeat", last_modified_on)
-    elif "videos" in mission_path:
-        product = Product("video", None, last_modified_on)
-
-    if product is None:
+    product_type = get_product_type_for_directory(os.path.dirname(file_path))
+    if product_type is None:
         raise ValueError(f"Failed to map product: {os.path.basename(file_path)}")
 
-    return product
+    return Product(product_type.type, product_type.subtype, last_modified_on)
 
 
 def get_product_s3_key(mission_name: str, product: Product, file_extension: str) -> str:
-    folder = None
-    product_subtype = None
-
-    if product.type == "image":
-        folder = "IMAGERY"
-
-        if product.subtype == "EO":
-            product_subtype = "EOimage"
-        elif product.subtype == "HS":
-            product_subtype = "HSimage"
-        elif product.subtype == "IR":
-            product_subtype = "IRimage"
-
-    elif product.type == "tactical":
-        folder = "TACTICAL"
-        product_subtype = product.subtype
-    elif product.type == "video":
-        folder = "VIDEO"
-        product_subtype = "Video"
-
-    return f"{folder}/{product.timestamp.strftime('%Y%m%d_%H%M%SZ')}_{mission_name}_{product_subtype}{file_extension}"
+    product_type = get_product_type(product.type, product.subtype)
+    return f"{product_type.s3_folder}/{product.timestamp.strftime('%Y%m%d_%H%M%SZ')}_{mission_name}_{product_type.s3_suffix}{file_extension}"
+
+
+def get_product_and_key(
+    file_path: str, mission_name: str, folder: str | None = None
+) -> Tuple[Product, str]:
+    """Product for a file and the key to upload it as, with the vendor folder prefix"""
+    product = create_product_from_file_path(file_path)
+    key = get_product_s3_key(mission_name, product, os.path.splitext(file_path)[1])
+
+    # Add vendor prefix if specified
+    if folder:
+        key = f"{folder}/{key}"
+    return product, key
+
+
+def create_s3_file_manager(account: dict) -> S3FileManager:
+    """S3 file manager configured from an account's settings"""
+    part_size = int(float(account.get("multipartPartSizeMb", 16)) * MB)
+    part_concurrency = int(account.get("multipartConcurrency", 4))
+    worker_count = int(account.get("uploadWorkers", 4))
+    memory_budget_mb = account.get("memoryBudgetMb")
+    return S3FileManager(
+        account.get("awsAccessKeyId"),
+        account.get("awsSecretAccessKey"),
+        account.get("bucket"),
+        multipart_threshold=int(float(account.get("multipartThresholdMb", 64)) * MB),
+        part_size=part_size,
+        max_concurrency=part_concurrency,
+        bandwidth_limiter=BandwidthLimiter(
+            account.get("maxBandwidthKbps"),
+            account.get("productBandwidthKbps"),
+        ),
+        # Enough connections for every worker to upload all of its parts at once
+        max_pool_connections=int(
+            account.get("maxPoolConnections", worker_count * part_concurrency + 2)
+        ),
+        connect_timeout=float(account.get("connectTimeoutSeconds", 10)),
+        read_timeout=float(account.get("readTimeoutSeconds", 60)),
+        tcp_keepalive=bool(account.get("tcpKeepalive", True)),
+        endpoint_url=account.get("endpointUrl"),
+        checksums=bool(account.get("uploadChecksums", True)),
+        compressor=(
+            Compressor(account["compressProductTypes"])
+            if account.get("compressProductTypes")
+            else None
+        ),
+        # By default enough for every worker to hold all of its parts at once, up to a
+        # cap small machines can afford. Parts beyond it wait for room
+        memory_budget=MemoryBudget(
+            int(float(memory_budget_mb) * MB)
+            if memory_budget_mb is not None
+            else min(part_size * part_concurrency * worker_count, DEFAULT_MEMORY_BUDGET)
+        ),
+    )
 
 
 def get_account_selection(accounts):
@@ -236,71 +292,75 @@ def get_account_selection(accounts):
     return selected_account
 
 
-def main() -> None:
-    """Entry point"""
-    RESET = "\033[0m"  # Reset all formatting
+def get_fan_out_accounts(accounts):
+    """Every account in the config, each a destination for the mission's uploads"""
     GREEN = "\033[92m"  # Green text
+    RESET = "\033[0m"  # Reset all formatting
 
-    print("EGP Airborne DSA Edition - Version 1.0.0")
-    print("Visit https://egp.wildfire.gov for support.")
+    print(f"{GREEN}Uploading to every account:{RESET}")
+    for i, account in enumerate(accounts):
+        if account.get("storageMode", "remote") == "remote":
+            print(f"{i+1}. {account['name']} - S3 ({GREEN}Bucket:{RESET} {account.get('bucket', 'N/A')} {GREEN}Remote Folder:{RESET} {account.get('folder', 'N/A')})")
+        else:
+            print(f"{i+1}. {account['name']} - Local")
     print()
+    return accounts
 
-    # Setup
-    config = ConfigManager("config.json")
 
-    # Get accounts from config
-    accounts = config.get_accounts()
+def create_file_manager(account: dict):
+    """S3 or local file manager for an account, exiting if its credentials are missing"""
+    GREEN = "\033[92m"  # Green text
+    RESET = "\033[0m"  # Reset all formatting
 
-    # Have user select which account to use
-    selected_account = get_account_selection(accounts)
-
-    # Initialize the appropriate file manager based on the selected account
-    if selected_account.get("storageMode", "remote") == "remote":
-        # Ensure all required S3 credentials are present
-        if not all(
-            [
-                selected_account.get("awsAccessKeyId"),
-                selected_account.get("awsSecretAccessKey"),
-                selected_account.get("bucket"),
-            ]
-        ):
-            print(
-                "ERROR: Missing required S3 credentials in config. Check your config.json file."
-            )
-            print(f"Required fields: awsAccessKeyId, awsSecretAccessKey, bucket")
-            print(f"Available fields: {', '.join(selected_account.keys())}")
-            sys.exit(1)
+    if account.get("storageMode", "remote") != "remote":
+        return LocalFileManager(
+            account.get("localPath")
+            or os.path.join(root_directory, "local_storage")
+        )
 
-        # Initialize S3 file manager with account-specific bucket
-        file_manager = S3FileManager(
-            selected_account.get("awsAccessKeyId"),
-            selected_account.get("awsSecretAccessKey"),
-            selected_account.get("bucket"),
+    # Ensure all required S3 credentials are present
+    if not all(
+        [
+            account.get("awsAccessKeyId"),
+            account.get("awsSecretAccessKey"),
+            account.get("bucket"),
+        ]
+    ):
+        print(
+            "ERROR: Missing required S3 credentials in config. Check your config.json file."
         )
-        print(f"Initialized S3 file manager for bucket: {GREEN}{selected_account.get('bucket')}{RESET}")
-    else:
-        file_manager = LocalFileManager()
-        print("Using local file manager. Files will be stored locally.")
+        print(f"Required fields: awsAccessKeyId, awsSecretAccessKey, bucket")
+        print(f"Available fields: {', '.join(account.keys())}")
+        sys.exit(1)
+
+    # Initialize S3 file manager with account-specific bucket
+    file_manager = create_s3_file_manager(account)
+    file_manager.warm_up()
+    print(f"Initialized S3 file manager for bucket: {GREEN}{account.get('bucket')}{RESET}")
+    return file_manager
+
 
-    mission_name, mission_time = get_mission_details(selected_account.get('tailNumber'))
+def create_mission_file(
+    file_manager, account: dict, mission_name: str, mission_time: datetime, exit_on_error: bool = True
+) -> bool:
+    """Upload the empty file marking the start of a mission, exiting if it fails
+
+    Without `exit_on_error` a failure is printed and False returned instead.
+    """
+    GREEN = "\033[92m"  # Green text
+    RESET = "\033[0m"  # Reset all formatting
 
     # Create mission file with proper path prefix if vendor is specified
     try:
-        mission_file_key = (
-            f"MISSION/{mission_name}_{mission_time.strftime('%Y%m%d_%H%M')}Z.txt"
-        )
-
-        # Add vendor prefix if specified
-        if selected_account.get('folder'):
-            mission_file_key = f"{selected_account.get('folder')}/{mission_file_key}"
+        mission_file_key = get_mission_key(mission_name, mission_time, account.get("folder"))
 
         file_manager.upload_empty_file(mission_file_key)
 
         # Verify that we're using the correct file manager type
         file_manager_type = type(file_manager).__name__
-        if selected_account.get("storageMode", "remote") == "remote":
+        if account.get("storageMode", "remote") == "remote":
             print(
-                f"Created mission: {GREEN}{mission_name}{RESET} in S3 bucket: {GREEN}{selected_account.get('bucket')}{RESET}"
+                f"Created mission: {GREEN}{mission_name}{RESET} in S3 bucket: {GREEN}{account.get('bucket')}{RESET}"
             )
             print(f"Mission file path: {GREEN}{mission_file_key}{RESET}")
         else:
@@ -308,61 +368,278 @@ def main() -> None:
             print(f"Using file manager: {file_manager_type}")
     except Exception as error:
         print(f"Failed to create mission: {str(error)}")
+        if not exit_on_error:
+            return False
         sys.exit(1)
+    return True
+
+
+def watch_missions(
+    pipeline, account: dict, file_manager, missions: List[Tuple[str, datetime, str]], unmarked: Set[str]
+) -> None:
+    """Add the missions a pipeline isn't watching yet, uploading the file marking each one
+
+    A mission whose marker fails to upload, e.g. while offline, is watched
+    anyway and kept in `unmarked` so the next call tries the marker again.
+    """
+    for mission_name, mission_time, mission_base_path in missions:
+        watched = mission_base_path in pipeline.pipelines
+        if not watched or mission_base_path in unmarked:
+            if create_mission_file(file_manager, account, mission_name, mission_time, exit_on_error=False):
+                unmarked.discard(mission_base_path)
+            else:
+                unmarked.add(mission_base_path)
+        if not watched:
+            print(f"Setting up file monitoring for {mission_base_path}")
+            pipeline.add_mission(
+                mission_name,
+                mission_base_path,
+                partial(get_product_and_key, mission_name=mission_name, folder=account.get("folder")),
+                mission_time,
+            )
 
-    mission_base_path = create_mission_scaffolding(mission_name, mission_time)
 
-    # Handle new files
-    def upload_product(file_path: str) -> None:
-        try:
-            product = create_product_from_file_path(file_path)
-            key = get_product_s3_key(
-                mission_name, product, os.path.splitext(file_path)[1]
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    """Command line options for running without prompts"""
+    parser = argparse.ArgumentParser(description="Uploads airborne products from mission folders")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        default=None,
+        help="don't prompt for anything, e.g. when running as a service",
+    )
+    parser.add_argument("--account", help="name or number of the account to upload with")
+    parser.add_argument("--mission", help="name of the mission to create or resume")
+    parser.add_argument(
+        "--mission-time", help="mission local time as YYYY-MM-DD HH:MM (default now)"
+    )
+    parser.add_argument(
+        "--all-missions",
+        action="store_true",
+        default=None,
+        help="watch every mission folder under missions/, including ones created later",
+    )
+    return parser.parse_args(argv)
+
+
+def is_enabled(value) -> bool:
+    """Whether a flag from the command line, environment or config is turned on"""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def get_run_options(args: argparse.Namespace, config: ConfigManager) -> argparse.Namespace:
+    """Run options from the command line, then DSA_* environment variables, then config.json"""
+    for argument, variable, key in [
+        ("headless", "DSA_HEADLESS", "headless"),
+        ("account", "DSA_ACCOUNT", "account"),
+        ("mission", "DSA_MISSION", "mission"),
+        ("mission_time", "DSA_MISSION_TIME", "missionTime"),
+        ("all_missions", "DSA_ALL_MISSIONS", "watchAllMissions"),
+    ]:
+        if getattr(args, argument) is None:
+            setattr(args, argument, os.environ.get(variable, config.config.get(key)))
+
+    args.all_missions = is_enabled(args.all_missions)
+    # Giving a mission is enough to run without prompts
+    args.headless = is_enabled(args.headless) or bool(args.mission) or args.all_missions
+    return args
+
+
+def find_account(accounts, selection: str | None):
+    """Account by name or number, or the only account if none is given"""
+    if selection is None:
+        return accounts[0] if len(accounts) == 1 else None
+    selection = str(selection)
+    if selection.isdigit() and 0 < int(selection) <= len(accounts):
+        return accounts[int(selection) - 1]
+    for account in accounts:
+        if str(account.get("name", "")).lower() == selection.lower():
+            return account
+    return None
+
+
+def create_progress_reporter(account: dict, pipeline) -> ProgressReporter:
+    """Live status line on an interactive console, otherwise printed now and then"""
+    console = None
+    if is_enabled(account.get("progress", True)) and sys.stdout.isatty():
+        console = StatusConsole(sys.stdout)
+    return ProgressReporter(
+        pipeline.get_progress,
+        console=console,
+        file_path=account.get("progressFile"),
+        interval=float(account.get("progressIntervalSeconds", 1)),
+        log_interval=float(account.get("progressLogSeconds", 60)),
+    )
+
+
+def handle_terminate(signum, frame) -> None:
+    """Stop like Ctrl-C when a service manager asks the app to stop"""
+    raise KeyboardInterrupt
+
+
+def main(argv: List[str] | None = None) -> None:
+    """Entry point"""
+    GREEN = "\033[92m"  # Green text
+    RESET = "\033[0m"  # Reset all formatting
+
+    print("EGP Airborne DSA Edition - Version 1.0.0")
+    print("Visit https://egp.wildfire.gov for support.")
+    print()
+    signal.signal(signal.SIGTERM, handle_terminate)
+
+    # Setup
+    config = ConfigManager("config.json")
+    options = get_run_options(parse_args(argv), config)
+
+    # Get accounts from config
+    accounts = config.get_accounts()
+
+    # Have user select which account to use, unless uploading to all of them
+    if config.fan_out:
+        selected_accounts = get_fan_out_accounts(accounts)
+    elif options.headless:
+        account = find_account(accounts, options.account)
+        if account is None:
+            print(
+                "ERROR: Choose an account by name or number with --account, DSA_ACCOUNT or \"account\" in config.json."
             )
+            sys.exit(1)
+        print(f"{GREEN}Selected account:{RESET} {account.get('name')}")
+        selected_accounts = [account]
+    else:
+        selected_accounts = [get_account_selection(accounts)]
+    configure_logging(selected_accounts[0].get("logFile"))
 
-            # Add vendor prefix if specified
-            if selected_account.get('folder'):
-                key = f"{selected_account.get('folder')}/{key}"
+    if options.all_missions and len(selected_accounts) > 1:
+        print("ERROR: Watching all missions can't be combined with uploading to every account.")
+        sys.exit(1)
 
-            print(f"Uploading {os.path.basename(file_path)}")
-            try:
-                file_manager.upload_file(file_path, key)
+    # Initialize the appropriate file manager based on each selected account
+    file_managers = [create_file_manager(account) for account in selected_accounts]
 
-                if isinstance(file_manager, S3FileManager):
-                    print(
-                        f"Successfully uploaded {os.path.basename(file_path)} as {key} to bucket: {selected_account.get('bucket')}"
-                    )
-                else:
-                    print(
-                        f"Successfully processed {os.path.basename(file_path)} as {key} (local storage mode)"
-                    )
-            except Exception as upload_error:
-                print(
-                    f"Error uploading file {os.path.basename(file_path)}: {str(upload_error)}"
-                )
+    tail_number = selected_accounts[0].get("tailNumber")
+    missions = []
+    if not options.headless:
+        missions.append(get_mission_details(tail_number))
+    elif options.mission:
+        try:
+            mission_time = parse_mission_time(options.mission_time)
+        except ValueError:
+            print("Invalid datetime provided")
+            sys.exit(1)
+        missions.append((normalize_mission_name(options.mission, tail_number), mission_time))
+    elif not options.all_missions:
+        print("ERROR: Give a mission with --mission, DSA_MISSION or \"mission\" in config.json, or watch all missions.")
+        sys.exit(1)
 
-        except Exception as error:
-            print(error)
+    mission_paths = []
+    for mission_name, mission_time in missions:
+        for account, file_manager in zip(selected_accounts, file_managers):
+            create_mission_file(file_manager, account, mission_name, mission_time)
+        mission_paths.append(
+            (mission_name, mission_time, create_mission_scaffolding(mission_name, mission_time))
+        )
 
-    # Set up file monitoring for mission folder
-    print(f"Setting up file monitoring for {mission_base_path}")
-    file_watcher = FileWatcher(upload_product)
-    observer = Observer()
-    observer.schedule(file_watcher, mission_base_path, recursive=True)
-    observer.start()
+    # The pipelines bring in the watcher and the rest of the upload machinery,
+    # so they are loaded once the operator has answered the prompts
+    from services.fan_out_pipeline import FanOutPipeline
+    from services.multi_mission_pipeline import MultiMissionPipeline
+    from services.upload_pipeline import UploadPipeline
+
+    def get_mission_product_and_key(mission_name: str, account: dict):
+        return partial(get_product_and_key, mission_name=mission_name, folder=account.get("folder"))
+
+    # Missions found in the missions folder whose marker file hasn't been uploaded yet
+    unmarked_missions: Set[str] = set()
+    if options.all_missions:
+        pipeline = MultiMissionPipeline(selected_accounts[0], file_managers[0])
+        for mission_name, mission_time, mission_base_path in mission_paths:
+            print(f"Setting up file monitoring for {mission_base_path}")
+            pipeline.add_mission(
+                mission_name,
+                mission_base_path,
+                get_mission_product_and_key(mission_name, selected_accounts[0]),
+                mission_time,
+            )
+        # Missions from earlier runs are uploaded alongside, through the same workers
+        found_missions = [mission for mission in find_missions() if mission[2] not in pipeline.pipelines]
+        watch_missions(pipeline, selected_accounts[0], file_managers[0], found_missions, unmarked_missions)
+        mission_paths += found_missions
+    else:
+        # Set up file monitoring and uploading for mission folder
+        mission_name, mission_time, mission_base_path = mission_paths[0]
+        print(f"Setting up file monitoring for {mission_base_path}")
+        destinations = [
+            (account, file_manager, get_mission_product_and_key(mission_name, account))
+            for account, file_manager in zip(selected_accounts, file_managers)
+        ]
+        if len(destinations) > 1:
+            pipeline = FanOutPipeline(
+                destinations,
+                mission_name,
+                mission_base_path,
+                cache_bytes=int(float(config.config.get("fanOutCacheMb", 256)) * MB),
+                mission_time=mission_time,
+            )
+        else:
+            account, file_manager, get_destination_product_and_key = destinations[0]
+            pipeline = UploadPipeline(
+                account,
+                file_manager,
+                mission_name,
+                mission_base_path,
+                get_destination_product_and_key,
+                mission_time=mission_time,
+            )
+    pipeline.start()
+    progress_reporter = create_progress_reporter(selected_accounts[0], pipeline)
+    progress_reporter.start()
 
-    print(f"Watching for new files in ${mission_base_path}")
+    for _, _, mission_base_path in mission_paths:
+        print(f"Watching for new files in ${mission_base_path}")
     print()
 
     try:
+        last_scan = time.monotonic()
         while True:
             time.sleep(1)
+            if options.all_missions and time.monotonic() - last_scan >= MISSION_SCAN_SECONDS:
+                last_scan = time.monotonic()
+                watch_missions(
+                    pipeline, selected_accounts[0], file_managers[0], find_missions(), unmarked_missions
+                )
+    except KeyboardInterrupt:
+        pass
+    pipeline.stop_watching()
+
+    print(
+        f"Waiting for {pipeline.pending} queued uploads to finish ({pipeline.settling} files still being written and {pipeline.retrying} waiting to retry are skipped). Press Ctrl-C again to abort."
+    )
+    if pipeline.paused:
+        print("Uploads are paused until the connection is restored.")
+    try:
+        pipeline.drain()
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+        progress_reporter.stop()
+        print(
+            f"Aborted with {pipeline.pending} uploads still queued. They will resume on the next run of this mission."
+        )
+        return
+    progress_reporter.stop()
+
+    failed_uploads = pipeline.get_failed_uploads()
+    if failed_uploads:
+        print(f"{len(failed_uploads)} files could not be uploaded:")
+        for file_path, error in failed_uploads:
+            print(f"  {file_path}: {error}")
+    pipeline.close()
 
 
 if __name__ == "__main__":
+    # Image previews are generated in worker processes, which a PyInstaller build starts as itself
+    multiprocessing.freeze_support()
     try:
         main()
     except Exception as error:
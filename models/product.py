@@ -1,27 +1,27 @@
 from datetime import datetime
 
+from models.product_type import PRODUCT_SUBTYPES
+
 
 class Product:
+    """Immutable product type, subtype and timestamp"""
+
+    __slots__ = ("_type", "_subtype", "_timestamp")
+
     def __init__(self, type: str, subtype: str | None, timestamp: datetime) -> None:
-        if type not in ["image", "tactical", "video"]:
+        subtypes = PRODUCT_SUBTYPES.get(type)
+        if subtypes is None:
             raise ValueError(f"Invalid product type: {type}]")
-        self._type = type
-
-        if type == "image":
-            if subtype not in ["EO", "HS", "IR"]:
-                raise ValueError(f"Invalid image product subtype: {subtype}]")
-        elif type == "tactical":
-            if subtype not in [
-                "Detection",
-                "HeatPerimeter",
-                "IntenseHeat",
-                "IsolatedHeat",
-                "ScatteredHeat",
-            ]:
-                raise ValueError(f"Invalid tactical product subtype: {subtype}]")
-        self._subtype = subtype
-
-        self._timestamp = timestamp
+
+        if None not in subtypes and subtype not in subtypes:
+            raise ValueError(f"Invalid {type} product subtype: {subtype}]")
+
+        object.__setattr__(self, "_type", type)
+        object.__setattr__(self, "_subtype", subtype)
+        object.__setattr__(self, "_timestamp", timestamp)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("Product is immutable")
 
     @property
     def type(self) -> str:
@@ -48,3 +48,6 @@ class Product:
             and self._subtype == __value.subtype
             and self._timestamp == __value.timestamp
         )
+
+    def __hash__(self) -> int:
+        return hash((self._type, self._subtype, self._timestamp))
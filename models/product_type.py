@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from functools import lru_cache
+import os
+from typing import Dict, FrozenSet, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ProductType:
+    """Where a kind of product is written in a mission and how it is keyed in S3"""
+
+    folder: Tuple[str, ...]  # Folder within the mission
+    type: str
+    subtype: Optional[str]
+    s3_folder: str
+    s3_suffix: str
+
+
+# Adding a product folder only needs a new entry here
+PRODUCT_TYPES: Tuple[ProductType, ...] = (
+    ProductType(("images", "EO"), "image", "EO", "IMAGERY", "EOimage"),
+    ProductType(("images", "HS"), "image", "HS", "IMAGERY", "HSimage"),
+    ProductType(("images", "IR"), "image", "IR", "IMAGERY", "IRimage"),
+    ProductType(("tactical", "Detection"), "tactical", "Detection", "TACTICAL", "Detection"),
+    ProductType(("tactical", "HeatPerimeter"), "tactical", "HeatPerimeter", "TACTICAL", "HeatPerimeter"),
+    ProductType(("tactical", "IntenseHeat"), "tactical", "IntenseHeat", "TACTICAL", "IntenseHeat"),
+    ProductType(("tactical", "IsolatedHeat"), "tactical", "IsolatedHeat", "TACTICAL", "IsolatedHeat"),
+    ProductType(("tactical", "ScatteredHeat"), "tactical", "ScatteredHeat", "TACTICAL", "ScatteredHeat"),
+    ProductType(("videos",), "video", None, "VIDEO", "Video"),
+)
+
+PRODUCT_TYPES_BY_PRODUCT: Dict[Tuple[str, Optional[str]], ProductType] = {
+    (product_type.type, product_type.subtype): product_type for product_type in PRODUCT_TYPES
+}
+
+# Subtypes allowed for each type. Types without subtypes accept any
+PRODUCT_SUBTYPES: Dict[str, FrozenSet[Optional[str]]] = {
+    type: frozenset(
+        product_type.subtype for product_type in PRODUCT_TYPES if product_type.type == type
+    )
+    for type in dict.fromkeys(product_type.type for product_type in PRODUCT_TYPES)
+}
+
+S3_FOLDERS: Tuple[str, ...] = tuple(
+    dict.fromkeys(product_type.s3_folder for product_type in PRODUCT_TYPES)
+)
+
+# Top level mission folder -> its product types, in the order they are checked
+_PRODUCT_TYPES_BY_GROUP: Dict[str, Tuple[ProductType, ...]] = {
+    group: tuple(product_type for product_type in PRODUCT_TYPES if product_type.folder[0] == group)
+    for group in dict.fromkeys(product_type.folder[0] for product_type in PRODUCT_TYPES)
+}
+
+
+def get_product_type(type: str, subtype: Optional[str]) -> ProductType:
+    """Product type entry for a product. Types without subtypes match any subtype"""
+    return PRODUCT_TYPES_BY_PRODUCT.get((type, subtype)) or PRODUCT_TYPES_BY_PRODUCT[(type, None)]
+
+
+def classify_mission_folder(folders: Tuple[str, ...]) -> Optional[ProductType]:
+    """Product type of files in a folder, given as its path within the mission
+
+    The first top level product folder found decides the group, and among its
+    product types the last one whose subfolder appears in the path wins.
+    """
+    for group, product_types in _PRODUCT_TYPES_BY_GROUP.items():
+        if group not in folders:
+            continue
+        matched = None
+        for product_type in product_types:
+            if all(folder in folders for folder in product_type.folder[1:]):
+                matched = product_type
+        return matched
+    return None
+
+
+@lru_cache(maxsize=1024)
+def get_product_type_for_directory(directory: str) -> Optional[ProductType]:
+    """Product type of files in a directory under `missions/<mission>/`
+
+    Cached per directory, since every frame of a burst lands in the same one.
+    """
+    folders = directory.split(os.path.sep)
+    try:
+        # Only the folders within the mission, without the user's path
+        mission_folders = tuple(folders[folders.index("missions") + 2 :])
+    except ValueError:
+        return None
+    return classify_mission_folder(mission_folders)
@@ -0,0 +1,123 @@
+"""Adjusts upload concurrency and part size from measured throughput"""
+
+from contextlib import contextmanager
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+
+class AdaptiveConcurrency:
+    """Limits concurrent uploads and tunes the limit from measured results
+
+    Workers hold a slot for the duration of each upload and report how many
+    bytes it sent and whether it failed. Every `interval` seconds the limit is
+    adjusted additive increase / multiplicative decrease style: a window with
+    a high error rate halves concurrency and part size, a window whose
+    throughput improved while every slot was busy adds a slot (and restores
+    the part size from before the last decrease), and a window whose
+    throughput dropped after adding a slot takes it back.
+
+    The part size never grows past the one it started at unless
+    `grow_part_size` is set, in which case added slots double it up to
+    `max_part_size` once every decrease has been undone.
+    """
+
+    def __init__(
+        self,
+        min_concurrency: int = 1,
+        max_concurrency: int = 4,
+        min_part_size: int = 5 * 1024 * 1024,
+        max_part_size: int = 64 * 1024 * 1024,
+        part_size: int = 16 * 1024 * 1024,
+        interval: float = 30,
+        error_rate_threshold: float = 0.2,
+        on_part_size: Optional[Callable[[int], None]] = None,
+        grow_part_size: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_concurrency = max(min_concurrency, 1)
+        self.max_concurrency = max(max_concurrency, self.min_concurrency)
+        self.min_part_size = min_part_size
+        self.max_part_size = max(max_part_size, min_part_size)
+        self.part_size = min(max(part_size, min_part_size), self.max_part_size)
+        self.grow_part_size = grow_part_size
+        # Part sizes from before each decrease, restored in reverse order
+        self._part_sizes: List[int] = []
+        self.interval = interval
+        self.error_rate_threshold = error_rate_threshold
+        self.on_part_size = on_part_size
+        self.clock = clock
+
+        self.limit = self.max_concurrency
+        self._active = 0
+        self._busy = False
+        self._last_throughput: Optional[float] = None
+        self._last_increased = False
+        self._condition = threading.Condition()
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self._window_started_at = self.clock()
+        self._window_bytes = 0
+        self._window_uploads = 0
+        self._window_failures = 0
+        self._busy = self._active >= self.limit
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one of the concurrent upload slots"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+            if self._active >= self.limit:
+                self._busy = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify()
+
+    def record(self, bytes_sent: int, failed: bool = False) -> None:
+        """Report the result of an upload"""
+        with self._condition:
+            self._window_bytes += bytes_sent
+            self._window_uploads += 1
+            self._window_failures += int(failed)
+
+            elapsed = self.clock() - self._window_started_at
+            if elapsed >= self.interval:
+                self._adjust(elapsed)
+                self._reset_window()
+                self._condition.notify_all()
+
+    def _adjust(self, elapsed: float) -> None:
+        part_size = self.part_size
+        throughput = self._window_bytes / elapsed
+        error_rate = self._window_failures / max(self._window_uploads, 1)
+
+        if error_rate >= self.error_rate_threshold:
+            self.limit = max(self.min_concurrency, self.limit // 2)
+            if part_size > self.min_part_size:
+                self._part_sizes.append(part_size)
+                part_size = max(self.min_part_size, part_size // 2)
+            self._last_increased = False
+        elif self._last_throughput is not None and throughput < self._last_throughput * 0.9:
+            if self._last_increased:
+                self.limit = max(self.min_concurrency, self.limit - 1)
+            self._last_increased = False
+        elif self._busy and self.limit < self.max_concurrency:
+            self.limit += 1
+            if self._part_sizes:
+                part_size = self._part_sizes.pop()
+            elif self.grow_part_size:
+                part_size = min(self.max_part_size, part_size * 2)
+            self._last_increased = True
+        else:
+            self._last_increased = False
+
+        self._last_throughput = throughput
+        if part_size != self.part_size:
+            self.part_size = part_size
+            if self.on_part_size:
+                self.on_part_size(part_size)
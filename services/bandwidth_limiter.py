@@ -0,0 +1,105 @@
+"""Token bucket limits on the bandwidth used by uploads"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class TokenBucket:
+    """Thread safe token bucket measured in bytes
+
+    Consuming more tokens than are available puts the bucket in debt and
+    sleeps until the debt is repaid, so large reads are paced at the average
+    rate without having to be split up.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ThrottledFile:
+    """File object wrapper that paces reads with token buckets"""
+
+    def __init__(self, file, buckets: List[TokenBucket]) -> None:
+        self._file = file
+        self._buckets = buckets
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._file.read(size)
+        for bucket in self._buckets:
+            bucket.consume(len(data))
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "ThrottledFile":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def kbps_to_bytes_per_second(kbps: float) -> float:
+    return kbps * 1000 / 8
+
+
+class BandwidthLimiter:
+    """Global and per product type bandwidth limits, in kilobits per second"""
+
+    def __init__(
+        self,
+        max_kbps: Optional[float] = None,
+        product_type_kbps: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self._global_bucket = (
+            TokenBucket(kbps_to_bytes_per_second(max_kbps)) if max_kbps else None
+        )
+        self._product_type_buckets = {
+            product_type: TokenBucket(kbps_to_bytes_per_second(kbps))
+            for product_type, kbps in (product_type_kbps or {}).items()
+            if kbps
+        }
+
+    def get_buckets(self, product_type: Optional[str]) -> List[TokenBucket]:
+        """Buckets a read of this product type has to pass through"""
+        buckets = []
+        if product_type in self._product_type_buckets:
+            buckets.append(self._product_type_buckets[product_type])
+        if self._global_bucket:
+            buckets.append(self._global_bucket)
+        return buckets
+
+    def wrap(self, file, product_type: Optional[str]):
+        """Wrap a file object so reading it is limited, if any limit applies"""
+        buckets = self.get_buckets(product_type)
+        return ThrottledFile(file, buckets) if buckets else file
@@ -0,0 +1,92 @@
+"""Compression of products before upload, for types that compress well"""
+
+import gzip
+import importlib.util
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional
+
+# Formats that are already compressed and gain nothing from another pass
+COMPRESSED_EXTENSIONS = frozenset(
+    {
+        ".jpg", ".jpeg", ".png", ".gif", ".webp", ".jp2",
+        ".ts", ".mp4", ".mkv", ".mov", ".avi",
+        ".zip", ".kmz", ".gz", ".zst", ".bz2", ".xz", ".7z",
+    }
+)
+
+# Compressed data is kept in memory up to this size before spilling to disk
+SPOOL_SIZE = 8 * 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _gzip(source, destination) -> None:
+    # mtime=0 so the same contents always compress to the same bytes
+    with gzip.GzipFile(fileobj=destination, mode="wb", compresslevel=6, mtime=0) as compressed:
+        shutil.copyfileobj(source, compressed, COPY_BUFFER_SIZE)
+
+
+def _zstd(source, destination) -> None:
+    # Imported on first use, so only configs compressing with zstd load it
+    import zstandard
+
+    zstandard.ZstdCompressor(level=3).copy_stream(source, destination)
+
+
+# Codec -> (Content-Encoding, compress from one file object to another)
+CODECS: Dict[str, tuple] = {"gzip": ("gzip", _gzip), "zstd": ("zstd", _zstd)}
+
+
+class Compressor:
+    """Compresses products of the configured types into a temporary file
+
+    `product_type_codecs` maps a product type to the codec its files are
+    compressed with, e.g. `{"tactical": "gzip"}`. Files with an already
+    compressed format are never compressed, and neither are files that
+    compress to more than `max_ratio` of their size.
+    """
+
+    def __init__(self, product_type_codecs: Dict[str, str], max_ratio: float = 0.9) -> None:
+        for codec in product_type_codecs.values():
+            if codec not in CODECS:
+                raise ValueError(f"Invalid compression codec: {codec}")
+            # Optional, install with `pip install airborne_dsa[zstd]`
+            if codec == "zstd" and importlib.util.find_spec("zstandard") is None:
+                raise ValueError("zstd compression needs the zstandard package installed")
+        self.product_type_codecs = product_type_codecs
+        self.max_ratio = max_ratio
+
+    def get_codec(self, file_path: str, product_type: Optional[str]) -> Optional[str]:
+        """Codec to compress a file with, or None to upload it as is"""
+        if os.path.splitext(file_path)[1].lower() in COMPRESSED_EXTENSIONS:
+            return None
+        return self.product_type_codecs.get(product_type)
+
+    def compress(self, file_path: str, codec: str, spool_size: int = SPOOL_SIZE):
+        """Compressed copy of a file, positioned at the start, with its Content-Encoding
+
+        Up to `spool_size` bytes of it are kept in memory. Returns (None, None)
+        if the file doesn't compress well enough to be worth it. The caller
+        closes the returned file.
+        """
+        with open(file_path, "rb") as source:
+            return self.compress_fileobj(source, codec, spool_size)
+
+    def compress_fileobj(self, source, codec: str, spool_size: int = SPOOL_SIZE):
+        """Like `compress`, reading the contents from a file object"""
+        content_encoding, compress = CODECS[codec]
+        # A spool size of 0 would keep everything in memory
+        compressed = (
+            tempfile.SpooledTemporaryFile(max_size=spool_size) if spool_size else tempfile.TemporaryFile()
+        )
+        compress(source, compressed)
+        original_size = source.tell()
+
+        compressed_size = compressed.tell()
+        if compressed_size > original_size * self.max_ratio:
+            compressed.close()
+            return None, None
+
+        compressed.seek(0)
+        return compressed, content_encoding
@@ -28,8 +28,11 @@ class ConfigManager:
         else:
             # For backwards compatibility, treat as a single account
             self.multi_account = False
+            # Keep any optional tuning settings (e.g. uploadWorkers) alongside
+            # the account fields
             self.accounts = [
                 {
+                    **self.config,
                     "name": "Default",
                     "awsAccessKeyId": self.config.get("awsAccessKeyId"),
                     "awsSecretAccessKey": self.config.get("awsSecretAccessKey"),
@@ -47,6 +50,11 @@ class ConfigManager:
         else:
             return self.accounts
 
+    @property
+    def fan_out(self):
+        """Whether to upload to every account at once instead of asking for one"""
+        return self.multi_account and bool(self.config.get("fanOut"))
+
     def get_account(self, index):
         """Get a specific account by index"""
         accounts = self.get_accounts()
@@ -0,0 +1,74 @@
+"""Coalesces bursts of file system events into batches"""
+
+import logging
+import threading
+from typing import Callable, Dict
+
+from services.structured_log import log_event
+
+
+class EventCoalescer:
+    """Collects file events and hands them on in batches, one entry per path
+
+    `notify` and `mark_closed` run on the watchdog observer thread and only
+    record the path in a dict, so a sensor dumping thousands of frames at once
+    never holds up the observer and the inotify queue keeps draining. Every
+    `window` seconds the collected events are passed to `callback` as a dict of
+    path to whether the writer closed the file. Repeated created and modified
+    events for a path collapse into one entry.
+    """
+
+    def __init__(self, callback: Callable[[Dict[str, bool]], None], window: float = 0.25) -> None:
+        self.callback = callback
+        self.window = window
+        self.event_count = 0
+        self.batch_count = 0
+
+        self._events: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="event-coalescer", daemon=True)
+
+    @property
+    def pending(self) -> int:
+        """Number of paths waiting for the next batch"""
+        with self._lock:
+            return len(self._events)
+
+    def notify(self, file_path: str) -> None:
+        """Record that a file was created, modified or moved into place"""
+        with self._lock:
+            self.event_count += 1
+            self._events.setdefault(file_path, False)
+
+    def mark_closed(self, file_path: str) -> None:
+        """Record that the writer closed a file"""
+        with self._lock:
+            self.event_count += 1
+            self._events[file_path] = True
+
+    def flush(self) -> None:
+        """Hand the events collected so far to the callback"""
+        with self._lock:
+            events, self._events = self._events, {}
+        if events:
+            self.batch_count += 1
+            self.callback(events)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the batching thread after handing on the last batch"""
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.window):
+            try:
+                self.flush()
+            except Exception as error:
+                log_event("watch.error", logging.ERROR, exc_info=error)
+                print(f"File event error: {error}")
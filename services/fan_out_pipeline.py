@@ -0,0 +1,212 @@
+"""Uploads a mission to several destinations from a single watcher"""
+
+from datetime import datetime
+import logging
+import queue
+import re
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from models.product import Product
+from services.mission_watcher import MissionWatcher
+from services.s3_file_manager import MB, S3FileManager
+from services.shared_file_cache import SharedFileCache
+from services.structured_log import log_event
+from services.upload_pipeline import UploadPipeline
+from services.upload_progress import ProgressSnapshot
+
+Destination = Tuple[dict, object, Callable[[str], Tuple[Product, str]]]
+
+
+def get_journal_file_name(account_name: str) -> str:
+    """Journal of one destination, so each keeps its own upload state"""
+    return f".upload_journal.{re.sub(r'[^a-zA-Z0-9-]', '_', account_name)}.sqlite3"
+
+
+class DestinationIntake:
+    """Hands completed files to one destination's pipeline on its own thread
+
+    Queueing a file blocks while the destination's upload queue is full, e.g.
+    while its bucket can't be reached, so batches are spooled here without
+    limit instead of holding up the shared watcher and the other destinations.
+    """
+
+    def __init__(self, pipeline: UploadPipeline, name: str) -> None:
+        self.pipeline = pipeline
+        self._batches: "queue.Queue[Optional[List[str]]]" = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"intake-{name}", daemon=True)
+
+    @property
+    def pending(self) -> int:
+        """Files not handed to the pipeline yet"""
+        with self._lock:
+            return self._pending
+
+    def put(self, file_paths: List[str]) -> None:
+        with self._lock:
+            self._pending += len(file_paths)
+        self._batches.put(list(file_paths))
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop once every batch spooled so far has been handed over"""
+        self._batches.put(None)
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            file_paths = self._batches.get()
+            if file_paths is None:
+                return
+            try:
+                self.pipeline.queue_products(file_paths)
+            except Exception as error:
+                log_event("intake.error", logging.ERROR, exc_info=error)
+                print(f"Error queueing files for {self.pipeline.account.get('name')}: {error}")
+            finally:
+                with self._lock:
+                    self._pending -= len(file_paths)
+
+
+class FanOutPipeline:
+    """Watches a mission folder once and uploads every product to several destinations
+
+    Each destination is an account, its file manager and the function giving
+    a file's product and key there. Every destination gets its own
+    UploadPipeline with its own journal, queue, retry state and priorities,
+    so they upload concurrently and a slow or unreachable bucket doesn't hold
+    up the others: each is handed files by its own DestinationIntake.
+    Completed files from the shared MissionWatcher are handed to all of them,
+    and a SharedFileCache reads each file once for all of them, and
+    compresses it and renders its preview once too. Watch settings are taken
+    from the first account.
+
+    Bundles are still zipped by each destination, as their grouping and the
+    keys listed inside them come from that destination's own settings.
+    """
+
+    def __init__(
+        self,
+        destinations: List[Destination],
+        mission_name: str,
+        mission_base_path: str,
+        cache_bytes: int = 256 * MB,
+        mission_time: Optional[datetime] = None,
+    ) -> None:
+        file_managers = [file_manager for _, file_manager, _ in destinations]
+        s3_file_managers = [
+            file_manager for file_manager in file_managers if isinstance(file_manager, S3FileManager)
+        ]
+        # Only files small enough to go in a single request are uploaded from memory
+        self.file_cache = SharedFileCache(
+            len(s3_file_managers),
+            max_file_size=min(
+                (file_manager.multipart_threshold for file_manager in s3_file_managers), default=0
+            ),
+            max_bytes=cache_bytes,
+            derived_readers={
+                "compressed": sum(1 for file_manager in s3_file_managers if file_manager.compressor),
+                "preview": sum(1 for account, _, _ in destinations if account.get("previewProductTypes")),
+            },
+        )
+        self.pipelines = [
+            UploadPipeline(
+                account,
+                file_manager,
+                mission_name,
+                mission_base_path,
+                get_product_and_key,
+                journal_file_name=get_journal_file_name(account.get("name", str(index))),
+                file_cache=self.file_cache,
+                watch=False,
+                mission_time=mission_time,
+            )
+            for index, (account, file_manager, get_product_and_key) in enumerate(destinations)
+        ]
+        self.intakes = [
+            DestinationIntake(pipeline, pipeline.account.get("name", str(index)))
+            for index, pipeline in enumerate(self.pipelines)
+        ]
+        self.watcher = MissionWatcher(mission_base_path, self.queue_products, destinations[0][0])
+
+    @property
+    def pending(self) -> int:
+        return sum(pipeline.pending for pipeline in self.pipelines) + sum(
+            intake.pending for intake in self.intakes
+        )
+
+    @property
+    def retrying(self) -> int:
+        return sum(pipeline.retrying for pipeline in self.pipelines)
+
+    @property
+    def paused(self) -> bool:
+        return any(pipeline.paused for pipeline in self.pipelines)
+
+    @property
+    def settling(self) -> int:
+        return self.watcher.pending
+
+    def get_failed_uploads(self) -> List[Tuple[str, str]]:
+        """Path (with the destination's account) and last error of every failed upload"""
+        return [
+            (f"{file_path} ({pipeline.account.get('name')})", error)
+            for pipeline in self.pipelines
+            for file_path, error in pipeline.get_failed_uploads()
+        ]
+
+    def get_progress(self) -> ProgressSnapshot:
+        """Progress of every destination, done when the slowest is"""
+        return ProgressSnapshot.combine(
+            {
+                pipeline.account.get("name", str(index)): pipeline.get_progress()
+                for index, pipeline in enumerate(self.pipelines)
+            }
+        )
+
+    def queue_products(self, file_paths: List[str]) -> None:
+        """Queue completed files for every destination that hasn't uploaded them"""
+        for intake in self.intakes:
+            intake.put(file_paths)
+
+    def start(self) -> None:
+        """Start uploading, watching and queueing files already in the mission folder"""
+        for pipeline in self.pipelines:
+            pipeline.start()
+        for intake in self.intakes:
+            intake.start()
+        self.watcher.start()
+
+        backfill_count = self.backfill()
+        if backfill_count:
+            print(f"Found {backfill_count} existing files in mission folder to upload")
+
+    def backfill(self) -> int:
+        """Hand the watcher every file some destination hasn't uploaded yet"""
+        file_paths = set()
+        for pipeline in self.pipelines:
+            file_paths.update(pipeline.find_files_to_upload())
+        for file_path in sorted(file_paths):
+            self.watcher.notify(file_path)
+        return len(file_paths)
+
+    def stop_watching(self) -> None:
+        self.watcher.stop()
+        for pipeline in self.pipelines:
+            pipeline.stop_watching()
+
+    def drain(self) -> None:
+        """Wait for every destination to finish its queued uploads"""
+        for intake in self.intakes:
+            intake.stop()
+        for pipeline in self.pipelines:
+            pipeline.drain()
+
+    def close(self) -> None:
+        for pipeline in self.pipelines:
+            pipeline.close()
@@ -0,0 +1,66 @@
+"""Digests of file contents for deduplication and upload integrity checks"""
+
+import base64
+from dataclasses import dataclass
+import hashlib
+import threading
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+_buffers = threading.local()
+
+
+def _get_buffer(size: int) -> memoryview:
+    # Each thread reuses one read buffer instead of allocating a chunk per read
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None or len(buffer) != size:
+        buffer = memoryview(bytearray(size))
+        _buffers.buffer = buffer
+    return buffer
+
+
+@dataclass(frozen=True)
+class FileDigests:
+    """MD5 and SHA-256 digests of a file's contents"""
+
+    md5: bytes
+    sha256: bytes
+    size: int
+
+    @property
+    def sha256_hex(self) -> str:
+        return self.sha256.hex()
+
+    @property
+    def md5_base64(self) -> str:
+        """As sent in the Content-MD5 header"""
+        return base64.b64encode(self.md5).decode()
+
+    @property
+    def sha256_base64(self) -> str:
+        """As sent in the x-amz-checksum-sha256 header"""
+        return base64.b64encode(self.sha256).decode()
+
+
+def digest_bytes(data: bytes) -> FileDigests:
+    return FileDigests(hashlib.md5(data).digest(), hashlib.sha256(data).digest(), len(data))
+
+
+def digest_file(file_path: str, buffer_size: int = DEFAULT_BUFFER_SIZE) -> FileDigests:
+    """MD5 and SHA-256 of a file, computed in a single read of it"""
+    with open(file_path, "rb", buffering=0) as file:
+        return digest_fileobj(file, buffer_size)
+
+
+def digest_fileobj(file, buffer_size: int = DEFAULT_BUFFER_SIZE) -> FileDigests:
+    """MD5 and SHA-256 of the rest of an open binary file"""
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    buffer = _get_buffer(buffer_size)
+    size = 0
+    while read := file.readinto(buffer):
+        chunk = buffer[:read]
+        md5.update(chunk)
+        sha256.update(chunk)
+        size += read
+    return FileDigests(md5.digest(), sha256.digest(), size)
@@ -0,0 +1,157 @@
+"""Detects when files being written by sensor software are complete"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from services.structured_log import log_event
+
+DEFAULT_IGNORED_SUFFIXES = (".tmp", ".part", ".partial", ".crdownload", ".swp")
+
+
+class _PendingFile:
+    __slots__ = ("signature", "stable_since", "closed")
+
+    def __init__(self) -> None:
+        self.signature: Optional[Tuple[int, int]] = None
+        self.stable_since = 0.0
+        self.closed = False
+
+
+class FileSettler:
+    """Emits each file exactly once, after it has finished being written
+
+    Files that complete in the same poll are passed to `callback` together.
+
+    A file is complete when its size and modification time have not changed for
+    `settle_seconds`, or as soon as the writer closes it. Temporary files
+    (`ignored_suffixes`, hidden files) are never emitted, so writers that
+    rename a finished file into place are picked up by the rename. If
+    `ready_suffix` is set, a file is only emitted once a sidecar named
+    `<file><ready_suffix>` exists next to it.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[List[str]], None],
+        settle_seconds: float = 2.0,
+        poll_interval: float = 0.5,
+        ready_suffix: Optional[str] = None,
+        ignored_suffixes: Iterable[str] = DEFAULT_IGNORED_SUFFIXES,
+    ) -> None:
+        self.callback = callback
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.ready_suffix = ready_suffix
+        self.ignored_suffixes = tuple(s.lower() for s in ignored_suffixes)
+
+        self._pending: Dict[str, _PendingFile] = {}
+        self._emitted: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="file-settler", daemon=True)
+
+    @property
+    def pending(self) -> int:
+        """Number of files still being written"""
+        with self._lock:
+            return len(self._pending)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def notify(self, file_path: str) -> None:
+        """Record that a file was created, modified or moved into place"""
+        file_path = self._candidate_path(file_path)
+        if file_path is None:
+            return
+        with self._lock:
+            self._pending.setdefault(file_path, _PendingFile())
+
+    def notify_batch(self, events: Dict[str, bool]) -> None:
+        """Record a batch of events, mapping each path to whether its writer closed it"""
+        candidates = [
+            (candidate, closed)
+            for candidate, closed in (
+                (self._candidate_path(file_path), closed) for file_path, closed in events.items()
+            )
+            if candidate is not None
+        ]
+        with self._lock:
+            for file_path, closed in candidates:
+                pending_file = self._pending.setdefault(file_path, _PendingFile())
+                pending_file.closed = pending_file.closed or closed
+
+    def mark_closed(self, file_path: str) -> None:
+        """Record that the writer closed a file, so it can be emitted right away"""
+        file_path = self._candidate_path(file_path)
+        if file_path is None:
+            return
+        with self._lock:
+            self._pending.setdefault(file_path, _PendingFile()).closed = True
+
+    def poll(self) -> None:
+        """Check pending files once and emit the ones that are complete"""
+        now = time.monotonic()
+        with self._lock:
+            pending = list(self._pending.items())
+
+        completed = []
+        for file_path, pending_file in pending:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                # Deleted or renamed before it was finished
+                with self._lock:
+                    self._pending.pop(file_path, None)
+                continue
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature != pending_file.signature:
+                # A file that was last modified long ago (e.g. found by the
+                # startup scan) has already settled
+                first_seen = pending_file.signature is None
+                pending_file.signature = signature
+                pending_file.stable_since = now
+                if first_seen and time.time() - stat.st_mtime >= self.settle_seconds:
+                    pending_file.stable_since -= self.settle_seconds
+
+            if not pending_file.closed and now - pending_file.stable_since < self.settle_seconds:
+                continue
+            if self.ready_suffix and not os.path.exists(file_path + self.ready_suffix):
+                continue
+
+            with self._lock:
+                self._pending.pop(file_path, None)
+                if self._emitted.get(file_path) == signature:
+                    continue
+                self._emitted[file_path] = signature
+            completed.append(file_path)
+
+        if completed:
+            self.callback(completed)
+
+    def _candidate_path(self, file_path: str) -> Optional[str]:
+        if self.ready_suffix and file_path.endswith(self.ready_suffix):
+            # A sidecar marks its companion file as ready
+            file_path = file_path[: -len(self.ready_suffix)]
+
+        file_name = os.path.basename(file_path)
+        if file_name.startswith(".") or file_name.lower().endswith(self.ignored_suffixes):
+            return None
+        return file_path
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as error:
+                log_event("settle.error", logging.ERROR, exc_info=error)
+                print(f"File settle error: {error}")
@@ -3,11 +3,36 @@ from watchdog.events import FileSystemEventHandler, FileSystemEvent
 
 
 class FileWatcher(FileSystemEventHandler):
-    def __init__(self, callback: Callable[[str], None]):
+    def __init__(
+        self,
+        callback: Callable[[str], None],
+        closed_callback: Callable[[str], None] | None = None,
+    ):
         self.callback = callback
+        self.closed_callback = closed_callback or callback
 
     def on_created(self, event: FileSystemEvent):
         if event.is_directory:
             return
 
         self.callback(event.src_path)
+
+    def on_modified(self, event: FileSystemEvent):
+        if event.is_directory:
+            return
+
+        self.callback(event.src_path)
+
+    def on_moved(self, event: FileSystemEvent):
+        # Writers that rename a finished file into place only produce a move
+        if event.is_directory:
+            return
+
+        self.callback(event.dest_path)
+
+    def on_closed(self, event: FileSystemEvent):
+        # Only reported by native observers that support it (inotify)
+        if event.is_directory:
+            return
+
+        self.closed_callback(event.src_path)
@@ -0,0 +1,208 @@
+"""Small previews of images, uploaded ahead of the full resolution files"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+import glob
+import logging
+import multiprocessing
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import uuid
+
+from models.product import Product
+from services.shared_file_cache import SharedFileCache
+from services.structured_log import log_event
+
+try:
+    import PIL
+except ImportError:
+    PIL = None
+
+# Hidden, so the watcher and the mission scan never pick previews up as products
+PREVIEW_FILE_PREFIX = ".preview-"
+PREVIEW_KEY_SUFFIX = "_preview.jpg"
+
+
+def generate_preview(source_path: str, preview_path: str, max_size: int, quality: int) -> None:
+    """Write a JPEG of an image, downsampled so neither side is over `max_size`
+
+    Runs in a worker process. 16 bit and floating point images (e.g. IR) are
+    stretched to 8 bits over their range of values.
+    """
+    from PIL import Image
+
+    with Image.open(source_path) as image:
+        # Lets JPEG decoding downsample as it goes, much faster than a full decode
+        image.draft("RGB", (max_size, max_size))
+        if image.mode in ("I;16", "I;16B", "I;16L", "I", "F"):
+            image = image.convert("F")
+            low, high = image.getextrema()
+            scale = 255 / (high - low) if high > low else 0
+            image = image.point(lambda value: value * scale - low * scale).convert("L")
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.thumbnail((max_size, max_size))
+        image.save(preview_path, "JPEG", quality=quality, optimize=True)
+
+
+def get_preview_key(key: str) -> str:
+    """Key of an image's preview, next to the image's own key"""
+    return f"{os.path.splitext(key)[0]}{PREVIEW_KEY_SUFFIX}"
+
+
+@dataclass(frozen=True)
+class Preview:
+    path: str
+    source_path: str
+    product: Product
+    key: str
+
+
+class ImagePreviews:
+    """Generates previews of images in a process pool and hands them on for upload
+
+    Decoding and resizing imagery is CPU bound, so it runs in `workers`
+    separate processes and never holds up the watcher or the upload workers.
+    Each preview is written as a hidden file in the mission folder, uploaded
+    under the image's key with a `_preview.jpg` suffix, and deleted once
+    uploaded. Images that can't be decoded get no preview and are still
+    uploaded as usual. With a `file_cache` shared by several destinations,
+    each image is only downsampled once for all of them.
+    """
+
+    def __init__(
+        self,
+        mission_base_path: str,
+        get_product_and_key: Callable[[str], Tuple[Product, str]],
+        queue_preview: Callable[[str], None],
+        product_types: Iterable[str] = ("image",),
+        max_size: int = 1024,
+        quality: int = 70,
+        workers: int = 1,
+        file_cache: Optional[SharedFileCache] = None,
+    ) -> None:
+        if PIL is None:
+            raise ValueError("Image previews need the Pillow package installed")
+
+        self.mission_base_path = mission_base_path
+        self.get_product_and_key = get_product_and_key
+        self.queue_preview = queue_preview
+        self.product_types = frozenset(product_types)
+        self.max_size = max_size
+        self.quality = quality
+        self.workers = workers
+        self.file_cache = file_cache
+
+        self._previews: Dict[str, Preview] = {}
+        self._generating = 0
+        self._lock = threading.Lock()
+        self._processes: Optional[ProcessPoolExecutor] = None
+        # Each thread waits on one preview in the process pool, then queues it
+        self._threads: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def pending(self) -> int:
+        """Previews waiting to be generated or being generated"""
+        with self._lock:
+            return self._generating
+
+    def start(self) -> None:
+        # Spawned rather than forked, as forking a process with running threads isn't safe
+        self._processes = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._threads = ThreadPoolExecutor(self.workers, thread_name_prefix="image-previews")
+
+    def stop(self) -> None:
+        """Wait for the previews being generated and queue them"""
+        if self._threads:
+            self._threads.shutdown(wait=True)
+        if self._processes:
+            self._processes.shutdown(wait=True)
+
+    def add(self, file_path: str) -> None:
+        """Generate a preview of a file if it is one of the image product types"""
+        try:
+            product, key = self.get_product_and_key(file_path)
+        except (ValueError, OSError):
+            return
+        if product.type not in self.product_types:
+            return
+
+        preview = Preview(
+            os.path.join(self.mission_base_path, f"{PREVIEW_FILE_PREFIX}{uuid.uuid4().hex}.jpg"),
+            file_path,
+            product,
+            get_preview_key(key),
+        )
+        with self._lock:
+            self._generating += 1
+        self._threads.submit(self._generate, preview)
+
+    def get_preview(self, file_path: str) -> Optional[Preview]:
+        with self._lock:
+            return self._previews.get(file_path)
+
+    def remove(self, preview: Preview) -> None:
+        """Delete a preview once it is uploaded or has failed"""
+        with self._lock:
+            self._previews.pop(preview.path, None)
+        try:
+            os.remove(preview.path)
+        except OSError:
+            pass
+
+    def remove_stale_previews(self) -> List[str]:
+        """Delete previews left by a previous run, returning their paths"""
+        stale = glob.glob(os.path.join(glob.escape(self.mission_base_path), f"{PREVIEW_FILE_PREFIX}*.jpg"))
+        for file_path in stale:
+            try:
+                os.remove(file_path)
+            except OSError as error:
+                print(error)
+        return stale
+
+    def _render(self, preview: Preview) -> None:
+        self._processes.submit(
+            generate_preview, preview.source_path, preview.path, self.max_size, self.quality
+        ).result()
+
+    def _render_shared(self, preview: Preview) -> bytes:
+        self._render(preview)
+        with open(preview.path, "rb") as file:
+            return file.read()
+
+    def _generate(self, preview: Preview) -> None:
+        try:
+            if self.file_cache:
+                data = self.file_cache.get_derived(
+                    preview.source_path,
+                    "preview",
+                    lambda: self._render_shared(preview),
+                    f"{self.max_size}:{self.quality}",
+                )
+                if not os.path.exists(preview.path):
+                    # Rendered for another destination
+                    with open(preview.path, "wb") as file:
+                        file.write(data)
+            else:
+                self._render(preview)
+        except Exception as error:
+            with self._lock:
+                self._generating -= 1
+            log_event(
+                "preview.failed", logging.WARNING, file=preview.source_path, error=str(error)
+            )
+            print(f"Failed to generate preview of {os.path.basename(preview.source_path)}: {error}")
+            try:
+                os.remove(preview.path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._generating -= 1
+            self._previews[preview.path] = preview
+        log_event("preview.created", file=preview.source_path, key=preview.key)
+        self.queue_preview(preview.path)
@@ -1,10 +1,51 @@
-class LocalFileManager:
-    def __init__(self) -> None:
-        print("Using faux file manager. No files will be uploaded")
+import os
+import shutil
+from typing import Set
+
+from services.file_digest import FileDigests
+from services.storage_backend import StorageBackend
+
+
+class LocalFileManager(StorageBackend):
+    """Copies products into a local directory tree laid out like the S3 keys"""
+
+    def __init__(self, root_path: str) -> None:
+        self.root_path = root_path
+        os.makedirs(self.root_path, exist_ok=True)
+        print(f"Using local file manager. Files will be copied to {self.root_path}")
         print()
 
-    def upload_file(self, file_path: str, key: str):
-        pass
+    def get_path(self, key: str) -> str:
+        """Local path an object key is stored at"""
+        return os.path.join(self.root_path, *key.split("/"))
+
+    def upload_file(
+        self,
+        file_path: str,
+        key: str,
+        product_type: str | None = None,
+        digests: FileDigests | None = None,
+    ):
+        destination = self.get_path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        # Copy next to the destination and rename, so a partial copy is never visible
+        temporary_path = f"{destination}.part"
+        shutil.copyfile(file_path, temporary_path)
+        os.replace(temporary_path, destination)
 
     def upload_empty_file(self, file_key: str) -> None:
-        pass
+        destination = self.get_path(file_key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        open(destination, "wb").close()
+
+    def list_keys(self, prefix: str) -> Set[str]:
+        keys = set()
+        for directory, _, file_names in os.walk(self.root_path):
+            for file_name in file_names:
+                key = os.path.relpath(
+                    os.path.join(directory, file_name), self.root_path
+                ).replace(os.path.sep, "/")
+                if key.startswith(prefix) and not key.endswith(".part"):
+                    keys.add(key)
+        return keys
@@ -0,0 +1,130 @@
+"""Caps the memory held by uploads in flight"""
+
+from contextlib import contextmanager
+import io
+import threading
+from typing import Iterator, List
+
+
+class MemoryBudget:
+    """Bytes of file contents uploads may hold in memory at once, shared by all of them
+
+    `reserve` and `buffer` block until their bytes fit in the budget, so
+    concurrent multipart parts and compressed copies wait for each other
+    instead of growing memory with the number of workers or the part size. A
+    reservation larger than the whole budget waits until nothing else is
+    reserved. Buffers are reused rather than allocated for every part, and
+    free ones are only kept while they fit in the budget too.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(int(max_bytes), 1)
+        self.peak = 0
+
+        self._in_use = 0
+        self._free: List[bytearray] = []
+        self._condition = threading.Condition()
+
+    @property
+    def in_use(self) -> int:
+        with self._condition:
+            return self._in_use
+
+    def acquire(self, size: int) -> int:
+        """Reserve up to `size` bytes, blocking until they fit. Returns the bytes reserved"""
+        size = min(size, self.max_bytes)
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_use + size <= self.max_bytes)
+            self._in_use += size
+            self.peak = max(self.peak, self._in_use)
+        return size
+
+    def try_acquire(self, size: int) -> bool:
+        """Reserve `size` bytes if they fit right now"""
+        with self._condition:
+            if self._in_use + size > self.max_bytes:
+                return False
+            self._in_use += size
+            self.peak = max(self.peak, self._in_use)
+            return True
+
+    def release(self, size: int) -> None:
+        with self._condition:
+            self._in_use -= size
+            self._condition.notify_all()
+
+    @contextmanager
+    def reserve(self, size: int) -> Iterator[None]:
+        reserved = self.acquire(size)
+        try:
+            yield
+        finally:
+            self.release(reserved)
+
+    @contextmanager
+    def buffer(self, size: int) -> Iterator[memoryview]:
+        """Reserve `size` bytes and lend a reused buffer of that size
+
+        Views taken from the one yielded must not outlive it.
+        """
+        reserved = self.acquire(size)
+        buffer = self._take_buffer(size)
+        view = memoryview(buffer)[:size]
+        try:
+            yield view
+        finally:
+            view.release()
+            with self._condition:
+                self._in_use -= reserved
+                self._free.append(buffer)
+                # Free buffers are dropped, smallest first, when they no longer fit
+                self._free.sort(key=len, reverse=True)
+                while self._free and self._in_use + sum(map(len, self._free)) > self.max_bytes:
+                    self._free.pop()
+                self._condition.notify_all()
+
+    def _take_buffer(self, size: int) -> bytearray:
+        with self._condition:
+            fitting = [buffer for buffer in self._free if len(buffer) >= size]
+            if fitting:
+                buffer = min(fitting, key=len)
+                self._free.remove(buffer)
+                return buffer
+        return bytearray(size)
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable binary file object reading from a buffer without copying it up front"""
+
+    def __init__(self, buffer: memoryview) -> None:
+        self._buffer = buffer
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, destination) -> int:
+        data = self._buffer[self._position : self._position + len(destination)]
+        destination[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._buffer) if size is None or size < 0 else self._position + size
+        data = bytes(self._buffer[self._position : end])
+        self._position += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._buffer)
+        self._position = min(max(offset, 0), len(self._buffer))
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
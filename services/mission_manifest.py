@@ -0,0 +1,188 @@
+"""Manifest of the products uploaded for a mission"""
+
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from models.product import Product
+from services.structured_log import log_event
+from services.upload_journal import UploadJournal
+
+
+def get_mission_key(
+    mission_name: str, mission_time: datetime, folder: Optional[str] = None, extension: str = ".txt"
+) -> str:
+    """Key of the file marking a mission's start, or with `.json` of its manifest"""
+    key = f"MISSION/{mission_name}_{mission_time.strftime('%Y%m%d_%H%M')}Z{extension}"
+    return f"{folder}/{key}" if folder else key
+
+
+class MissionManifest:
+    """Uploads a JSON list of every object uploaded for a mission
+
+    Consumers can GET the manifest instead of listing the mission's keys.
+    Each upload is recorded in the journal as it finishes, so the manifest
+    survives restarts, and the object is rewritten from the journal in
+    batches: every `interval` seconds while there are new entries, as soon as
+    `max_pending` entries are waiting, and once more when stopped. A failed
+    write is retried with the next batch. No batch is written while
+    `is_paused` says uploads are paused for a lost connection.
+
+    Every write lists and uploads the whole manifest, so it takes time in
+    proportion to the mission's uploads so far. To keep that from growing
+    with the square of a long mission, a batch also waits for new entries to
+    add up to a tenth of the last manifest written, unless the interval is up.
+
+    The manifest is kept next to the journal in the mission folder and
+    uploaded as `key`, outside the upload queue and progress. Files uploaded
+    inside a bundle are listed with the bundle's key.
+    """
+
+    def __init__(
+        self,
+        mission_name: str,
+        mission_time: datetime,
+        journal: UploadJournal,
+        file_manager,
+        key: str,
+        interval: float = 30,
+        max_pending: int = 100,
+        is_paused: Callable[[], bool] = lambda: False,
+    ) -> None:
+        self.mission_name = mission_name
+        self.mission_time = mission_time
+        self.journal = journal
+        self.file_manager = file_manager
+        self.key = key
+        self.interval = interval
+        self.max_pending = max(max_pending, 1)
+        self.is_paused = is_paused
+        # Hidden, so it isn't uploaded as a product, and named after the
+        # journal so destinations don't share it
+        self.file_path = f"{os.path.splitext(journal.journal_path)[0]}.manifest.json"
+
+        self._pending = 0
+        # Entries in the last manifest written
+        self._written_entries = 0
+        self._lock = threading.Lock()
+        # Only one write at a time, so an older manifest never replaces a newer one
+        self._write_lock = threading.Lock()
+        self._due = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mission-manifest", daemon=True)
+
+    @property
+    def pending(self) -> int:
+        """Entries recorded since the manifest was last uploaded"""
+        with self._lock:
+            return self._pending
+
+    def add(
+        self,
+        key: str,
+        product: Product,
+        size: int,
+        file_hash: Optional[str],
+        bundle_key: Optional[str] = None,
+        preview: bool = False,
+    ) -> None:
+        """Record an uploaded object, to be included in the next manifest written"""
+        self.journal.add_manifest_entry(
+            key,
+            product.type,
+            product.subtype,
+            size,
+            file_hash,
+            product.timestamp.isoformat(),
+            bundle_key,
+            preview,
+        )
+        with self._lock:
+            self._pending += 1
+            due = self._pending >= max(self.max_pending, self._written_entries // 10)
+        if due:
+            self._due.set()
+
+    def write(self) -> bool:
+        """Write and upload the manifest now, returning whether it was uploaded"""
+        with self._write_lock:
+            with self._lock:
+                written = self._pending
+                # Entries added from here on make the next batch due again
+                self._due.clear()
+            entries = self.journal.get_manifest_entries()
+            manifest = {
+                "mission": self.mission_name,
+                "mission_time": self.mission_time.isoformat(),
+                "updated": datetime.now(timezone.utc).isoformat(),
+                "files": [
+                    {
+                        "key": key,
+                        "type": product_type,
+                        "subtype": product_subtype,
+                        "size": size,
+                        "sha256": file_hash,
+                        "timestamp": timestamp,
+                        **({"bundle": bundle_key} if bundle_key else {}),
+                        **({"preview": True} if preview else {}),
+                    }
+                    for (
+                        key,
+                        product_type,
+                        product_subtype,
+                        size,
+                        file_hash,
+                        timestamp,
+                        bundle_key,
+                        preview,
+                    ) in entries
+                ],
+            }
+            try:
+                temporary_path = f"{self.file_path}.tmp"
+                with open(temporary_path, "w", encoding="utf-8") as file:
+                    json.dump(manifest, file, indent=2)
+                os.replace(temporary_path, self.file_path)
+                self.file_manager.upload_metadata_file(self.file_path, self.key)
+            except Exception as error:
+                log_event("manifest.failed", logging.WARNING, key=self.key, error=str(error))
+                print(f"Failed to upload mission manifest: {error}")
+                return False
+
+            with self._lock:
+                self._pending -= written
+                self._written_entries = len(entries)
+        log_event("manifest.uploaded", key=self.key, files=len(entries))
+        return True
+
+    def start(self) -> None:
+        # Entries from the last run may not have made it into the uploaded manifest
+        if self.journal.get_manifest_entries():
+            with self._lock:
+                self._pending += 1
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the timer thread after writing any entries still pending"""
+        self._stopped.set()
+        self._due.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._write_pending()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._due.wait(self.interval)
+            self._due.clear()
+            if self._stopped.is_set():
+                return
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        # While offline the write would only fail, so the entries wait in the
+        # journal until the link is back
+        if self.pending and not self.is_paused():
+            self.write()
@@ -0,0 +1,213 @@
+"""Polls a mission folder for changes where file system events can't be relied on"""
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from services.structured_log import log_event
+
+
+class _Directory:
+    __slots__ = ("mtime_ns", "listed_at", "files", "subdirectories")
+
+    def __init__(self, mtime_ns: int, listed_at: float) -> None:
+        self.mtime_ns = mtime_ns
+        self.listed_at = listed_at
+        self.files: Set[str] = set()
+        self.subdirectories: Set[str] = set()
+
+
+class MissionSnapshot:
+    """Snapshot of a mission folder, updated in time proportional to what changed
+
+    Creating, deleting or renaming a file changes its directory's modified
+    time, so each scan stats every directory but only lists the ones whose
+    modified time changed. Files written in place don't change their
+    directory, so files that changed in the last `active_seconds` are stat'ed
+    on every scan too. A file rewritten after that is only found by a full
+    scan. Directories modified within `racy_seconds` of being listed are
+    listed again, as some file systems (e.g. FAT on USB drives) only keep
+    modified times to the nearest 2 seconds. Hidden entries are skipped.
+    """
+
+    def __init__(self, root: str, active_seconds: float = 60, racy_seconds: float = 2) -> None:
+        self.root = root
+        self.active_seconds = active_seconds
+        self.racy_seconds = racy_seconds
+        self.listed_count = 0
+        self.stat_count = 0
+
+        self._directories: Dict[str, _Directory] = {}
+        self._files: Dict[str, Tuple[int, int]] = {}
+        # Path of each recently changed file and when it last changed
+        self._active: Dict[str, float] = {}
+
+    @property
+    def file_count(self) -> int:
+        return len(self._files)
+
+    def scan(self, full: bool = False) -> List[str]:
+        """Update the snapshot, returning files that were added or changed
+
+        A full scan lists every directory and stats every file.
+        """
+        now = time.time()
+        changed = []
+        directories = [self.root]
+        while directories:
+            directory = directories.pop()
+            try:
+                stat = os.stat(directory)
+            except OSError:
+                self._forget_directory(directory)
+                continue
+            self.stat_count += 1
+
+            record = self._directories.get(directory)
+            if (
+                full
+                or record is None
+                or record.mtime_ns != stat.st_mtime_ns
+                or record.listed_at - stat.st_mtime < self.racy_seconds
+            ):
+                record = self._list(directory, stat.st_mtime_ns, now, full, changed)
+            directories.extend(
+                os.path.join(directory, subdirectory) for subdirectory in record.subdirectories
+            )
+
+        self._check_active(now, changed)
+        return changed
+
+    def _list(
+        self, directory: str, mtime_ns: int, now: float, full: bool, changed: List[str]
+    ) -> _Directory:
+        previous = self._directories.get(directory)
+        record = _Directory(mtime_ns, now)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        record.subdirectories.add(entry.name)
+                    elif entry.is_file():
+                        record.files.add(entry.name)
+                        if full or previous is None or entry.name not in previous.files:
+                            self._check_file(entry.path, entry.stat(), now, changed)
+        except OSError as error:
+            log_event("scan.error", logging.ERROR, directory=directory, error=str(error))
+            print(f"Failed to scan {directory}: {error}")
+            return previous or record
+        self.listed_count += 1
+
+        if previous:
+            for name in previous.files - record.files:
+                file_path = os.path.join(directory, name)
+                self._files.pop(file_path, None)
+                self._active.pop(file_path, None)
+            for name in previous.subdirectories - record.subdirectories:
+                self._forget_directory(os.path.join(directory, name))
+        self._directories[directory] = record
+        return record
+
+    def _check_file(self, file_path: str, stat: os.stat_result, now: float, changed: List[str]) -> None:
+        self.stat_count += 1
+        signature = (stat.st_size, stat.st_mtime_ns)
+        previous = self._files.get(file_path)
+        self._files[file_path] = signature
+        if signature == previous:
+            return
+        changed.append(file_path)
+        if now - stat.st_mtime < self.active_seconds:
+            self._active[file_path] = now
+
+    def _check_active(self, now: float, changed: List[str]) -> None:
+        reported = set(changed)
+        for file_path, changed_at in list(self._active.items()):
+            if file_path in reported:
+                continue
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                # Deleted, its directory's next listing drops it
+                self._active.pop(file_path, None)
+                continue
+            self.stat_count += 1
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature != self._files.get(file_path):
+                self._files[file_path] = signature
+                self._active[file_path] = now
+                changed.append(file_path)
+            elif now - changed_at >= self.active_seconds:
+                del self._active[file_path]
+
+    def _forget_directory(self, directory: str) -> None:
+        record = self._directories.pop(directory, None)
+        if record is None:
+            return
+        for name in record.files:
+            file_path = os.path.join(directory, name)
+            self._files.pop(file_path, None)
+            self._active.pop(file_path, None)
+        for name in record.subdirectories:
+            self._forget_directory(os.path.join(directory, name))
+
+
+class MissionPoller:
+    """Hands files added or changed in a mission folder to `callback` every `interval` seconds
+
+    An alternative to the watchdog observer for removable and network drives,
+    where file system events often go missing. Changes are found with a
+    MissionSnapshot, with a full scan every `full_scan_seconds` to catch files
+    rewritten in place long after they were written. `callback` gets a batch
+    of paths mapped to False, like EventCoalescer batches, as polling can't
+    tell when a writer closed a file. Files already in the folder at start
+    are left to the backfill.
+    """
+
+    def __init__(
+        self,
+        mission_base_path: str,
+        callback: Callable[[Dict[str, bool]], None],
+        interval: float = 2,
+        full_scan_seconds: float = 300,
+    ) -> None:
+        self.callback = callback
+        self.interval = interval
+        self.full_scan_seconds = full_scan_seconds
+        self.snapshot = MissionSnapshot(mission_base_path)
+
+        self._last_full_scan = 0.0
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        # Taken before returning, so nothing written after start is missed
+        self.snapshot.scan(full=True)
+        self._last_full_scan = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="mission-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join()
+
+    def poll(self) -> None:
+        """Scan once and hand on what changed"""
+        full = time.monotonic() - self._last_full_scan >= self.full_scan_seconds
+        if full:
+            self._last_full_scan = time.monotonic()
+        changed = self.snapshot.scan(full=full)
+        if changed:
+            self.callback(dict.fromkeys(changed, False))
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as error:
+                log_event("poll.error", logging.ERROR, exc_info=error)
+                print(f"Mission folder poll error: {error}")
@@ -0,0 +1,30 @@
+"""Scans an existing mission folder for files to upload"""
+
+import logging
+import os
+from typing import Iterator
+
+from services.structured_log import log_event
+
+
+def scan_mission_files(directory: str) -> Iterator[os.DirEntry]:
+    """Recursively yield every file under a directory, skipping hidden entries
+
+    Uses os.scandir so the stat results cached on each entry can be reused
+    without touching the file system again.
+    """
+    try:
+        entries = os.scandir(directory)
+    except OSError as error:
+        log_event("scan.error", logging.ERROR, directory=directory, error=str(error))
+        print(f"Failed to scan {directory}: {error}")
+        return
+
+    with entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_mission_files(entry.path)
+            elif entry.is_file():
+                yield entry
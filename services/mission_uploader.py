@@ -0,0 +1,338 @@
+"""Uploads the products of a mission and records their state in the journal"""
+
+from contextlib import nullcontext
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models.product import Product
+from services.adaptive_concurrency import AdaptiveConcurrency
+from services.image_previews import ImagePreviews
+from services.mission_manifest import MissionManifest
+from services.product_bundler import ProductBundler
+from services.shared_file_cache import SharedFileCache
+from services.s3_file_manager import S3FileManager
+from services.structured_log import log_event, new_correlation_id
+from services.file_digest import digest_file
+from services.upload_journal import UploadJournal
+from services.upload_metrics import UploadMetrics
+from services.upload_retry import (
+    ConnectivityMonitor,
+    RetryPolicy,
+    RetryUpload,
+    is_connectivity_error,
+    is_transient_error,
+)
+
+
+class MissionUploader:
+    """Uploads the products of a mission and records their state in the journal
+
+    `prepare` decides whether a completed file needs uploading and `upload` is
+    the upload worker handler. Transient failures are retried with backoff by
+    raising RetryUpload, connectivity failures pause uploads until the
+    connection is restored, and permanent failures (or files that run out of
+    attempts) are marked failed in the journal. With AdaptiveConcurrency, each
+    upload holds one of its slots and reports its result to it.
+
+    Files whose contents were already uploaded are skipped: anywhere in the
+    mission with `skip_duplicate_content`, otherwise only for the same file.
+
+    Each file gets a correlation id when it is queued, which is kept across its
+    retries and included in every event logged about it.
+
+    Archives from a ProductBundler are uploaded like any other file. Once one
+    is uploaded (or has failed) the files in it are marked the same way and the
+    archive is deleted, keeping its hash in the journal so an identical bundle
+    isn't uploaded again.
+
+    Previews from ImagePreviews are uploaded under their own key and deleted
+    once uploaded or failed. A preview that fails is only reported, as its
+    image is uploaded anyway.
+
+    Every object uploaded is added to the MissionManifest, if there is one,
+    with the files in a bundle listed under the bundle's key.
+    """
+
+    def __init__(
+        self,
+        file_manager,
+        journal: UploadJournal,
+        get_product_and_key: Callable[[str], Tuple[Product, str]],
+        retry_policy: Optional[RetryPolicy] = None,
+        connectivity_monitor: Optional[ConnectivityMonitor] = None,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        metrics: Optional[UploadMetrics] = None,
+        skip_duplicate_content: bool = True,
+        bundler: Optional[ProductBundler] = None,
+        file_cache: Optional[SharedFileCache] = None,
+        previews: Optional[ImagePreviews] = None,
+        manifest: Optional[MissionManifest] = None,
+    ) -> None:
+        self.file_manager = file_manager
+        self.journal = journal
+        self.get_product_and_key = get_product_and_key
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.connectivity_monitor = connectivity_monitor
+        self.concurrency = concurrency
+        self.metrics = metrics or UploadMetrics()
+        self.skip_duplicate_content = skip_duplicate_content
+        self.bundler = bundler
+        self.file_cache = file_cache
+        self.previews = previews
+        self.manifest = manifest
+
+        # Per queued file: correlation id and when it became ready to upload
+        self._correlation_ids: Dict[str, str] = {}
+        self._queued_at: Dict[str, float] = {}
+
+    def prepare(self, file_path: str) -> bool:
+        """Record a completed file as queued unless this version was already uploaded"""
+        return bool(self.prepare_batch([file_path]))
+
+    def prepare_batch(self, file_paths: List[str]) -> List[str]:
+        """Record completed files as queued, returning the ones that need uploading
+
+        Files whose current version was already uploaded are skipped. The
+        journal is checked and updated once for the whole batch.
+        """
+        stats = {}
+        for file_path in file_paths:
+            try:
+                stats[file_path] = os.stat(file_path)
+            except OSError as error:
+                print(error)
+
+        uploaded_versions = self.journal.get_done_versions(list(stats))
+        queued = []
+        for file_path, stat in stats.items():
+            if uploaded_versions.get(file_path) == (stat.st_size, stat.st_mtime_ns):
+                print(f"Skipping {os.path.basename(file_path)}, already uploaded")
+            else:
+                queued.append(file_path)
+
+        self.journal.mark_queued_many(
+            [(file_path, stats[file_path].st_size, stats[file_path].st_mtime_ns) for file_path in queued]
+        )
+        queued_at = time.monotonic()
+        for file_path in queued:
+            correlation_id = self._correlation_ids.setdefault(file_path, new_correlation_id())
+            self._queued_at[file_path] = queued_at
+            log_event(
+                "upload.queued",
+                file=file_path,
+                correlation_id=correlation_id,
+                size=stats[file_path].st_size,
+            )
+        return queued
+
+    def resolve(self, file_path: str) -> Tuple[Product, str]:
+        """Product and key of a file, bundle or preview"""
+        bundle = self.bundler.get_bundle(file_path) if self.bundler else None
+        if bundle:
+            return bundle.product, bundle.key
+        preview = self.previews.get_preview(file_path) if self.previews else None
+        if preview:
+            return preview.product, preview.key
+        return self.get_product_and_key(file_path)
+
+    def _finish(self, file_path: str, key: Optional[str] = None, error: Optional[str] = None) -> None:
+        """Forget a finished file, uploaded as `key` or failed with `error`"""
+        self._correlation_ids.pop(file_path, None)
+        self._queued_at.pop(file_path, None)
+
+        bundle = self.bundler.get_bundle(file_path) if self.bundler else None
+        if bundle:
+            for member in bundle.members:
+                if key is None:
+                    self.journal.mark_failed(member.path, error or "Bundle upload failed")
+                else:
+                    # Under its own key, as in the manifest, so later copies of its
+                    # contents are skipped as that file rather than the archive
+                    self.journal.mark_done(member.path, member.key, member.sha256)
+            if key is None:
+                # Its files are what is reported as failed
+                self.journal.forget(file_path)
+            self.bundler.remove(bundle)
+
+        preview = self.previews.get_preview(file_path) if self.previews else None
+        if preview:
+            # Its path is random and the file is deleted, so its row would never be looked up again
+            self.journal.forget(file_path)
+            self.previews.remove(preview)
+
+    def upload(self, file_path: str) -> None:
+        file_name = os.path.basename(file_path)
+        correlation_id = self._correlation_ids.setdefault(file_path, new_correlation_id())
+        try:
+            product, key = self.resolve(file_path)
+            # Hashed once for deduplication and the upload's integrity checks
+            digests = self.file_cache.get_digests(file_path) if self.file_cache else digest_file(file_path)
+            file_size = digests.size
+            file_hash = digests.sha256_hex
+        except Exception as error:
+            self.journal.mark_failed(file_path, str(error))
+            self.metrics.uploads.inc(product_type="unknown", result="failed")
+            log_event(
+                "upload.failed",
+                logging.ERROR,
+                exc_info=error,
+                file=file_path,
+                correlation_id=correlation_id,
+            )
+            self._finish(file_path, error=str(error))
+            print(error)
+            return
+
+        queued_at = self._queued_at.get(file_path)
+        if queued_at is not None:
+            self.metrics.queue_wait.observe(
+                max(time.monotonic() - queued_at, 0), product_type=product.type
+            )
+
+        uploaded_key = self._get_uploaded_key(file_path, key, file_hash)
+        if uploaded_key is not None:
+            self.journal.mark_duplicate(file_path, file_hash, uploaded_key)
+            self.metrics.uploads.inc(product_type=product.type, result="duplicate")
+            self.metrics.duplicate_bytes.inc(file_size, product_type=product.type)
+            log_event(
+                "upload.duplicate",
+                file=file_path,
+                correlation_id=correlation_id,
+                key=key,
+                uploaded_key=uploaded_key,
+            )
+            self._finish(file_path, uploaded_key)
+            if uploaded_key == key:
+                print(f"Skipping {file_name}, contents already uploaded")
+            else:
+                print(f"Skipping {file_name}, contents already uploaded as {uploaded_key}")
+            return
+
+        print(f"Uploading {file_name}")
+        log_event(
+            "upload.started",
+            file=file_path,
+            correlation_id=correlation_id,
+            key=key,
+            product_type=product.type,
+            size=file_size,
+        )
+        self.journal.mark_uploading(file_path)
+        started_at = time.monotonic()
+        with self.concurrency.slot() if self.concurrency else nullcontext():
+            try:
+                self.file_manager.upload_file(file_path, key, product.type, digests)
+            except Exception as upload_error:
+                if self.concurrency:
+                    self.concurrency.record(0, failed=True)
+                self._handle_upload_error(file_path, product.type, upload_error)
+                return
+
+        if self.concurrency:
+            self.concurrency.record(file_size)
+
+        duration = time.monotonic() - started_at
+        self.journal.mark_done(file_path, key, file_hash)
+        self.metrics.uploads.inc(product_type=product.type, result="done")
+        self.metrics.upload_bytes.inc(file_size, product_type=product.type)
+        self.metrics.upload_duration.observe(duration, product_type=product.type)
+        if duration > 0:
+            self.metrics.upload_throughput.observe(file_size / duration, product_type=product.type)
+        log_event(
+            "upload.done",
+            file=file_path,
+            correlation_id=correlation_id,
+            key=key,
+            product_type=product.type,
+            size=file_size,
+            duration=round(duration, 3),
+        )
+        if self.manifest:
+            self._add_to_manifest(file_path, product, key, file_size, file_hash)
+        self._finish(file_path, key)
+        if isinstance(self.file_manager, S3FileManager):
+            print(
+                f"Successfully uploaded {file_name} as {key} to bucket: {self.file_manager.bucket}"
+            )
+        else:
+            print(f"Successfully processed {file_name} as {key} (local storage mode)")
+
+    def _add_to_manifest(
+        self, file_path: str, product: Product, key: str, size: int, file_hash: str
+    ) -> None:
+        bundle = self.bundler.get_bundle(file_path) if self.bundler else None
+        if bundle:
+            # Consumers look for the files, not the archive they travelled in
+            for member in bundle.members:
+                try:
+                    member_product = self.get_product_and_key(member.path)[0]
+                except (ValueError, OSError):
+                    member_product = bundle.product
+                self.manifest.add(member.key, member_product, member.size, member.sha256, bundle_key=key)
+            return
+        preview = self.previews.get_preview(file_path) if self.previews else None
+        self.manifest.add(key, product, size, file_hash, preview=preview is not None)
+
+    def _get_uploaded_key(self, file_path: str, key: str, file_hash: str) -> Optional[str]:
+        """Key these contents were already uploaded as, or None if they weren't"""
+        if self.skip_duplicate_content:
+            return self.journal.get_key_for_hash(file_hash)
+        if self.journal.is_hash_uploaded(file_path, file_hash):
+            return key
+        return None
+
+    def _handle_upload_error(self, file_path: str, product_type: str, error: Exception) -> None:
+        file_name = os.path.basename(file_path)
+        correlation_id = self._correlation_ids.get(file_path)
+
+        if self.connectivity_monitor and is_connectivity_error(error):
+            # Spool the file until the connection is back, without using up attempts
+            self.journal.mark_retrying(file_path, str(error), count_attempt=False)
+            self.metrics.retries.inc(product_type=product_type, reason="connectivity")
+            log_event(
+                "upload.retrying",
+                logging.WARNING,
+                file=file_path,
+                correlation_id=correlation_id,
+                reason="connectivity",
+                error=str(error),
+            )
+            self._queued_at[file_path] = time.monotonic()
+            self.connectivity_monitor.report_offline()
+            raise RetryUpload(0)
+
+        if is_transient_error(error):
+            attempts = self.journal.mark_retrying(file_path, str(error))
+            if attempts < self.retry_policy.max_attempts:
+                delay = self.retry_policy.get_delay(attempts)
+                self.metrics.retries.inc(product_type=product_type, reason="transient")
+                log_event(
+                    "upload.retrying",
+                    logging.WARNING,
+                    file=file_path,
+                    correlation_id=correlation_id,
+                    reason="transient",
+                    attempt=attempts,
+                    delay=round(delay, 3),
+                    error=str(error),
+                )
+                # Queue wait is measured from when the retry is due
+                self._queued_at[file_path] = time.monotonic() + delay
+                print(
+                    f"Error uploading file {file_name}: {str(error)}. Retrying in {delay:.0f}s (attempt {attempts} of {self.retry_policy.max_attempts})"
+                )
+                raise RetryUpload(delay)
+
+        self.journal.mark_failed(file_path, str(error))
+        self.metrics.uploads.inc(product_type=product_type, result="failed")
+        log_event(
+            "upload.failed",
+            logging.ERROR,
+            exc_info=error,
+            file=file_path,
+            correlation_id=correlation_id,
+        )
+        self._finish(file_path, error=str(error))
+        print(f"Error uploading file {file_name}: {str(error)}")
@@ -0,0 +1,85 @@
+"""Watches a mission folder for completed files"""
+
+from typing import Callable, List
+
+from watchdog.observers import Observer
+
+from services.event_coalescer import EventCoalescer
+from services.file_settler import FileSettler
+from services.file_watcher import FileWatcher
+from services.mission_poller import MissionPoller
+
+
+class MissionWatcher:
+    """Hands completed files in a mission folder to `callback` in batches
+
+    The watchdog observer's events are coalesced into batches for a
+    FileSettler, which passes on files once the sensor software has finished
+    writing them. With `watchMode` set to `poll`, a MissionPoller scans the
+    folder for changes instead, for drives where events go missing.
+    Configured from an account's settings.
+    """
+
+    def __init__(
+        self, mission_base_path: str, callback: Callable[[List[str]], None], account: dict
+    ) -> None:
+        # Only queue files once the sensor software has finished writing them
+        self.file_settler = FileSettler(
+            callback,
+            settle_seconds=float(account.get("settleSeconds", 2)),
+            ready_suffix=account.get("readyFileSuffix"),
+        )
+
+        watch_mode = account.get("watchMode", "events")
+        if watch_mode not in ("events", "poll"):
+            raise ValueError(f"Unknown watchMode: {watch_mode}")
+
+        self.event_coalescer = self.observer = self.poller = None
+        if watch_mode == "poll":
+            self.poller = MissionPoller(
+                mission_base_path,
+                self.file_settler.notify_batch,
+                interval=float(account.get("pollSeconds", 2)),
+                full_scan_seconds=float(account.get("fullScanSeconds", 300)),
+            )
+            return
+
+        # Keep the observer thread to a dict update per event during bursts
+        self.event_coalescer = EventCoalescer(
+            self.file_settler.notify_batch,
+            window=float(account.get("eventCoalesceSeconds", 0.25)),
+        )
+
+        self.observer = Observer()
+        self.observer.schedule(
+            FileWatcher(self.event_coalescer.notify, self.event_coalescer.mark_closed),
+            mission_base_path,
+            recursive=True,
+        )
+
+    @property
+    def pending(self) -> int:
+        """Files still being written"""
+        return self.file_settler.pending
+
+    def notify(self, file_path: str) -> None:
+        """Pass on a file found outside the watcher once it is complete"""
+        self.file_settler.notify(file_path)
+
+    def start(self) -> None:
+        self.file_settler.start()
+        if self.poller:
+            self.poller.start()
+            return
+        self.event_coalescer.start()
+        self.observer.start()
+
+    def stop(self) -> None:
+        """Stop picking up new files. Files still being written are skipped"""
+        if self.poller:
+            self.poller.stop()
+        else:
+            self.observer.stop()
+            self.observer.join()
+            self.event_coalescer.stop()
+        self.file_settler.stop()
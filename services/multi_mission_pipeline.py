@@ -0,0 +1,187 @@
+"""Watches several mission folders, uploading them through shared workers"""
+
+import copy
+from datetime import datetime
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from models.product import Product
+from services.s3_file_manager import S3FileManager
+from services.upload_metrics import UploadMetrics
+from services.upload_pipeline import (
+    UploadPipeline,
+    create_metrics_exporters,
+    create_upload_scheduler,
+)
+from services.upload_progress import ProgressSnapshot
+from services.upload_queue import UploadQueue
+
+
+class MultiMissionPipeline:
+    """Watches several mission folders of one account, uploading them through shared workers
+
+    Each mission gets its own UploadPipeline, watcher and journal, and they all
+    queue into a single UploadQueue, so `uploadWorkers` applies to the process
+    rather than to each mission and the priorities apply across missions.
+    Metrics are shared too. Missions can be added while running.
+    """
+
+    def __init__(self, account: dict, file_manager) -> None:
+        self.account = account
+        self.file_manager = file_manager
+        self.pipelines: Dict[str, UploadPipeline] = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+        self.metrics = UploadMetrics()
+        self.upload_queue = UploadQueue(
+            self._upload,
+            worker_count=int(account.get("uploadWorkers", 4)),
+            scheduler=create_upload_scheduler(account, self._get_product_type),
+        )
+        self._register_gauges()
+        self.metrics_server, self.metrics_writer = create_metrics_exporters(self.metrics, account)
+
+    @property
+    def pending(self) -> int:
+        return self.upload_queue.pending
+
+    @property
+    def retrying(self) -> int:
+        return self.upload_queue.retrying
+
+    @property
+    def paused(self) -> bool:
+        return self.upload_queue.paused
+
+    @property
+    def settling(self) -> int:
+        return sum(pipeline.settling for pipeline in self._get_pipelines())
+
+    def get_failed_uploads(self) -> List[Tuple[str, str]]:
+        return [
+            failed_upload
+            for pipeline in self._get_pipelines()
+            for failed_upload in pipeline.get_failed_uploads()
+        ]
+
+    def get_progress(self) -> ProgressSnapshot:
+        """Progress of every mission, which share the workers and the link"""
+        return ProgressSnapshot.combine(
+            {pipeline.mission_name: pipeline.get_progress() for pipeline in self._get_pipelines()},
+            shared=True,
+        )
+
+    def add_mission(
+        self,
+        mission_name: str,
+        mission_base_path: str,
+        get_product_and_key: Callable[[str], Tuple[Product, str]],
+        mission_time: Optional[datetime] = None,
+    ) -> UploadPipeline:
+        """Watch and upload a mission folder, starting right away if already running"""
+        pipeline = UploadPipeline(
+            self.account,
+            # A copy per mission, sharing the client and bandwidth limits, so each
+            # records its multipart uploads in its own journal
+            copy.copy(self.file_manager),
+            mission_name,
+            mission_base_path,
+            get_product_and_key,
+            upload_queue=self.upload_queue,
+            metrics=self.metrics,
+            mission_time=mission_time,
+        )
+        with self._lock:
+            self.pipelines[os.path.normpath(mission_base_path)] = pipeline
+            started = self._started
+        if started:
+            pipeline.start()
+        return pipeline
+
+    def _get_pipelines(self) -> List[UploadPipeline]:
+        with self._lock:
+            return list(self.pipelines.values())
+
+    def _get_pipeline(self, file_path: str) -> Optional[UploadPipeline]:
+        """Pipeline of the mission folder a file is in"""
+        directory = os.path.dirname(file_path)
+        with self._lock:
+            while True:
+                pipeline = self.pipelines.get(directory)
+                if pipeline is not None:
+                    return pipeline
+                parent = os.path.dirname(directory)
+                if parent == directory:
+                    return None
+                directory = parent
+
+    def _upload(self, file_path: str) -> None:
+        pipeline = self._get_pipeline(file_path)
+        if pipeline is None:
+            print(f"No mission found for {file_path}")
+            return
+        pipeline.mission_uploader.upload(file_path)
+
+    def _get_product_type(self, file_path: str) -> Optional[str]:
+        pipeline = self._get_pipeline(file_path)
+        return pipeline.get_product_type(file_path) if pipeline else None
+
+    def _register_gauges(self) -> None:
+        self.metrics.gauge(
+            "dsa_upload_backlog_files",
+            "Files waiting to be uploaded or being uploaded",
+            lambda: sum(pipeline.get_backlog()[0] for pipeline in self._get_pipelines()),
+        )
+        self.metrics.gauge(
+            "dsa_upload_backlog_bytes",
+            "Total size of the files waiting to be uploaded or being uploaded",
+            lambda: sum(pipeline.get_backlog()[1] for pipeline in self._get_pipelines()),
+        )
+        self.metrics.gauge(
+            "dsa_upload_queue_pending", "Files waiting for an upload worker", lambda: self.upload_queue.pending
+        )
+        self.metrics.gauge(
+            "dsa_upload_retrying", "Files waiting to be retried", lambda: self.upload_queue.retrying
+        )
+        self.metrics.gauge("dsa_files_settling", "Files still being written", lambda: self.settling)
+        self.metrics.gauge(
+            "dsa_uploads_paused", "1 while uploads are paused by a lost connection", lambda: self.upload_queue.paused
+        )
+        if isinstance(self.file_manager, S3FileManager):
+            self.metrics.gauge(
+                "dsa_upload_memory_bytes",
+                "Bytes of file contents held in memory by uploads in flight",
+                lambda: self.file_manager.memory_budget.in_use,
+            )
+        self.metrics.gauge("dsa_missions_watched", "Mission folders being watched", lambda: len(self.pipelines))
+
+    def start(self) -> None:
+        """Start the shared workers and every mission added so far"""
+        if self.metrics_server:
+            self.metrics_server.start()
+            print(f"Serving upload metrics at {self.metrics_server.url}")
+        if self.metrics_writer:
+            self.metrics_writer.start()
+        self.upload_queue.start()
+        with self._lock:
+            self._started = True
+        for pipeline in self._get_pipelines():
+            pipeline.start()
+
+    def stop_watching(self) -> None:
+        for pipeline in self._get_pipelines():
+            pipeline.stop_watching()
+
+    def drain(self) -> None:
+        """Wait for every queued file to be uploaded and stop the workers"""
+        self.upload_queue.shutdown()
+
+    def close(self) -> None:
+        for pipeline in self._get_pipelines():
+            pipeline.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.metrics_writer:
+            self.metrics_writer.stop()
@@ -0,0 +1,218 @@
+"""Resumable S3 multipart uploads"""
+
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+from typing import Callable, Dict, List, Optional, Protocol, Tuple
+
+from services.file_digest import digest_bytes
+from services.memory_budget import BufferReader, MemoryBudget
+from services.upload_progress import ProgressFile
+
+# S3 limits
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_COUNT = 10000
+
+
+class MultipartStore(Protocol):
+    """Persists upload ids and completed part ETags so uploads can resume"""
+
+    def get_multipart_upload(self, key: str) -> Optional[Tuple[str, int, int, int]]:
+        ...
+
+    def add_multipart_upload(
+        self, upload_id: str, key: str, size: int, mtime_ns: int, part_size: int
+    ) -> None:
+        ...
+
+    def get_multipart_parts(self, upload_id: str) -> Dict[int, str]:
+        ...
+
+    def get_multipart_part_checksums(self, upload_id: str) -> Dict[int, str]:
+        ...
+
+    def add_multipart_part(
+        self, upload_id: str, part_number: int, etag: str, checksum: Optional[str] = None
+    ) -> None:
+        ...
+
+    def remove_multipart_upload(self, upload_id: str) -> None:
+        ...
+
+
+def is_no_such_upload(error: Exception) -> bool:
+    from botocore.exceptions import ClientError
+
+    return (
+        isinstance(error, ClientError)
+        and error.response.get("Error", {}).get("Code") == "NoSuchUpload"
+    )
+
+
+class MultipartUploader:
+    """Uploads large files in parts, resuming from the last completed part
+
+    The upload id and the ETag of every completed part are recorded in the
+    store, so an upload interrupted by a link drop or a restart continues with
+    the remaining parts instead of starting again from zero. With `checksums`,
+    every part is sent with its MD5 and SHA-256 so S3 rejects a part that was
+    corrupted on the way.
+
+    Each part is read once into a buffer lent by the MemoryBudget, then hashed
+    and sent from it without further copies. Parts wait for room in the
+    budget, which bounds memory however large the file and however many parts
+    are in flight. Without one, each upload gets a budget of
+    `max_concurrency` parts.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        store: MultipartStore,
+        part_size: int = 16 * 1024 * 1024,
+        max_concurrency: int = 4,
+        wrap_body: Optional[Callable] = None,
+        checksums: bool = False,
+        memory_budget: Optional[MemoryBudget] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.store = store
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_concurrency = max(max_concurrency, 1)
+        # Wraps each part's file object, e.g. to limit bandwidth
+        self.wrap_body = wrap_body
+        self.checksums = checksums
+        self.memory_budget = memory_budget or MemoryBudget(self.part_size * self.max_concurrency)
+        # Called with the bytes of each part as they are sent, and of parts sent before a resume
+        self.on_progress = on_progress
+
+    def get_part_size(self, file_size: int) -> int:
+        """Configured part size, grown if needed to stay within S3's part count"""
+        return max(self.part_size, math.ceil(file_size / MAX_PART_COUNT))
+
+    def upload(self, file_path: str, key: str) -> None:
+        try:
+            self._upload(file_path, key)
+        except Exception as error:
+            if not is_no_such_upload(error):
+                raise
+            # The upload expired or was aborted on the server, start over
+            existing = self.store.get_multipart_upload(key)
+            if existing:
+                self.store.remove_multipart_upload(existing[0])
+            self._upload(file_path, key)
+
+    def _upload(self, file_path: str, key: str) -> None:
+        stat = os.stat(file_path)
+        upload_id, part_size = self._get_upload(
+            key, stat.st_size, stat.st_mtime_ns, self.get_part_size(stat.st_size)
+        )
+
+        completed_parts = self.store.get_multipart_parts(upload_id)
+        remaining_parts = [
+            (part_number, (part_number - 1) * part_size)
+            for part_number in range(1, max(math.ceil(stat.st_size / part_size), 1) + 1)
+            if part_number not in completed_parts
+        ]
+        if completed_parts:
+            print(
+                f"Resuming upload of {os.path.basename(file_path)} from part {len(completed_parts) + 1}"
+            )
+            if self.on_progress:
+                self.on_progress(
+                    sum(
+                        min(part_size, stat.st_size - (part_number - 1) * part_size)
+                        for part_number in completed_parts
+                    )
+                )
+
+        def upload_part(part: Tuple[int, int]) -> None:
+            part_number, offset = part
+            length = min(part_size, stat.st_size - offset)
+            with self.memory_budget.buffer(length) as data:
+                with open(file_path, "rb", buffering=0) as file:
+                    file.seek(offset)
+                    read = 0
+                    while read < length:
+                        count = file.readinto(data[read:])
+                        if not count:
+                            raise OSError(f"{file_path} got shorter while being uploaded")
+                        read += count
+
+                checksum_args = {}
+                if self.checksums:
+                    digests = digest_bytes(data)
+                    checksum_args = {
+                        "ContentMD5": digests.md5_base64,
+                        "ChecksumSHA256": digests.sha256_base64,
+                    }
+
+                with BufferReader(data) as reader:
+                    body = ProgressFile(reader, self.on_progress) if self.on_progress else reader
+                    response = self.s3_client.upload_part(
+                        Bucket=self.bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        Body=self.wrap_body(body) if self.wrap_body else body,
+                        ContentLength=length,
+                        **checksum_args,
+                    )
+            self.store.add_multipart_part(
+                upload_id, part_number, response["ETag"], checksum_args.get("ChecksumSHA256")
+            )
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            for future in [executor.submit(upload_part, part) for part in remaining_parts]:
+                future.result()
+        finally:
+            # Don't keep sending parts after one has failed
+            executor.shutdown(cancel_futures=True)
+
+        checksums = self.store.get_multipart_part_checksums(upload_id)
+        parts: List[dict] = [
+            {"PartNumber": part_number, "ETag": etag}
+            | ({"ChecksumSHA256": checksums[part_number]} if part_number in checksums else {})
+            for part_number, etag in sorted(self.store.get_multipart_parts(upload_id).items())
+        ]
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+        self.store.remove_multipart_upload(upload_id)
+
+    def _get_upload(
+        self, key: str, size: int, mtime_ns: int, part_size: int
+    ) -> Tuple[str, int]:
+        """Upload id and part size of the upload to continue, or of a new upload"""
+        existing = self.store.get_multipart_upload(key)
+        if existing:
+            upload_id, existing_size, existing_mtime_ns, existing_part_size = existing
+            if (existing_size, existing_mtime_ns) == (size, mtime_ns):
+                # Keep the original part size even if the configured one changed
+                return upload_id, existing_part_size
+
+            # The file changed since the upload started, its parts are useless
+            from botocore.exceptions import ClientError
+
+            try:
+                self.s3_client.abort_multipart_upload(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id
+                )
+            except ClientError:
+                pass
+            self.store.remove_multipart_upload(upload_id)
+
+        upload_id = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            **({"ChecksumAlgorithm": "SHA256"} if self.checksums else {}),
+        )["UploadId"]
+        self.store.add_multipart_upload(upload_id, key, size, mtime_ns, part_size)
+        return upload_id, part_size
@@ -0,0 +1,227 @@
+"""Bundles small products into zip archives uploaded as a single object"""
+
+from dataclasses import dataclass
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import uuid
+import zipfile
+
+from models.product import Product
+from services.structured_log import log_event
+
+# Hidden, so the watcher and the mission scan never pick bundles up as products
+BUNDLE_FILE_PREFIX = ".bundle-"
+MANIFEST_NAME = "manifest.json"
+
+
+@dataclass(frozen=True)
+class BundleMember:
+    path: str
+    # Path inside the archive, relative to the mission folder
+    name: str
+    key: str
+    size: int
+    sha256: str
+
+
+@dataclass(frozen=True)
+class Bundle:
+    path: str
+    product: Product
+    key: str
+    members: Tuple[BundleMember, ...]
+
+
+class ProductBundler:
+    """Groups files of the configured product types into zip archives
+
+    Files are grouped by product type and subtype. A group is written to an
+    archive once it has `max_files` files or `max_bytes` of data, or `window`
+    seconds after its first file arrived. Each archive holds the files and a
+    manifest.json describing them, and is uploaded under the key its first
+    file would have had, with a .zip extension.
+
+    Archives are written next to the journal in the mission folder and handed
+    to `queue_bundle`. If an archive can't be written its files are handed to
+    `queue_file` to be uploaded on their own.
+    """
+
+    def __init__(
+        self,
+        mission_base_path: str,
+        get_product_and_key: Callable[[str], Tuple[Product, str]],
+        queue_bundle: Callable[[str], None],
+        queue_file: Callable[[str], None],
+        product_types: Iterable[str] = ("tactical",),
+        window: float = 10,
+        max_files: int = 50,
+        max_bytes: int = 8 * 1024 * 1024,
+    ) -> None:
+        self.mission_base_path = mission_base_path
+        self.get_product_and_key = get_product_and_key
+        self.queue_bundle = queue_bundle
+        self.queue_file = queue_file
+        self.product_types = frozenset(product_types)
+        self.window = window
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+        # Per (type, subtype): when the first file arrived, and each file with its product, key and size
+        self._groups: Dict[Tuple[str, Optional[str]], Tuple[float, List[Tuple[str, Product, str, int]]]] = {}
+        self._bundles: Dict[str, Bundle] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="product-bundler", daemon=True)
+
+    @property
+    def pending(self) -> int:
+        """Number of files waiting to be bundled"""
+        with self._lock:
+            return sum(len(files) for _, files in self._groups.values())
+
+    def add(self, file_path: str) -> bool:
+        """Hold a file for bundling, returning False if it shouldn't be bundled"""
+        try:
+            product, key = self.get_product_and_key(file_path)
+            size = os.path.getsize(file_path)
+        except (ValueError, OSError):
+            # Left to the uploader, which reports the error
+            return False
+        if product.type not in self.product_types:
+            return False
+
+        group_key = (product.type, product.subtype)
+        with self._lock:
+            _, files = self._groups.setdefault(group_key, (time.monotonic(), []))
+            files.append((file_path, product, key, size))
+            full = len(files) >= self.max_files or sum(file[3] for file in files) >= self.max_bytes
+            if full:
+                del self._groups[group_key]
+        if full:
+            self._write_bundle(files)
+        return True
+
+    def get_bundle(self, file_path: str) -> Optional[Bundle]:
+        with self._lock:
+            return self._bundles.get(file_path)
+
+    def remove(self, bundle: Bundle) -> None:
+        """Delete an archive once it is uploaded or has failed"""
+        with self._lock:
+            self._bundles.pop(bundle.path, None)
+        try:
+            os.remove(bundle.path)
+        except OSError:
+            pass
+
+    def flush(self, max_age: float = 0) -> None:
+        """Bundle every group whose first file arrived at least `max_age` seconds ago"""
+        now = time.monotonic()
+        with self._lock:
+            due = [group_key for group_key, (started_at, _) in self._groups.items() if now - started_at >= max_age]
+            groups = [self._groups.pop(group_key)[1] for group_key in due]
+        for files in groups:
+            self._write_bundle(files)
+
+    def remove_stale_bundles(self) -> List[str]:
+        """Delete archives left by a previous run, returning their paths
+
+        Their files are still queued in the journal, so they are found and
+        bundled again by the mission scan.
+        """
+        stale = glob.glob(os.path.join(glob.escape(self.mission_base_path), f"{BUNDLE_FILE_PREFIX}*.zip"))
+        for file_path in stale:
+            try:
+                os.remove(file_path)
+            except OSError as error:
+                print(error)
+        return stale
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the timer thread after bundling every file still held"""
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(min(self.window, 1)):
+            try:
+                self.flush(self.window)
+            except Exception as error:
+                log_event("bundle.error", logging.ERROR, exc_info=error)
+                print(f"Bundling error: {error}")
+
+    def _write_bundle(self, files: List[Tuple[str, Product, str, int]]) -> None:
+        _, product, key, _ = files[0]
+        bundle_path = os.path.join(
+            self.mission_base_path, f"{BUNDLE_FILE_PREFIX}{uuid.uuid4().hex}.zip"
+        )
+        try:
+            members = self._write_archive(bundle_path, files)
+        except OSError as error:
+            print(f"Failed to bundle {len(files)} files, uploading them separately: {error}")
+            try:
+                os.remove(bundle_path)
+            except OSError:
+                pass
+            for file_path, *_ in files:
+                self.queue_file(file_path)
+            return
+
+        bundle = Bundle(bundle_path, product, f"{os.path.splitext(key)[0]}.zip", members)
+        with self._lock:
+            self._bundles[bundle_path] = bundle
+        log_event("bundle.created", file=bundle_path, key=bundle.key, files=len(members))
+        self.queue_bundle(bundle_path)
+
+    def _write_archive(
+        self, bundle_path: str, files: List[Tuple[str, Product, str, int]]
+    ) -> Tuple[BundleMember, ...]:
+        members = []
+        with zipfile.ZipFile(bundle_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for file_path, product, key, _ in files:
+                name = os.path.relpath(file_path, self.mission_base_path).replace(os.sep, "/")
+                info = zipfile.ZipInfo(name, product.timestamp.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                sha256 = hashlib.sha256()
+                size = 0
+                # Copied in chunks, hashing what is written so the manifest matches the archive
+                with open(file_path, "rb") as source, archive.open(info, "w") as destination:
+                    while chunk := source.read(1024 * 1024):
+                        sha256.update(chunk)
+                        destination.write(chunk)
+                        size += len(chunk)
+                members.append(BundleMember(file_path, name, key, size, sha256.hexdigest()))
+
+            # Dated like the first file, so bundling the same files again gives the same archive
+            manifest_info = zipfile.ZipInfo(MANIFEST_NAME, files[0][1].timestamp.timetuple()[:6])
+            manifest_info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(
+                manifest_info,
+                json.dumps(
+                    {
+                        "files": [
+                            {
+                                "name": member.name,
+                                "key": member.key,
+                                "size": member.size,
+                                "sha256": member.sha256,
+                                "timestamp": product.timestamp.isoformat(),
+                            }
+                            for member, (_, product, _, _) in zip(members, files)
+                        ],
+                    },
+                    indent=2,
+                ),
+            )
+        return tuple(members)
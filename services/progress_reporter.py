@@ -0,0 +1,185 @@
+"""Live upload status on the console and in a status file"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Callable, Optional, TextIO
+
+from services.upload_progress import ProgressSnapshot
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_rate(bytes_per_second: float) -> str:
+    """In bits per second, as link speeds are given"""
+    bits = bytes_per_second * 8
+    if bits >= 1_000_000:
+        return f"{bits / 1_000_000:.1f} Mbit/s"
+    return f"{bits / 1000:.0f} kbit/s"
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "unknown"
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def format_status(snapshot: ProgressSnapshot) -> str:
+    """One line summary, e.g. `2.1 Mbit/s (avg 1.8) | ir_mosaic.tif 45% +1 | 12 files, 3.4 GB left | ETA 4h05m`"""
+    parts = [f"{format_rate(snapshot.rate)} (avg {format_rate(snapshot.smoothed_rate).split()[0]})"]
+    if snapshot.files:
+        # The file that will take longest is the one worth watching
+        slowest = max(snapshot.files, key=lambda file: file.size - file.sent)
+        others = f" +{len(snapshot.files) - 1}" if len(snapshot.files) > 1 else ""
+        parts.append(f"{os.path.basename(slowest.path)} {slowest.fraction:.0%}{others}")
+    parts.append(f"{snapshot.backlog_files} files, {format_bytes(snapshot.backlog_bytes)} left")
+    parts.append(f"ETA {format_duration(snapshot.eta_seconds)}")
+    return " | ".join(parts)
+
+
+class StatusConsole:
+    """Stream wrapper keeping a status line at the bottom of a terminal
+
+    Everything else written to the stream is printed above the status line,
+    which is redrawn after each complete line of output.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self._status = ""
+        # Whether the status line is on screen, and whether other output is part way through a line
+        self._drawn = False
+        self._mid_line = False
+        self._lock = threading.RLock()
+
+    def set_status(self, status: str) -> None:
+        # A line that wraps couldn't be cleared
+        status = status[: max(shutil.get_terminal_size().columns - 1, 20)]
+        with self._lock:
+            self._status = status
+            if not self._mid_line:
+                self.stream.write(f"\r\033[K{status}")
+                self.stream.flush()
+                self._drawn = True
+
+    def clear_status(self) -> None:
+        with self._lock:
+            self._status = ""
+            if self._drawn:
+                self.stream.write("\r\033[K")
+                self.stream.flush()
+                self._drawn = False
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            if not text:
+                return 0
+            if self._drawn:
+                self.stream.write("\r\033[K")
+                self._drawn = False
+            written = self.stream.write(text)
+            self._mid_line = not text.endswith("\n")
+            if self._status and not self._mid_line:
+                self.stream.write(self._status)
+                self._drawn = True
+            return written
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+
+class ProgressReporter:
+    """Samples upload progress every `interval` seconds and reports it
+
+    The status line is kept at the bottom of `console` if there is one, with
+    everything printed going through it until the reporter is stopped, and
+    printed every `log_interval` seconds while uploads are running otherwise,
+    e.g. when running as a service. Each sample is also written as JSON to
+    `file_path`, if set, for other tools on the aircraft to read.
+    """
+
+    def __init__(
+        self,
+        sample: Callable[[], ProgressSnapshot],
+        console: Optional[StatusConsole] = None,
+        file_path: Optional[str] = None,
+        interval: float = 1,
+        log_interval: float = 60,
+    ) -> None:
+        self.sample = sample
+        self.console = console
+        self.file_path = file_path
+        self.interval = interval
+        self.log_interval = log_interval
+
+        self._logged_at = time.monotonic()
+        self._stdout: Optional[TextIO] = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="progress-reporter", daemon=True)
+
+    def start(self) -> None:
+        if self.console:
+            # Everything printed goes through the console, so the status line stays below it
+            self._stdout = sys.stdout
+            sys.stdout = self.console
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if self.console:
+            self.console.clear_status()
+        if self._stdout is not None:
+            sys.stdout = self._stdout
+            self._stdout = None
+
+    def report(self) -> ProgressSnapshot:
+        snapshot = self.sample()
+        status = format_status(snapshot)
+        busy = bool(snapshot.files or snapshot.backlog_files)
+        if self.console:
+            if busy:
+                self.console.set_status(status)
+            else:
+                self.console.clear_status()
+        elif busy and time.monotonic() - self._logged_at >= self.log_interval:
+            self._logged_at = time.monotonic()
+            print(status)
+        if self.file_path:
+            self.write(snapshot)
+        return snapshot
+
+    def write(self, snapshot: ProgressSnapshot) -> None:
+        # Written next to the file and renamed, so readers never see a partial status
+        temporary_path = f"{self.file_path}.tmp"
+        try:
+            with open(temporary_path, "w") as file:
+                json.dump({"time": time.time(), **snapshot.to_dict()}, file)
+            os.replace(temporary_path, self.file_path)
+        except OSError as error:
+            print(f"Failed to write upload status to {self.file_path}: {error}")
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.report()
+            except Exception as error:
+                print(f"Upload progress error: {error}")
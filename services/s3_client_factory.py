@@ -0,0 +1,87 @@
+"""Shared, pooled S3 clients per account"""
+
+import threading
+from typing import Dict, Tuple
+
+_clients: Dict[Tuple, object] = {}
+_sessions: Dict[Tuple[str, str], object] = {}
+_lock = threading.Lock()
+
+
+def get_s3_client(
+    aws_access_key_id: str,
+    aws_secret_access_key: str,
+    max_pool_connections: int = 10,
+    connect_timeout: float = 10,
+    read_timeout: float = 60,
+    tcp_keepalive: bool = True,
+    endpoint_url: str | None = None,
+):
+    """S3 client for an account, created once and shared by every caller
+
+    Sessions are cached per set of credentials and clients per set of
+    credentials and connection settings, so credential resolution and the
+    connection pool are reused instead of being rebuilt for each file manager.
+    `endpoint_url` targets an S3 compatible server (e.g. a local test stand-in)
+    instead of AWS, using path style addressing.
+    """
+    # boto3 takes a large share of startup, so it's only loaded once an S3 account is used
+    import boto3
+    from botocore.config import Config
+
+    credentials = (aws_access_key_id, aws_secret_access_key)
+    cache_key = (
+        *credentials,
+        max_pool_connections,
+        connect_timeout,
+        read_timeout,
+        tcp_keepalive,
+        endpoint_url,
+    )
+
+    with _lock:
+        if cache_key not in _clients:
+            if credentials not in _sessions:
+                _sessions[credentials] = boto3.session.Session(
+                    aws_access_key_id=aws_access_key_id,
+                    aws_secret_access_key=aws_secret_access_key,
+                )
+            _clients[cache_key] = _sessions[credentials].client(
+                "s3",
+                endpoint_url=endpoint_url,
+                config=Config(
+                    max_pool_connections=max_pool_connections,
+                    connect_timeout=connect_timeout,
+                    read_timeout=read_timeout,
+                    tcp_keepalive=tcp_keepalive,
+                    s3={"addressing_style": "path"} if endpoint_url else None,
+                ),
+            )
+        return _clients[cache_key]
+
+
+def clear_s3_clients() -> None:
+    """Forget every cached session and client"""
+    with _lock:
+        _clients.clear()
+        _sessions.clear()
+
+
+def warm_up(s3_client, bucket: str) -> threading.Thread:
+    """Open a connection to the bucket in the background
+
+    Resolves the endpoint and completes the TLS handshake with a HeadBucket
+    request while the operator is still entering mission details, so the first
+    upload doesn't pay for it. Failures are ignored, they will be reported by
+    the first real request.
+    """
+
+    def head_bucket() -> None:
+        try:
+            s3_client.head_bucket(Bucket=bucket)
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=head_bucket, name="s3-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -1,20 +1,272 @@
-import boto3
+import io
+import os
+from typing import Set
 
+from services.bandwidth_limiter import BandwidthLimiter
+from services.compression import CODECS, SPOOL_SIZE, Compressor
+from services.file_digest import FileDigests, digest_file, digest_fileobj
+from services.memory_budget import MemoryBudget
+from services.multipart_uploader import MultipartStore, MultipartUploader
+from services.shared_file_cache import SharedFileCache
+from services.s3_client_factory import get_s3_client, warm_up
+from services.storage_backend import StorageBackend
+from services.upload_progress import FileUpload, ProgressFile, UploadProgress
 
-class S3FileManager:
-    def __init__(self, aws_access_key_id: str, aws_secret_access_key: str, bucket: str):
+MB = 1024 * 1024
+
+
+class S3FileManager(StorageBackend):
+    def __init__(
+        self,
+        aws_access_key_id: str,
+        aws_secret_access_key: str,
+        bucket: str,
+        multipart_threshold: int = 64 * MB,
+        part_size: int = 16 * MB,
+        max_concurrency: int = 4,
+        bandwidth_limiter: BandwidthLimiter | None = None,
+        max_pool_connections: int = 10,
+        connect_timeout: float = 10,
+        read_timeout: float = 60,
+        tcp_keepalive: bool = True,
+        endpoint_url: str | None = None,
+        checksums: bool = True,
+        compressor: Compressor | None = None,
+        memory_budget: MemoryBudget | None = None,
+    ):
         self.aws_access_key_id = aws_access_key_id
         self.aws_secret_access_key = aws_secret_access_key
         self.bucket = bucket
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.bandwidth_limiter = bandwidth_limiter
+        # Send MD5 and SHA-256 checksums so S3 rejects corrupted uploads. SHA-256 rather than
+        # CRC32C, since the digests are already taken to skip duplicates and CRC32C needs awscrt
+        self.checksums = checksums
+        self.compressor = compressor
+        # Shared by every upload, so parts and compressed copies in memory stay within it
+        self.memory_budget = memory_budget or MemoryBudget(part_size * max_concurrency)
+
+        # Set once the mission journal exists so multipart uploads can resume
+        self.multipart_store: MultipartStore | None = None
+        # Set when uploading to several destinations, which share one read of each file
+        self.file_cache: SharedFileCache | None = None
+        # Set by the pipeline to report the bytes sent by each upload
+        self.progress: UploadProgress | None = None
+
+        self.s3_client = get_s3_client(
+            self.aws_access_key_id,
+            self.aws_secret_access_key,
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            tcp_keepalive=tcp_keepalive,
+            endpoint_url=endpoint_url,
+        )
+        from boto3.s3.transfer import TransferConfig
+
+        self.transfer_config = TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.part_size,
+            max_concurrency=self.max_concurrency,
+        )
+
+    def upload_file(
+        self,
+        file_path: str,
+        s3_key: str,
+        product_type: str | None = None,
+        digests: FileDigests | None = None,
+    ):
+        file_size = os.path.getsize(file_path)
+        if not self.progress:
+            self._upload_file(file_path, s3_key, product_type, digests, file_size, None)
+            return
+        with self.progress.track(file_path, file_size) as upload:
+            self._upload_file(file_path, s3_key, product_type, digests, file_size, upload)
+
+    def upload_metadata_file(self, file_path: str, key: str) -> None:
+        self._upload_file(file_path, key, None, None, os.path.getsize(file_path), None)
+
+    def _upload_file(
+        self,
+        file_path: str,
+        s3_key: str,
+        product_type: str | None,
+        digests: FileDigests | None,
+        file_size: int,
+        upload: FileUpload | None,
+    ) -> None:
+        limiter = self.bandwidth_limiter
+        if self.multipart_store and file_size >= self.multipart_threshold:
+            MultipartUploader(
+                self.s3_client,
+                self.bucket,
+                self.multipart_store,
+                part_size=self.part_size,
+                max_concurrency=self.max_concurrency,
+                wrap_body=(lambda body: limiter.wrap(body, product_type)) if limiter else None,
+                checksums=self.checksums,
+                memory_budget=self.memory_budget,
+                on_progress=upload.add if upload else None,
+            ).upload(file_path, s3_key)
+            return
+
+        codec = self.compressor.get_codec(file_path, product_type) if self.compressor else None
+        if codec and file_size < self.multipart_threshold and self._upload_compressed(
+            file_path, s3_key, product_type, codec, file_size, digests, upload
+        ):
+            return
 
-        self.s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=self.aws_access_key_id,
-            aws_secret_access_key=self.aws_secret_access_key,
+        if file_size < self.multipart_threshold:
+            # A single request streamed from the file, so S3 can check the whole
+            # file against its digests
+            arguments = {}
+            if self.checksums:
+                digests = digests or digest_file(file_path)
+                arguments = {
+                    "ContentMD5": digests.md5_base64,
+                    "ChecksumSHA256": digests.sha256_base64,
+                }
+            with self._open(file_path, digests) as file:
+                self.s3_client.put_object(
+                    Bucket=self.bucket,
+                    Key=s3_key,
+                    Body=self._wrap(file, product_type, upload),
+                    ContentLength=file_size,
+                    **arguments,
+                )
+            return
+
+        if limiter or self.file_cache:
+            with self._open(file_path, digests) as file:
+                self.s3_client.upload_fileobj(
+                    limiter.wrap(file, product_type) if limiter else file,
+                    self.bucket,
+                    s3_key,
+                    Config=self.transfer_config,
+                    Callback=upload.add if upload else None,
+                )
+            return
+
+        self.s3_client.upload_file(
+            file_path,
+            self.bucket,
+            s3_key,
+            Config=self.transfer_config,
+            Callback=upload.add if upload else None,
         )
 
-    def upload_file(self, file_path: str, s3_key: str):
-        self.s3_client.upload_file(file_path, self.bucket, s3_key)
+    def _wrap(self, file, product_type: str | None, upload: FileUpload | None):
+        """File object to send, throttled by the bandwidth limiter and counted as it is read"""
+        if self.bandwidth_limiter:
+            file = self.bandwidth_limiter.wrap(file, product_type)
+        return ProgressFile(file, upload.add) if upload else file
+
+    def _open(self, file_path: str, digests: FileDigests | None):
+        """The file's contents from the shared cache if they are there, otherwise the file"""
+        data = self.file_cache.get_data(file_path, digests) if self.file_cache and digests else None
+        return io.BytesIO(data) if data is not None else open(file_path, "rb")
+
+    def _upload_compressed(
+        self,
+        file_path: str,
+        s3_key: str,
+        product_type: str | None,
+        codec: str,
+        file_size: int,
+        digests: FileDigests | None = None,
+        upload: FileUpload | None = None,
+    ) -> bool:
+        """Uploads a compressed copy of a file under the same key, if it compresses well"""
+        if self.file_cache and digests and file_size <= self.file_cache.max_file_size:
+            # Compressed once, from the shared contents, for every destination.
+            # Fetched even when already compressed, so the contents are dropped once all have them
+            data = self.file_cache.get_data(file_path, digests)
+            compressed = self.file_cache.get_derived(
+                file_path,
+                "compressed",
+                lambda: self._compress_shared(file_path, codec, file_size, data),
+                codec,
+            )
+            if compressed is None:
+                return False
+            self._put_compressed(io.BytesIO(compressed), s3_key, product_type, codec, file_size, upload)
+            return True
+
+        # Compressed in memory if the budget has room, otherwise in a temporary file
+        spool_size = min(file_size, SPOOL_SIZE)
+        if not self.memory_budget.try_acquire(spool_size):
+            spool_size = 0
+        try:
+            compressed, _ = self.compressor.compress(file_path, codec, spool_size)
+            if compressed is None:
+                return False
+            with compressed:
+                self._put_compressed(compressed, s3_key, product_type, codec, file_size, upload)
+            return True
+        finally:
+            self.memory_budget.release(spool_size)
+
+    def _compress_shared(
+        self, file_path: str, codec: str, file_size: int, data: bytes | None
+    ) -> bytes | None:
+        # Kept in memory by the shared cache, within its own cap, rather than this destination's budget
+        with io.BytesIO(data) if data is not None else open(file_path, "rb") as source:
+            compressed, _ = self.compressor.compress_fileobj(source, codec, spool_size=file_size + 1)
+        if compressed is None:
+            return None
+        with compressed:
+            return compressed.read()
+
+    def _put_compressed(
+        self,
+        compressed,
+        s3_key: str,
+        product_type: str | None,
+        codec: str,
+        file_size: int,
+        upload: FileUpload | None,
+    ) -> None:
+        if upload:
+            # Progress is of the bytes actually sent
+            upload.size = compressed.seek(0, io.SEEK_END)
+            compressed.seek(0)
+        arguments = {}
+        if self.checksums:
+            # Checked by S3 against the bytes sent, which are the compressed ones
+            digests = digest_fileobj(compressed)
+            compressed.seek(0)
+            arguments = {
+                "ContentLength": digests.size,
+                "ContentMD5": digests.md5_base64,
+                "ChecksumSHA256": digests.sha256_base64,
+            }
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=s3_key,
+            Body=self._wrap(compressed, product_type, upload),
+            ContentEncoding=CODECS[codec][0],
+            Metadata={"uncompressed-size": str(file_size)},
+            **arguments,
+        )
 
     def upload_empty_file(self, file_key: str) -> None:
         self.s3_client.put_object(Bucket=self.bucket, Key=file_key, Body="")
+
+    def warm_up(self) -> None:
+        """Connect to the bucket in the background before the first upload"""
+        warm_up(self.s3_client, self.bucket)
+
+    def check_connection(self) -> None:
+        """Raises if the bucket can't be reached"""
+        self.s3_client.head_bucket(Bucket=self.bucket)
+
+    def list_keys(self, prefix: str) -> Set[str]:
+        """Keys of every object in the bucket under a prefix"""
+        keys = set()
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.update(item["Key"] for item in page.get("Contents", []))
+        return keys
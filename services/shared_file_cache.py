@@ -0,0 +1,197 @@
+"""Contents and digests of files read once and shared by several destinations"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from services.file_digest import FileDigests, digest_bytes, digest_file
+
+MB = 1024 * 1024
+
+
+@dataclass
+class _Entry:
+    version: Tuple[int, int]
+    digests: FileDigests
+    data: Optional[bytes]
+    reads: int = 0
+
+
+@dataclass
+class _Derived:
+    version: Tuple[int, int]
+    data: Optional[bytes]
+    reads: int = 0
+
+
+class SharedFileCache:
+    """Reads each file once when it is uploaded to several destinations
+
+    The first destination to ask for a file's digests reads it: files up to
+    `max_file_size` are read into memory in one go and their contents kept
+    until `readers` destinations have fetched them, larger files are only
+    hashed. Contents are dropped oldest first to stay under `max_bytes`, after
+    which the file is read from disk again. Entries are keyed by path and
+    checked against the file's size and modified time, so a rewritten file is
+    read again. `max_bytes` is its own cap, on top of each destination's
+    MemoryBudget, since the contents are shared by all of them.
+
+    Files made from a file, like its compressed copy or its preview, are
+    shared the same way with `get_derived`, kept until the number of
+    destinations given for their kind in `derived_readers` have fetched them.
+    """
+
+    def __init__(
+        self,
+        readers: int,
+        max_file_size: int = 16 * MB,
+        max_bytes: int = 256 * MB,
+        max_entries: int = 10000,
+        derived_readers: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.readers = readers
+        self.derived_readers = derived_readers or {}
+        self.max_file_size = max_file_size
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.read_count = 0
+        self.hit_count = 0
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._derived: "OrderedDict[Tuple[str, str, str], _Derived]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # One lock per file being read or made, so destinations asking at once share the work
+        self._loading: Dict[object, threading.Lock] = {}
+
+    @property
+    def cached_bytes(self) -> int:
+        with self._lock:
+            return self._bytes
+
+    def get_digests(self, file_path: str) -> FileDigests:
+        """Digests of a file's current contents, reading it only if needed"""
+        with self._lock:
+            loading = self._loading.setdefault(file_path, threading.Lock())
+        with loading:
+            stat = os.stat(file_path)
+            version = (stat.st_size, stat.st_mtime_ns)
+            with self._lock:
+                entry = self._entries.get(file_path)
+                if entry and entry.version == version:
+                    self.hit_count += 1
+                    return entry.digests
+
+            entry = self._read(file_path, version)
+            with self._lock:
+                self.read_count += 1
+                self._store(file_path, entry)
+            return entry.digests
+
+    def get_data(self, file_path: str, digests: FileDigests) -> Optional[bytes]:
+        """Cached contents matching `digests`, or None to read the file from disk"""
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is None or entry.data is None or entry.digests != digests:
+                return None
+            data = entry.data
+            entry.reads += 1
+            if entry.reads >= self.readers:
+                # Every destination has it, keep only the digests
+                self._drop_data(entry)
+            return data
+
+    def get_derived(
+        self, file_path: str, kind: str, make: Callable[[], Optional[bytes]], variant: str = ""
+    ) -> Optional[bytes]:
+        """What `make` returns for the file's current contents, made once for every destination
+
+        `kind` and `variant`, e.g. a codec or preview settings, tell apart the
+        files made from one file. A None from `make`, e.g. for a file that
+        doesn't compress well, is shared too. Exceptions aren't, so the next
+        destination tries again.
+        """
+        name = (file_path, kind, variant)
+        with self._lock:
+            loading = self._loading.setdefault(name, threading.Lock())
+        with loading:
+            stat = os.stat(file_path)
+            version = (stat.st_size, stat.st_mtime_ns)
+            with self._lock:
+                derived = self._derived.get(name)
+                if derived and derived.version == version:
+                    self.hit_count += 1
+                    self._read_derived(name, derived)
+                    return derived.data
+
+            data = make()
+            derived = _Derived(version, data)
+            with self._lock:
+                self._store_derived(name, derived)
+                self._read_derived(name, derived)
+            return data
+
+    def _read_derived(self, name: Tuple[str, str, str], derived: _Derived) -> None:
+        derived.reads += 1
+        if derived.reads >= self.derived_readers.get(name[1], self.readers):
+            self._pop_derived(name)
+
+    def _read(self, file_path: str, version: Tuple[int, int]) -> _Entry:
+        if version[0] > self.max_file_size:
+            return _Entry(version, digest_file(file_path), None)
+        with open(file_path, "rb") as file:
+            data = file.read()
+        digests = digest_bytes(data)
+        # Written to again while being read, so the contents can't be shared
+        if digests.size != version[0]:
+            return _Entry((digests.size, version[1]), digests, None)
+        return _Entry(version, digests, data)
+
+    def _store(self, file_path: str, entry: _Entry) -> None:
+        previous = self._entries.pop(file_path, None)
+        if previous:
+            self._drop_data(previous)
+        if entry.data is not None:
+            if len(entry.data) > self.max_bytes:
+                entry.data = None
+            else:
+                self._make_room(len(entry.data))
+                self._bytes += len(entry.data)
+        self._entries[file_path] = entry
+        while len(self._entries) > self.max_entries:
+            oldest_path, oldest = self._entries.popitem(last=False)
+            self._loading.pop(oldest_path, None)
+            self._drop_data(oldest)
+
+    def _store_derived(self, name: Tuple[str, str, str], derived: _Derived) -> None:
+        self._pop_derived(name)
+        size = len(derived.data or b"")
+        if size > self.max_bytes:
+            return
+        self._make_room(size)
+        self._bytes += size
+        self._derived[name] = derived
+        while len(self._derived) > self.max_entries:
+            self._pop_derived(next(iter(self._derived)))
+
+    def _pop_derived(self, name: Tuple[str, str, str]) -> None:
+        derived = self._derived.pop(name, None)
+        self._loading.pop(name, None)
+        if derived:
+            self._bytes -= len(derived.data or b"")
+
+    def _make_room(self, size: int) -> None:
+        for entry in self._entries.values():
+            if self._bytes + size <= self.max_bytes:
+                return
+            self._drop_data(entry)
+        # Then the oldest files made from files, which can be made again
+        while self._derived and self._bytes + size > self.max_bytes:
+            self._pop_derived(next(iter(self._derived)))
+
+    def _drop_data(self, entry: _Entry) -> None:
+        if entry.data is not None:
+            self._bytes -= len(entry.data)
+            entry.data = None
@@ -0,0 +1,94 @@
+"""Interface shared by the places products can be uploaded to"""
+
+from abc import ABC, abstractmethod
+import asyncio
+from typing import Iterable, List, Optional, Set, Tuple
+
+from services.file_digest import FileDigests
+
+
+class StorageBackend(ABC):
+    """Somewhere products can be uploaded to, keyed like S3 objects"""
+
+    @abstractmethod
+    def upload_file(
+        self,
+        file_path: str,
+        key: str,
+        product_type: Optional[str] = None,
+        digests: Optional[FileDigests] = None,
+    ) -> None:
+        """Upload a file under a key
+
+        `digests` of the file's contents, when already computed, are used to
+        verify the upload.
+        """
+
+    def upload_metadata_file(self, file_path: str, key: str) -> None:
+        """Upload a file the app writes about the mission, like its manifest
+
+        Unlike products, these aren't counted in upload progress.
+        """
+        self.upload_file(file_path, key)
+
+    @abstractmethod
+    def upload_empty_file(self, file_key: str) -> None:
+        """Create an empty object under a key"""
+
+    def list_keys(self, prefix: str) -> Set[str]:
+        """Keys of every object under a prefix"""
+        return set()
+
+    def check_connection(self) -> None:
+        """Raises if the storage can't be reached"""
+
+    def warm_up(self) -> None:
+        """Prepare connections before the first upload"""
+
+
+class AsyncStorageBackend:
+    """asyncio interface to a StorageBackend
+
+    Each call runs the blocking backend method in a worker thread, with at most
+    `max_concurrency` calls in flight at once.
+    """
+
+    def __init__(self, backend: StorageBackend, max_concurrency: int = 4) -> None:
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def upload_file(
+        self,
+        file_path: str,
+        key: str,
+        product_type: Optional[str] = None,
+        digests: Optional[FileDigests] = None,
+    ) -> None:
+        async with self._get_semaphore():
+            await asyncio.to_thread(self.backend.upload_file, file_path, key, product_type, digests)
+
+    async def upload_empty_file(self, file_key: str) -> None:
+        async with self._get_semaphore():
+            await asyncio.to_thread(self.backend.upload_empty_file, file_key)
+
+    async def list_keys(self, prefix: str) -> Set[str]:
+        async with self._get_semaphore():
+            return await asyncio.to_thread(self.backend.list_keys, prefix)
+
+    async def upload_files(
+        self, uploads: Iterable[Tuple[str, str, Optional[str]]]
+    ) -> List[Optional[BaseException]]:
+        """Upload (file path, key, product type) tuples concurrently
+
+        Returns the error raised by each upload, or None for uploads that succeeded.
+        """
+        return await asyncio.gather(
+            *(self.upload_file(*upload) for upload in uploads), return_exceptions=True
+        )
@@ -0,0 +1,53 @@
+"""Structured JSON logging of upload events
+
+Console output stays as plain print statements for the operator. When a log
+file is configured, every upload event is also written to it as one JSON
+object per line, carrying the correlation id of the file it concerns so all
+the attempts to upload a file can be followed.
+"""
+
+from datetime import datetime, timezone
+import json
+import logging
+from typing import Optional
+import uuid
+
+logger = logging.getLogger("airborne_dsa")
+# Nothing is logged, not even errors to stderr, until a log file is configured
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Formats each record as a single line JSON object"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "thread": record.threadName,
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["traceback"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(log_file: Optional[str]) -> None:
+    """Write upload events as JSON lines to a file"""
+    if not log_file:
+        return
+    handler = logging.FileHandler(log_file, encoding="utf-8")
+    handler.setFormatter(JsonLogFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def log_event(event: str, level: int = logging.INFO, exc_info=None, **fields) -> None:
+    """Log an event, e.g. `upload.done`, with fields describing it"""
+    logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:16]
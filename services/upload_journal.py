@@ -0,0 +1,355 @@
+"""Persistent record of the upload state of every file in a mission"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from services.file_digest import digest_file
+
+QUEUED = "queued"
+UPLOADING = "uploading"
+DONE = "done"
+FAILED = "failed"
+
+JOURNAL_FILE_NAME = ".upload_journal.sqlite3"
+
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file's contents"""
+    return digest_file(file_path, chunk_size).sha256_hex
+
+
+class UploadJournal:
+    """SQLite journal of uploads, stored in the mission folder
+
+    Each file is recorded by its path relative to the mission folder together
+    with its size, modified time and the hash of the contents last uploaded,
+    and moves through the queued -> uploading -> done/failed states. After a
+    restart, files that were queued or uploading are resumed and files already
+    done are skipped.
+    """
+
+    def __init__(self, mission_base_path: str, file_name: str = JOURNAL_FILE_NAME) -> None:
+        self.mission_base_path = mission_base_path
+        self.journal_path = os.path.join(mission_base_path, file_name)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.journal_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS uploads (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    hash TEXT,
+                    key TEXT,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS multipart_uploads (
+                    upload_id TEXT PRIMARY KEY,
+                    key TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    part_size INTEGER NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS multipart_parts (
+                    upload_id TEXT NOT NULL,
+                    part_number INTEGER NOT NULL,
+                    etag TEXT NOT NULL,
+                    checksum TEXT,
+                    PRIMARY KEY (upload_id, part_number)
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS manifest (
+                    key TEXT PRIMARY KEY,
+                    product_type TEXT NOT NULL,
+                    product_subtype TEXT,
+                    size INTEGER NOT NULL,
+                    hash TEXT,
+                    timestamp TEXT NOT NULL,
+                    bundle_key TEXT,
+                    preview INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            # Journals created before part checksums were recorded
+            part_columns = [
+                row[1] for row in self._connection.execute("PRAGMA table_info(multipart_parts)")
+            ]
+            if "checksum" not in part_columns:
+                self._connection.execute("ALTER TABLE multipart_parts ADD COLUMN checksum TEXT")
+            # Looked up for every upload to skip contents already uploaded
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS uploads_hash ON uploads (hash)"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _relative_path(self, file_path: str) -> str:
+        return os.path.relpath(file_path, self.mission_base_path)
+
+    def _execute(self, sql: str, parameters: tuple = ()) -> List[tuple]:
+        with self._lock, self._connection:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def get_state(self, file_path: str) -> Optional[str]:
+        """Current state of a file, or None if it has never been queued"""
+        rows = self._execute(
+            "SELECT state FROM uploads WHERE path = ?", (self._relative_path(file_path),)
+        )
+        return rows[0][0] if rows else None
+
+    def is_uploaded(self, file_path: str, size: int, mtime_ns: int) -> bool:
+        """Whether this exact version of a file has already been uploaded"""
+        rows = self._execute(
+            "SELECT 1 FROM uploads WHERE path = ? AND size = ? AND mtime_ns = ? AND state = ?",
+            (self._relative_path(file_path), size, mtime_ns, DONE),
+        )
+        return bool(rows)
+
+    def is_hash_uploaded(self, file_path: str, file_hash: str) -> bool:
+        """Whether this file was already uploaded with the same contents"""
+        rows = self._execute(
+            "SELECT 1 FROM uploads WHERE path = ? AND hash = ?",
+            (self._relative_path(file_path), file_hash),
+        )
+        return bool(rows)
+
+    def get_key_for_hash(self, file_hash: str) -> Optional[str]:
+        """Key any file in the mission with these contents was uploaded as, if one was"""
+        rows = self._execute(
+            "SELECT key FROM uploads WHERE hash = ? AND state = ? LIMIT 1", (file_hash, DONE)
+        )
+        return rows[0][0] if rows else None
+
+    def get_uploaded_versions(self) -> Dict[str, Tuple[int, int]]:
+        """Size and modified time of every uploaded file, keyed by absolute path"""
+        rows = self._execute(
+            "SELECT path, size, mtime_ns FROM uploads WHERE state = ?", (DONE,)
+        )
+        return {
+            os.path.join(self.mission_base_path, path): (size, mtime_ns)
+            for path, size, mtime_ns in rows
+        }
+
+    def get_done_versions(self, file_paths: List[str]) -> Dict[str, Tuple[int, int]]:
+        """Size and modified time of the given files that were uploaded, keyed by absolute path"""
+        versions = {}
+        relative_paths = [self._relative_path(file_path) for file_path in file_paths]
+        # Stay well under SQLite's limit on the number of query parameters
+        for start in range(0, len(relative_paths), 500):
+            chunk = relative_paths[start : start + 500]
+            rows = self._execute(
+                f"SELECT path, size, mtime_ns FROM uploads WHERE state = ? AND path IN ({', '.join('?' * len(chunk))})",
+                (DONE, *chunk),
+            )
+            versions.update(
+                (os.path.join(self.mission_base_path, path), (size, mtime_ns))
+                for path, size, mtime_ns in rows
+            )
+        return versions
+
+    def mark_queued(self, file_path: str, size: int, mtime_ns: int) -> None:
+        self.mark_queued_many([(file_path, size, mtime_ns)])
+
+    def mark_queued_many(self, files: List[Tuple[str, int, int]]) -> None:
+        """Record (path, size, modified time) of several files as queued in one transaction"""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                """
+                INSERT INTO uploads (path, size, mtime_ns, state, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size = excluded.size,
+                    mtime_ns = excluded.mtime_ns,
+                    state = excluded.state,
+                    attempts = 0,
+                    error = NULL,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (self._relative_path(file_path), size, mtime_ns, QUEUED, now)
+                    for file_path, size, mtime_ns in files
+                ],
+            )
+
+    def mark_uploading(self, file_path: str) -> None:
+        self._execute(
+            "UPDATE uploads SET state = ?, updated_at = ? WHERE path = ?",
+            (UPLOADING, time.time(), self._relative_path(file_path)),
+        )
+
+    def mark_retrying(self, file_path: str, error: str, count_attempt: bool = True) -> int:
+        """Put a file back in the queued state after a failed attempt
+
+        Returns the number of failed attempts so far. Attempts that failed only
+        because the connection was down aren't counted.
+        """
+        path = self._relative_path(file_path)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE uploads SET state = ?, error = ?, attempts = attempts + ?, updated_at = ? WHERE path = ?",
+                (QUEUED, error, int(count_attempt), time.time(), path),
+            )
+            rows = self._connection.execute(
+                "SELECT attempts FROM uploads WHERE path = ?", (path,)
+            ).fetchall()
+        return rows[0][0] if rows else 0
+
+    def mark_done(self, file_path: str, key: str, file_hash: Optional[str]) -> None:
+        self._execute(
+            "UPDATE uploads SET state = ?, key = ?, hash = ?, error = NULL, updated_at = ? WHERE path = ?",
+            (DONE, key, file_hash, time.time(), self._relative_path(file_path)),
+        )
+
+    def mark_duplicate(
+        self, file_path: str, file_hash: Optional[str] = None, key: Optional[str] = None
+    ) -> None:
+        """Mark a file done without uploading because its contents were already uploaded
+
+        `key` is where the contents were uploaded, which may be another file's key.
+        """
+        self._execute(
+            "UPDATE uploads SET state = ?, hash = COALESCE(?, hash), key = COALESCE(?, key), error = NULL, updated_at = ? WHERE path = ?",
+            (DONE, file_hash, key, time.time(), self._relative_path(file_path)),
+        )
+
+    def mark_failed(self, file_path: str, error: str) -> None:
+        self._execute(
+            "UPDATE uploads SET state = ?, error = ?, updated_at = ? WHERE path = ?",
+            (FAILED, error, time.time(), self._relative_path(file_path)),
+        )
+
+    def forget(self, file_path: str) -> None:
+        """Remove a file from the journal"""
+        self._execute("DELETE FROM uploads WHERE path = ?", (self._relative_path(file_path),))
+
+    def get_paths(self, *states: str) -> List[str]:
+        """Absolute paths of files in any of the given states, oldest first"""
+        rows = self._execute(
+            f"SELECT path FROM uploads WHERE state IN ({', '.join('?' * len(states))}) ORDER BY updated_at",
+            states,
+        )
+        return [os.path.join(self.mission_base_path, row[0]) for row in rows]
+
+    def get_failed_uploads(self) -> List[Tuple[str, str]]:
+        """Path and last error of every file that could not be uploaded"""
+        rows = self._execute(
+            "SELECT path, error FROM uploads WHERE state = ? ORDER BY updated_at", (FAILED,)
+        )
+        return [(os.path.join(self.mission_base_path, path), error) for path, error in rows]
+
+    def get_unfinished_paths(self) -> List[str]:
+        """Files that were queued or mid-upload when the app last stopped"""
+        return self.get_paths(QUEUED, UPLOADING)
+
+    def get_backlog(self, exclude_prefix: Optional[str] = None) -> Tuple[int, int]:
+        """Number and total size of files that are queued or being uploaded
+
+        Files whose path in the mission folder starts with `exclude_prefix` aren't counted.
+        """
+        if exclude_prefix is None:
+            rows = self._execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM uploads WHERE state IN (?, ?)",
+                (QUEUED, UPLOADING),
+            )
+        else:
+            rows = self._execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM uploads WHERE state IN (?, ?) AND substr(path, 1, ?) != ?",
+                (QUEUED, UPLOADING, len(exclude_prefix), exclude_prefix),
+            )
+        return rows[0]
+
+    def get_multipart_upload(self, key: str) -> Optional[Tuple[str, int, int, int]]:
+        """Upload id, size, modified time and part size of an unfinished multipart upload"""
+        rows = self._execute(
+            "SELECT upload_id, size, mtime_ns, part_size FROM multipart_uploads WHERE key = ?",
+            (key,),
+        )
+        return rows[0] if rows else None
+
+    def add_multipart_upload(
+        self, upload_id: str, key: str, size: int, mtime_ns: int, part_size: int
+    ) -> None:
+        self._execute(
+            "INSERT INTO multipart_uploads (upload_id, key, size, mtime_ns, part_size) VALUES (?, ?, ?, ?, ?)",
+            (upload_id, key, size, mtime_ns, part_size),
+        )
+
+    def get_multipart_parts(self, upload_id: str) -> Dict[int, str]:
+        """ETags of the completed parts of a multipart upload, by part number"""
+        rows = self._execute(
+            "SELECT part_number, etag FROM multipart_parts WHERE upload_id = ?",
+            (upload_id,),
+        )
+        return dict(rows)
+
+    def get_multipart_part_checksums(self, upload_id: str) -> Dict[int, str]:
+        """SHA-256 checksums sent with the completed parts of a multipart upload"""
+        rows = self._execute(
+            "SELECT part_number, checksum FROM multipart_parts WHERE upload_id = ? AND checksum IS NOT NULL",
+            (upload_id,),
+        )
+        return dict(rows)
+
+    def add_multipart_part(
+        self, upload_id: str, part_number: int, etag: str, checksum: Optional[str] = None
+    ) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO multipart_parts (upload_id, part_number, etag, checksum) VALUES (?, ?, ?, ?)",
+            (upload_id, part_number, etag, checksum),
+        )
+
+    def remove_multipart_upload(self, upload_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM multipart_parts WHERE upload_id = ?", (upload_id,)
+            )
+            self._connection.execute(
+                "DELETE FROM multipart_uploads WHERE upload_id = ?", (upload_id,)
+            )
+
+    def add_manifest_entry(
+        self,
+        key: str,
+        product_type: str,
+        product_subtype: Optional[str],
+        size: int,
+        file_hash: Optional[str],
+        timestamp: str,
+        bundle_key: Optional[str] = None,
+        preview: bool = False,
+    ) -> None:
+        """Record an uploaded object for the mission manifest, replacing an earlier upload of the key"""
+        self._execute(
+            "INSERT OR REPLACE INTO manifest (key, product_type, product_subtype, size, hash, timestamp, bundle_key, preview) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, product_type, product_subtype, size, file_hash, timestamp, bundle_key, int(preview)),
+        )
+
+    def get_manifest_entries(self) -> List[tuple]:
+        """Key, product type and subtype, size, hash, timestamp, bundle key and preview flag of every uploaded object"""
+        return self._execute(
+            "SELECT key, product_type, product_subtype, size, hash, timestamp, bundle_key, preview FROM manifest ORDER BY key"
+        )
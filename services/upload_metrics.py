@@ -0,0 +1,307 @@
+"""Counters, histograms and gauges describing the upload pipeline
+
+Metrics can be scraped in the Prometheus text format from a small HTTP server
+or written periodically to a JSON snapshot file.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[Tuple[str, str], ...]
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 16 KB/s up to 128 MB/s, doubling
+THROUGHPUT_BUCKETS = tuple(float(2**exponent) for exponent in range(14, 28))
+
+
+def _label_values(labels: Dict[str, object]) -> LabelValues:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        name + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Value that only goes up, per set of labels"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_values(labels), 0)
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in sorted(self._values.items())]
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [
+                {"labels": dict(labels), "value": value}
+                for labels, value in sorted(self._values.items())
+            ]
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, per set of labels"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DURATION_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: count in each bucket, sum and count
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_values(labels)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * len(self.buckets), [0.0, 0]))
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    counts[index] += 1
+                    break
+            totals[0] += value
+            totals[1] += 1
+
+    def get_count(self, **labels) -> int:
+        with self._lock:
+            values = self._values.get(_label_values(labels))
+            return values[1][1] if values else 0
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        samples = []
+        with self._lock:
+            for labels, (counts, (total, count)) in sorted(self._values.items()):
+                cumulative = 0
+                for upper_bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append(
+                        (f"{self.name}_bucket", labels + (("le", _format_number(upper_bound)),), cumulative)
+                    )
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    "labels": dict(labels),
+                    "count": count,
+                    "sum": total,
+                    "buckets": {
+                        _format_number(upper_bound): bucket_count
+                        for upper_bound, bucket_count in zip(self.buckets, counts)
+                    },
+                }
+                for labels, (counts, (total, count)) in sorted(self._values.items())
+            ]
+
+
+class Gauge:
+    """Current value, read from a callback whenever metrics are collected"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]) -> None:
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def _value(self) -> Optional[float]:
+        try:
+            return float(self.read())
+        except Exception:
+            return None
+
+    def samples(self) -> List[Tuple[str, LabelValues, float]]:
+        value = self._value()
+        return [] if value is None else [(self.name, (), value)]
+
+    def snapshot(self) -> List[dict]:
+        value = self._value()
+        return [] if value is None else [{"labels": {}, "value": value}]
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help, read))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render_prometheus(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Every metric's current values, for writing as JSON"""
+        return {
+            "time": time.time(),
+            "metrics": {
+                metric.name: {"type": metric.type, "help": metric.help, "values": metric.snapshot()}
+                for metric in self._metrics.values()
+            },
+        }
+
+
+class UploadMetrics(MetricsRegistry):
+    """Metrics recorded by the upload pipeline, labelled by product type"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.uploads = self.counter(
+            "dsa_uploads_total", "Files finished, by product type and result (done, duplicate or failed)"
+        )
+        self.upload_bytes = self.counter("dsa_upload_bytes_total", "Bytes uploaded")
+        self.duplicate_bytes = self.counter(
+            "dsa_upload_duplicate_bytes_total", "Bytes not sent because the contents were already uploaded"
+        )
+        self.retries = self.counter(
+            "dsa_upload_retries_total", "Upload attempts that will be retried, by reason"
+        )
+        self.queue_wait = self.histogram(
+            "dsa_upload_queue_wait_seconds", "Time from a file being queued to its upload starting"
+        )
+        self.upload_duration = self.histogram(
+            "dsa_upload_duration_seconds", "Time taken by successful uploads"
+        )
+        self.upload_throughput = self.histogram(
+            "dsa_upload_throughput_bytes_per_second",
+            "Throughput of successful uploads",
+            THROUGHPUT_BUCKETS,
+        )
+
+
+class MetricsServer:
+    """Serves metrics over HTTP at /metrics (Prometheus text) and /metrics.json"""
+
+    def __init__(self, metrics: MetricsRegistry, port: int, host: str = "127.0.0.1") -> None:
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                path = self.path.split("?")[0]
+                if path == "/metrics":
+                    body = metrics.render_prometheus().encode()
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-server", daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread.is_alive():
+            self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsSnapshotWriter:
+    """Writes a JSON snapshot of the metrics to a file periodically and when stopped"""
+
+    def __init__(self, metrics: MetricsRegistry, file_path: str, interval: float = 10) -> None:
+        self.metrics = metrics
+        self.file_path = file_path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.write()
+
+    def write(self) -> None:
+        # Written next to the file and renamed, so readers never see a partial snapshot
+        temporary_path = f"{self.file_path}.tmp"
+        try:
+            with open(temporary_path, "w") as file:
+                json.dump(self.metrics.snapshot(), file)
+            os.replace(temporary_path, self.file_path)
+        except OSError as error:
+            print(f"Failed to write metrics to {self.file_path}: {error}")
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.write()
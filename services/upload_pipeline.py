@@ -0,0 +1,433 @@
+"""Watches a mission folder and uploads every completed product in it"""
+
+from datetime import datetime
+from typing import Callable, List, Optional, Set, Tuple
+
+from models.product import Product
+from models.product_type import S3_FOLDERS
+from services.adaptive_concurrency import AdaptiveConcurrency
+from services.image_previews import ImagePreviews
+from services.mission_manifest import MissionManifest, get_mission_key
+from services.mission_scanner import scan_mission_files
+from services.mission_uploader import MissionUploader
+from services.mission_watcher import MissionWatcher
+from services.product_bundler import BUNDLE_FILE_PREFIX, ProductBundler
+from services.s3_file_manager import MB, S3FileManager
+from services.shared_file_cache import SharedFileCache
+from services.upload_journal import JOURNAL_FILE_NAME, UploadJournal
+from services.upload_metrics import MetricsServer, MetricsSnapshotWriter, UploadMetrics
+from services.upload_progress import ProgressSnapshot, UploadProgress
+from services.upload_queue import UploadQueue
+from services.upload_retry import ConnectivityMonitor, RetryPolicy
+from services.upload_scheduler import UploadScheduler
+
+
+def get_remote_mission_keys(file_manager, mission_name: str, folder: Optional[str]) -> Set[str]:
+    """Keys of this mission's products that are already in the bucket"""
+    keys = set()
+    for product_folder in S3_FOLDERS:
+        prefix = f"{folder}/{product_folder}/" if folder else f"{product_folder}/"
+        keys.update(
+            key
+            for key in file_manager.list_keys(prefix)
+            if f"_{mission_name}_" in key
+        )
+    return keys
+
+
+def create_upload_scheduler(account: dict, classify: Callable[[str], Optional[str]]) -> UploadScheduler:
+    """Upload scheduler configured from an account's settings"""
+    return UploadScheduler(
+        classify,
+        weights=account.get("uploadPriorities"),
+        starvation_seconds=float(account.get("starvationSeconds", 300)),
+        max_size=int(account.get("uploadQueueSize", 100)),
+    )
+
+
+def create_metrics_exporters(
+    metrics: UploadMetrics, account: dict
+) -> Tuple[Optional[MetricsServer], Optional[MetricsSnapshotWriter]]:
+    """Metrics server and snapshot writer, if the account's settings ask for them"""
+    server = (
+        MetricsServer(metrics, int(account["metricsPort"]), account.get("metricsHost", "127.0.0.1"))
+        if account.get("metricsPort")
+        else None
+    )
+    writer = (
+        MetricsSnapshotWriter(
+            metrics, account["metricsFile"], float(account.get("metricsIntervalSeconds", 10))
+        )
+        if account.get("metricsFile")
+        else None
+    )
+    return server, writer
+
+
+class UploadPipeline:
+    """Watches a mission folder and uploads every completed product in it
+
+    Builds the upload pipeline from an account's settings: a MissionWatcher
+    hands on completed files, which are recorded in the UploadJournal and
+    queued by priority, and a pool of workers uploads them through
+    MissionUploader. Its metrics can be served over HTTP
+    (`metricsPort`) or written to a JSON file (`metricsFile`). Small files of
+    the types in `bundleProductTypes` are uploaded in zip archives by a
+    ProductBundler, and images of the types in `previewProductTypes` get a
+    small preview from ImagePreviews, uploaded ahead of the full resolution
+    file. `get_progress` gives the throughput, the uploads in flight and the
+    time left for the backlog. Given the `mission_time`, a MissionManifest
+    listing every upload is kept next to the mission file.
+
+    With `watch` off the pipeline doesn't watch the folder itself, and files
+    are handed to `queue_products` by a FanOutPipeline sharing one watcher
+    between destinations. A MultiMissionPipeline passes in its `upload_queue`
+    and `metrics` to share them between missions, and then starts, drains and
+    exports them itself.
+    """
+
+    def __init__(
+        self,
+        account: dict,
+        file_manager,
+        mission_name: str,
+        mission_base_path: str,
+        get_product_and_key: Callable[[str], Tuple[Product, str]],
+        journal_file_name: str = JOURNAL_FILE_NAME,
+        file_cache: Optional[SharedFileCache] = None,
+        watch: bool = True,
+        upload_queue: Optional[UploadQueue] = None,
+        metrics: Optional[UploadMetrics] = None,
+        mission_time: Optional[datetime] = None,
+    ) -> None:
+        self.account = account
+        self.file_manager = file_manager
+        self.mission_name = mission_name
+        self.mission_base_path = mission_base_path
+        self.get_product_and_key = get_product_and_key
+
+        # Record upload state in the mission folder so restarts resume where they left off
+        self.journal = UploadJournal(mission_base_path, journal_file_name)
+        if isinstance(file_manager, S3FileManager):
+            file_manager.multipart_store = self.journal
+            file_manager.file_cache = file_cache
+        # Bytes sent by uploads in flight, for the status line and ETA
+        self.progress = UploadProgress(float(account.get("progressSmoothingSeconds", 30)))
+        if isinstance(file_manager, S3FileManager):
+            file_manager.progress = self.progress
+
+        self.retry_policy = RetryPolicy(
+            base_delay=float(account.get("retryBaseSeconds", 2)),
+            max_delay=float(account.get("retryMaxSeconds", 300)),
+            max_attempts=int(account.get("retryMaxAttempts", 8)),
+        )
+        self.connectivity_monitor = ConnectivityMonitor(
+            file_manager.check_connection,
+            on_offline=lambda: self.upload_queue.pause(),
+            on_online=lambda: self.upload_queue.resume(),
+            retry_policy=self.retry_policy,
+        )
+
+        worker_count = int(account.get("uploadWorkers", 4))
+        self.concurrency = None
+        if account.get("adaptiveConcurrency", True):
+            # Tune concurrency and part size to what the link can currently carry.
+            # Grown parts stay within the memory budget's share of each part in flight
+            part_size = getattr(file_manager, "part_size", 16 * MB)
+            max_part_size = 64 * MB
+            if isinstance(file_manager, S3FileManager):
+                max_part_size = min(
+                    max_part_size, file_manager.memory_budget.max_bytes // max(file_manager.max_concurrency, 1)
+                )
+            self.concurrency = AdaptiveConcurrency(
+                max_concurrency=worker_count,
+                max_part_size=max(max_part_size, part_size),
+                part_size=part_size,
+                on_part_size=lambda part_size: setattr(file_manager, "part_size", part_size),
+                grow_part_size=bool(account.get("adaptivePartSizeGrowth", False)),
+            )
+        self._owns_metrics = metrics is None
+        self.metrics = metrics if metrics is not None else UploadMetrics()
+
+        # Many small files per request, for links where round trips dominate
+        self.bundler = (
+            ProductBundler(
+                mission_base_path,
+                get_product_and_key,
+                self._queue_generated,
+                lambda file_path: self.upload_queue.put(file_path),
+                product_types=account["bundleProductTypes"],
+                window=float(account.get("bundleWindowSeconds", 10)),
+                max_files=int(account.get("bundleMaxFiles", 50)),
+                max_bytes=int(float(account.get("bundleMaxMb", 8)) * MB),
+            )
+            if account.get("bundleProductTypes")
+            else None
+        )
+        # Downsampled in worker processes, so the watcher and uploads aren't held up
+        self.previews = (
+            ImagePreviews(
+                mission_base_path,
+                get_product_and_key,
+                self._queue_generated,
+                product_types=account["previewProductTypes"],
+                max_size=int(account.get("previewMaxPixels", 1024)),
+                quality=int(account.get("previewQuality", 70)),
+                workers=int(account.get("previewWorkers", 1)),
+                file_cache=file_cache,
+            )
+            if account.get("previewProductTypes")
+            else None
+        )
+        # One object listing the mission's uploads, so consumers don't have to list the bucket
+        self.manifest = (
+            MissionManifest(
+                mission_name,
+                mission_time,
+                self.journal,
+                file_manager,
+                get_mission_key(mission_name, mission_time, account.get("folder"), ".json"),
+                interval=float(account.get("manifestIntervalSeconds", 30)),
+                max_pending=int(account.get("manifestMaxFiles", 100)),
+                is_paused=lambda: self.upload_queue.paused,
+            )
+            if mission_time and account.get("manifest", True)
+            else None
+        )
+        self.mission_uploader = MissionUploader(
+            file_manager,
+            self.journal,
+            get_product_and_key,
+            self.retry_policy,
+            self.connectivity_monitor,
+            self.concurrency,
+            self.metrics,
+            skip_duplicate_content=bool(account.get("skipDuplicateContent", True)),
+            bundler=self.bundler,
+            file_cache=file_cache,
+            previews=self.previews,
+            manifest=self.manifest,
+        )
+
+        # Uploads run on a worker pool so the watcher thread never blocks on S3,
+        # tactical products first, then imagery, then video
+        self._owns_queue = upload_queue is None
+        self.upload_queue = (
+            upload_queue
+            if upload_queue is not None
+            else UploadQueue(
+                self.mission_uploader.upload,
+                worker_count=worker_count,
+                scheduler=create_upload_scheduler(account, self.get_product_type),
+            )
+        )
+
+        self.watcher = MissionWatcher(mission_base_path, self.queue_products, account) if watch else None
+
+        self.metrics_server = self.metrics_writer = None
+        if self._owns_metrics:
+            self._register_gauges()
+            self.metrics_server, self.metrics_writer = create_metrics_exporters(self.metrics, account)
+
+    @property
+    def pending(self) -> int:
+        """Files waiting for an upload worker"""
+        return self.upload_queue.pending
+
+    @property
+    def retrying(self) -> int:
+        return self.upload_queue.retrying
+
+    @property
+    def paused(self) -> bool:
+        return self.upload_queue.paused
+
+    @property
+    def settling(self) -> int:
+        """Files still being written"""
+        return self.watcher.pending if self.watcher else 0
+
+    def get_failed_uploads(self) -> List[Tuple[str, str]]:
+        """Path and last error of every file that could not be uploaded"""
+        return self.journal.get_failed_uploads()
+
+    def get_progress(self) -> ProgressSnapshot:
+        """Throughput, uploads in flight and time left for the backlog"""
+        return self.progress.sample(*self.get_backlog())
+
+    def get_backlog(self) -> Tuple[int, int]:
+        """Number and total size of files left to upload
+
+        Bundle archives aren't counted, as their files stay queued until the archive is uploaded.
+        """
+        return self.journal.get_backlog(BUNDLE_FILE_PREFIX if self.bundler else None)
+
+    def _register_gauges(self) -> None:
+        self.metrics.gauge(
+            "dsa_upload_backlog_files",
+            "Files waiting to be uploaded or being uploaded",
+            lambda: self.get_backlog()[0],
+        )
+        self.metrics.gauge(
+            "dsa_upload_backlog_bytes",
+            "Total size of the files waiting to be uploaded or being uploaded",
+            lambda: self.get_backlog()[1],
+        )
+        self.metrics.gauge(
+            "dsa_upload_queue_pending", "Files waiting for an upload worker", lambda: self.upload_queue.pending
+        )
+        self.metrics.gauge(
+            "dsa_upload_retrying", "Files waiting to be retried", lambda: self.upload_queue.retrying
+        )
+        if self.watcher:
+            self.metrics.gauge(
+                "dsa_files_settling", "Files still being written", lambda: self.watcher.pending
+            )
+        self.metrics.gauge(
+            "dsa_uploads_paused", "1 while uploads are paused by a lost connection", lambda: self.upload_queue.paused
+        )
+        if self.bundler:
+            self.metrics.gauge(
+                "dsa_files_bundling", "Files waiting to be bundled", lambda: self.bundler.pending
+            )
+        if self.previews:
+            self.metrics.gauge(
+                "dsa_previews_pending", "Image previews waiting to be generated", lambda: self.previews.pending
+            )
+        if self.manifest:
+            self.metrics.gauge(
+                "dsa_manifest_pending",
+                "Uploads not yet in the uploaded mission manifest",
+                lambda: self.manifest.pending,
+            )
+        if isinstance(self.file_manager, S3FileManager):
+            self.metrics.gauge(
+                "dsa_upload_memory_bytes",
+                "Bytes of file contents held in memory by uploads in flight",
+                lambda: self.file_manager.memory_budget.in_use,
+            )
+        if self.concurrency:
+            self.metrics.gauge(
+                "dsa_upload_concurrency", "Uploads allowed in parallel", lambda: self.concurrency.limit
+            )
+
+    def get_product_type(self, file_path: str) -> Optional[str]:
+        """Product type used to prioritize a file, or None if it can't be mapped"""
+        if self.previews and self.previews.get_preview(file_path):
+            return "preview"
+        try:
+            return self.mission_uploader.resolve(file_path)[0].type
+        except (ValueError, OSError):
+            return None
+
+    def queue_products(self, file_paths: List[str]) -> None:
+        """Queue completed files unless they were already uploaded"""
+        for file_path in self.mission_uploader.prepare_batch(file_paths):
+            if self.previews:
+                self.previews.add(file_path)
+            if not (self.bundler and self.bundler.add(file_path)):
+                self.upload_queue.put(file_path)
+
+    def _queue_generated(self, generated_path: str) -> None:
+        # Bundles and previews are new files, made from files already queued
+        for file_path in self.mission_uploader.prepare_batch([generated_path]):
+            self.upload_queue.put(file_path)
+
+    def start(self) -> None:
+        """Start uploading, watching and queueing files already in the mission folder"""
+        if self.metrics_server:
+            self.metrics_server.start()
+            print(f"Serving upload metrics at {self.metrics_server.url}")
+        if self.metrics_writer:
+            self.metrics_writer.start()
+        if self._owns_queue:
+            self.upload_queue.start()
+        if self.bundler:
+            # Bundles from the last run are rebuilt from their files by the backfill
+            for bundle_path in self.bundler.remove_stale_bundles():
+                self.journal.forget(bundle_path)
+            self.bundler.start()
+        if self.previews:
+            # Previews from the last run are made again by the backfill
+            for preview_path in self.previews.remove_stale_previews():
+                self.journal.forget(preview_path)
+            self.previews.start()
+        if self.manifest:
+            self.manifest.start()
+        if not self.watcher:
+            return
+        self.watcher.start()
+
+        # The watcher is started first so nothing written during the scan is
+        # missed, and the settler and journal make sure nothing is queued twice
+        backfill_count = self.backfill()
+        if backfill_count:
+            print(f"Found {backfill_count} existing files in mission folder to upload")
+
+    def backfill(self) -> int:
+        """Queue files in the mission folder that were never uploaded
+
+        Returns the number of files handed to the watcher.
+        """
+        file_paths = self.find_files_to_upload()
+        for file_path in file_paths:
+            self.watcher.notify(file_path)
+        return len(file_paths)
+
+    def find_files_to_upload(self) -> List[str]:
+        """Files in the mission folder that were never uploaded
+
+        Includes uploads interrupted the last time this mission ran.
+        """
+        uploaded_versions = self.journal.get_uploaded_versions()
+        remote_keys = (
+            get_remote_mission_keys(
+                self.file_manager, self.mission_name, self.account.get("folder")
+            )
+            if self.account.get("backfillCheckRemote")
+            else set()
+        )
+
+        file_paths = []
+        for entry in scan_mission_files(self.mission_base_path):
+            stat = entry.stat()
+            if uploaded_versions.get(entry.path) == (stat.st_size, stat.st_mtime_ns):
+                continue
+
+            if remote_keys:
+                try:
+                    key = self.get_product_and_key(entry.path)[1]
+                except (ValueError, OSError):
+                    key = None
+                if key in remote_keys:
+                    self.journal.mark_queued(entry.path, stat.st_size, stat.st_mtime_ns)
+                    self.journal.mark_done(entry.path, key, None)
+                    continue
+
+            file_paths.append(entry.path)
+        return file_paths
+
+    def stop_watching(self) -> None:
+        """Stop picking up new files. Files still being written are skipped"""
+        if self.watcher:
+            self.watcher.stop()
+        if self.bundler:
+            self.bundler.stop()
+        if self.previews:
+            self.previews.stop()
+
+    def drain(self) -> None:
+        """Wait for every queued file to be uploaded and stop the workers"""
+        if self._owns_queue:
+            self.upload_queue.shutdown()
+
+    def close(self) -> None:
+        if self.manifest:
+            # After the drain, so it lists the last uploads
+            self.manifest.stop()
+        self.connectivity_monitor.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.metrics_writer:
+            self.metrics_writer.stop()
+        self.journal.close()
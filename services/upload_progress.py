@@ -0,0 +1,206 @@
+"""Bytes sent by uploads in flight, throughput and time left"""
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class ProgressFile:
+    """File object wrapper that reports bytes read, once each even if read again after a seek"""
+
+    def __init__(self, file, on_read: Callable[[int], None]) -> None:
+        self._file = file
+        self._on_read = on_read
+        self._position = file.tell()
+        self._reported = self._position
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._file.read(size)
+        self._position += len(data)
+        if self._position > self._reported:
+            self._on_read(self._position - self._reported)
+            self._reported = self._position
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self._position = self._file.seek(offset, whence)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "ProgressFile":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class FileUpload:
+    """Progress of one file being uploaded"""
+
+    def __init__(self, file_path: str, size: int) -> None:
+        self.file_path = file_path
+        # Compressed uploads change this to the size of what is actually sent
+        self.size = size
+        self.sent = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, count: int) -> None:
+        with self._lock:
+            self.sent += count
+
+
+@dataclass
+class FileProgress:
+    path: str
+    sent: int
+    size: int
+    # Bytes per second since the upload started
+    rate: float
+    eta_seconds: Optional[float]
+
+    @property
+    def fraction(self) -> float:
+        return min(self.sent / self.size, 1.0) if self.size else 1.0
+
+
+@dataclass
+class ProgressSnapshot:
+    """Uploads in flight and what is left of the backlog, in bytes per second and seconds"""
+
+    rate: float = 0.0
+    smoothed_rate: float = 0.0
+    backlog_files: int = 0
+    # Not sent yet, including the rest of the files in flight
+    backlog_bytes: int = 0
+    eta_seconds: Optional[float] = None
+    files: List[FileProgress] = field(default_factory=list)
+    # Snapshots this one combines, by mission or destination
+    parts: Dict[str, "ProgressSnapshot"] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @staticmethod
+    def combine(snapshots: Dict[str, "ProgressSnapshot"], shared: bool = False) -> "ProgressSnapshot":
+        """Snapshot of several uploads running side by side
+
+        Uploads that `shared` workers and a link drain their backlogs at their
+        combined rate, otherwise they are done when the slowest is.
+        """
+        values = list(snapshots.values())
+        smoothed_rate = sum(snapshot.smoothed_rate for snapshot in values)
+        backlog_bytes = sum(snapshot.backlog_bytes for snapshot in values)
+        if shared:
+            eta_seconds = (
+                0.0 if not backlog_bytes else backlog_bytes / smoothed_rate if smoothed_rate > 0 else None
+            )
+        else:
+            etas = [snapshot.eta_seconds for snapshot in values if snapshot.backlog_bytes]
+            eta_seconds = None if None in etas else max(etas, default=0.0)
+        return ProgressSnapshot(
+            rate=sum(snapshot.rate for snapshot in values),
+            smoothed_rate=smoothed_rate,
+            backlog_files=sum(snapshot.backlog_files for snapshot in values),
+            backlog_bytes=backlog_bytes,
+            eta_seconds=eta_seconds,
+            files=[file for snapshot in values for file in snapshot.files],
+            parts=dict(snapshots),
+        )
+
+
+class UploadProgress:
+    """Tracks the bytes sent by every upload in flight
+
+    `sample` measures the throughput since the last sample and smooths it
+    exponentially over `smoothing_seconds`, so the time left for the backlog
+    doesn't jump around with every burst or stall of the link. Meant to be
+    sampled by a single ProgressReporter.
+    """
+
+    def __init__(self, smoothing_seconds: float = 30) -> None:
+        self.smoothing_seconds = smoothing_seconds
+        self.total_sent = 0
+
+        self._uploads: Dict[int, FileUpload] = {}
+        self._finished_sent = 0
+        self._lock = threading.Lock()
+        self._sampled_at: Optional[float] = None
+        self._sampled_sent = 0
+        self._smoothed_rate: Optional[float] = None
+
+    @contextmanager
+    def track(self, file_path: str, size: int) -> Iterator[FileUpload]:
+        """Track an upload while it runs. Report bytes sent with the yielded upload's `add`"""
+        upload = FileUpload(file_path, size)
+        with self._lock:
+            self._uploads[id(upload)] = upload
+        try:
+            yield upload
+        finally:
+            with self._lock:
+                del self._uploads[id(upload)]
+                self._finished_sent += upload.sent
+
+    def sample(self, backlog_files: int, backlog_bytes: int) -> ProgressSnapshot:
+        """Progress now, given the files and bytes waiting or in flight"""
+        now = time.monotonic()
+        with self._lock:
+            uploads = list(self._uploads.values())
+            sent = self._finished_sent + sum(upload.sent for upload in uploads)
+        self.total_sent = sent
+
+        rate = 0.0
+        if self._sampled_at is not None and now > self._sampled_at:
+            elapsed = now - self._sampled_at
+            rate = (sent - self._sampled_sent) / elapsed
+            if self._smoothed_rate is None:
+                self._smoothed_rate = rate
+            else:
+                weight = 1 - math.exp(-elapsed / self.smoothing_seconds)
+                self._smoothed_rate += weight * (rate - self._smoothed_rate)
+        self._sampled_at = now
+        self._sampled_sent = sent
+
+        files = []
+        for upload in uploads:
+            elapsed = now - upload.started_at
+            file_rate = upload.sent / elapsed if elapsed > 0 else 0.0
+            left = max(upload.size - upload.sent, 0)
+            files.append(
+                FileProgress(
+                    upload.file_path,
+                    upload.sent,
+                    upload.size,
+                    file_rate,
+                    left / file_rate if file_rate > 0 else None,
+                )
+            )
+
+        backlog_bytes = max(backlog_bytes - sum(min(file.sent, file.size) for file in files), 0)
+        smoothed_rate = self._smoothed_rate or 0.0
+        return ProgressSnapshot(
+            rate=rate,
+            smoothed_rate=smoothed_rate,
+            backlog_files=backlog_files,
+            backlog_bytes=backlog_bytes,
+            eta_seconds=(
+                0.0 if not backlog_bytes else backlog_bytes / smoothed_rate if smoothed_rate > 0 else None
+            ),
+            files=sorted(files, key=lambda file: os.path.basename(file.path)),
+        )
@@ -0,0 +1,138 @@
+"""Bounded upload queue serviced by a pool of worker threads"""
+
+import logging
+import queue
+import threading
+from typing import Callable, List, Optional
+
+from services.structured_log import log_event
+from services.upload_retry import RetryUpload
+from services.upload_scheduler import UploadScheduler
+
+
+class UploadQueue:
+    """Bounded queue of file paths handed to a pool of upload worker threads
+
+    Producers block in `put` while the queue is full, so a burst of new files
+    applies backpressure to the watcher instead of growing memory unbounded.
+    Files are served in arrival order unless an UploadScheduler is given. A
+    handler can raise RetryUpload to have its file queued again after a delay.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[str], None],
+        worker_count: int = 4,
+        max_size: int = 100,
+        scheduler: Optional[UploadScheduler] = None,
+    ) -> None:
+        if worker_count < 1:
+            raise ValueError(f"Invalid upload worker count: {worker_count}")
+
+        self.handler = handler
+        self._queue = scheduler if scheduler is not None else queue.Queue(maxsize=max_size)
+        self._closed = threading.Event()
+        self._stopped = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._retry_lock = threading.Lock()
+        self._retrying = 0
+        self._workers: List[threading.Thread] = [
+            threading.Thread(target=self._run, name=f"upload-worker-{i + 1}", daemon=True)
+            for i in range(worker_count)
+        ]
+
+    @property
+    def pending(self) -> int:
+        """Number of files waiting for a worker"""
+        return self._queue.qsize()
+
+    @property
+    def retrying(self) -> int:
+        """Number of files waiting to be retried"""
+        with self._retry_lock:
+            return self._retrying
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def start(self) -> None:
+        """Start the worker threads"""
+        for worker in self._workers:
+            worker.start()
+
+    def put(self, file_path: str) -> None:
+        """Queue a file for upload, blocking while the queue is full"""
+        if self._closed.is_set():
+            raise RuntimeError("Upload queue is closed")
+        self._queue.put(file_path)
+
+    def put_later(self, file_path: str, delay: float) -> None:
+        """Queue a file for upload after a delay"""
+        with self._retry_lock:
+            self._retrying += 1
+
+        def put() -> None:
+            with self._retry_lock:
+                self._retrying -= 1
+            if not self._stopped.is_set():
+                self._queue.put(file_path)
+
+        timer = threading.Timer(delay, put)
+        timer.daemon = True
+        timer.start()
+
+    def pause(self) -> None:
+        """Stop starting new uploads. Files can still be queued"""
+        self._running.clear()
+
+    def resume(self) -> None:
+        self._running.set()
+
+    def shutdown(self, drain: bool = True) -> None:
+        """Stop accepting files and stop the workers
+
+        With `drain` every queued file is uploaded first, otherwise queued files
+        are discarded and only in-flight uploads are allowed to finish. Files
+        waiting to be retried are discarded either way.
+        """
+        self._closed.set()
+        if drain:
+            self._queue.join()
+        else:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._queue.task_done()
+
+        self._stopped.set()
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.join()
+
+    def _run(self) -> None:
+        while True:
+            if not self._running.wait(0.5):
+                if self._stopped.is_set():
+                    return
+                continue
+
+            try:
+                file_path = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return
+                continue
+
+            try:
+                self.handler(file_path)
+            except RetryUpload as retry:
+                self.put_later(file_path, retry.delay)
+            except Exception as error:
+                log_event("upload.worker_error", logging.ERROR, exc_info=error, file=file_path)
+                print(f"Upload worker error: {error}")
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,146 @@
+"""Retry of failed uploads with exponential backoff and offline detection"""
+
+import logging
+import random
+import threading
+from typing import Callable, Iterator, Optional
+
+from services.structured_log import log_event
+
+# S3 error codes that are worth retrying
+TRANSIENT_ERROR_CODES = {
+    # The contents didn't match their checksum, e.g. corrupted on the way or
+    # still being written when hashed
+    "BadDigest",
+    "XAmzContentSHA256Mismatch",
+    "InternalError",
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "ServiceUnavailable",
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+
+
+class RetryUpload(Exception):
+    """Raised by an upload handler to have the file queued again after a delay"""
+
+    def __init__(self, delay: float) -> None:
+        super().__init__(f"Retry in {delay:.1f}s")
+        self.delay = delay
+
+
+def _error_chain(error: BaseException) -> Iterator[BaseException]:
+    # boto3 wraps client errors (e.g. S3UploadFailedError), so look at causes too
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        current = current.__cause__ or current.__context__
+
+
+def is_connectivity_error(error: BaseException) -> bool:
+    """Whether an error means the endpoint can't be reached at all"""
+    # Imported here so local uploads never load botocore
+    from botocore.exceptions import ConnectionError as BotoConnectionError, HTTPClientError
+
+    return any(
+        isinstance(e, (BotoConnectionError, HTTPClientError, ConnectionError, TimeoutError))
+        for e in _error_chain(error)
+    )
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether retrying the same request later may succeed"""
+    from botocore.exceptions import ClientError
+
+    for e in _error_chain(error):
+        if is_connectivity_error(e):
+            return True
+        if isinstance(e, ClientError):
+            code = e.response.get("Error", {}).get("Code")
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+            return code in TRANSIENT_ERROR_CODES or status >= 500
+    return False
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    def __init__(
+        self, base_delay: float = 2, max_delay: float = 300, max_attempts: int = 8
+    ) -> None:
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+
+    def get_delay(self, attempt: int) -> float:
+        """Seconds to wait before the given retry attempt (starting at 1)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class ConnectivityMonitor:
+    """Pauses uploads while the endpoint is unreachable
+
+    When an upload reports a connectivity error the monitor goes offline,
+    calls `on_offline` and probes the endpoint with `check` using the retry
+    policy's backoff until it succeeds, then calls `on_online`. Only the probe
+    talks to the endpoint while offline, so queued work is spooled instead of
+    hammering a dead link.
+    """
+
+    def __init__(
+        self,
+        check: Callable[[], None],
+        on_offline: Callable[[], None],
+        on_online: Callable[[], None],
+        retry_policy: RetryPolicy,
+    ) -> None:
+        self.check = check
+        self.on_offline = on_offline
+        self.on_online = on_online
+        self.retry_policy = retry_policy
+
+        self._lock = threading.Lock()
+        self._offline = False
+        self._stopped = threading.Event()
+
+    @property
+    def offline(self) -> bool:
+        return self._offline
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def report_offline(self) -> None:
+        with self._lock:
+            if self._offline:
+                return
+            self._offline = True
+
+        log_event("connection.lost", logging.WARNING)
+        print("Connection lost. Uploads are paused until it is restored.")
+        self.on_offline()
+        threading.Thread(target=self._probe, name="connectivity-probe", daemon=True).start()
+
+    def _probe(self) -> None:
+        attempt = 1
+        while not self._stopped.wait(self.retry_policy.get_delay(attempt)):
+            try:
+                self.check()
+            except Exception as error:
+                if is_transient_error(error):
+                    attempt += 1
+                    continue
+                # Reached the endpoint, the request just wasn't allowed
+            break
+
+        with self._lock:
+            self._offline = False
+        if not self._stopped.is_set():
+            log_event("connection.restored")
+            print("Connection restored. Resuming uploads.")
+        self.on_online()
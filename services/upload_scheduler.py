@@ -0,0 +1,115 @@
+"""Priority scheduling of queued uploads by product type"""
+
+from collections import deque
+import queue
+import threading
+import time
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+# Higher weights are uploaded first: tactical preempts image previews preempt
+# imagery preempts video
+DEFAULT_PRIORITY_WEIGHTS = {"tactical": 100, "preview": 50, "image": 10, "video": 1}
+
+
+class UploadScheduler:
+    """Bounded, thread safe queue that serves files by product type priority
+
+    Files are served from the product type with the highest weight, first in
+    first out within a type. A file that has waited longer than
+    `starvation_seconds` is served ahead of the weights (oldest first) so video
+    still trickles out during a long burst of tactical products.
+
+    Implements the subset of the `queue.Queue` interface used by UploadQueue.
+    """
+
+    def __init__(
+        self,
+        classify: Callable[[str], Optional[str]],
+        weights: Optional[Dict[str, int]] = None,
+        starvation_seconds: float = 300,
+        max_size: int = 0,
+    ) -> None:
+        self.classify = classify
+        self.weights = {**DEFAULT_PRIORITY_WEIGHTS, **(weights or {})}
+        self.starvation_seconds = starvation_seconds
+        self.max_size = max_size
+
+        self._pending: Dict[Optional[str], Deque[Tuple[float, str]]] = {}
+        self._size = 0
+        self._unfinished_tasks = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._all_tasks_done = threading.Condition(self._lock)
+
+    def weight(self, product_type: Optional[str]) -> int:
+        """Weight of a product type. Unknown types are served last"""
+        return self.weights.get(product_type, 0) if product_type else 0
+
+    def qsize(self) -> int:
+        with self._lock:
+            return self._size
+
+    def put(self, file_path: str, block: bool = True, timeout: Optional[float] = None) -> None:
+        """Queue a file, blocking while the scheduler is full"""
+        product_type = self.classify(file_path)
+
+        with self._not_full:
+            if self.max_size > 0:
+                if not block and self._size >= self.max_size:
+                    raise queue.Full
+                if not self._not_full.wait_for(
+                    lambda: self._size < self.max_size, timeout
+                ):
+                    raise queue.Full
+
+            self._pending.setdefault(product_type, deque()).append(
+                (time.monotonic(), file_path)
+            )
+            self._size += 1
+            self._unfinished_tasks += 1
+            self._not_empty.notify()
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> str:
+        """Remove and return the next file to upload"""
+        with self._not_empty:
+            if not block and self._size == 0:
+                raise queue.Empty
+            if not self._not_empty.wait_for(lambda: self._size > 0, timeout):
+                raise queue.Empty
+
+            file_path = self._pending[self._next_product_type()].popleft()[1]
+            self._size -= 1
+            self._not_full.notify()
+            return file_path
+
+    def get_nowait(self) -> str:
+        return self.get(block=False)
+
+    def task_done(self) -> None:
+        with self._all_tasks_done:
+            if self._unfinished_tasks <= 0:
+                raise ValueError("task_done() called too many times")
+            self._unfinished_tasks -= 1
+            if self._unfinished_tasks == 0:
+                self._all_tasks_done.notify_all()
+
+    def join(self) -> None:
+        """Block until every queued file has been processed"""
+        with self._all_tasks_done:
+            self._all_tasks_done.wait_for(lambda: self._unfinished_tasks == 0)
+
+    def _next_product_type(self) -> Optional[str]:
+        # Must be called with the lock held and at least one file pending
+        heads = [
+            (product_type, files[0][0])
+            for product_type, files in self._pending.items()
+            if files
+        ]
+
+        starvation_cutoff = time.monotonic() - self.starvation_seconds
+        starving = [head for head in heads if head[1] <= starvation_cutoff]
+        if starving:
+            return min(starving, key=lambda head: head[1])[0]
+
+        return max(heads, key=lambda head: (self.weight(head[0]), -head[1]))[0]
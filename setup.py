@@ -12,4 +12,10 @@ setup(
         "jsonschema==4.19.0",
         "watchdog==3.0.0",
     ],
+    extras_require={
+        # zstd compression of uploads, see compressProductTypes
+        "zstd": ["zstandard==0.21.0"],
+        # Image previews, see previewProductTypes
+        "previews": ["Pillow==10.0.0"],
+    },
 )
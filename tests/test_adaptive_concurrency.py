@@ -0,0 +1,86 @@
+import contextlib
+import threading
+import unittest
+
+from services.adaptive_concurrency import AdaptiveConcurrency
+
+MB = 1024 * 1024
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.part_sizes = []
+        self.concurrency = AdaptiveConcurrency(
+            max_concurrency=4,
+            part_size=16 * MB,
+            interval=10,
+            on_part_size=self.part_sizes.append,
+            clock=self.clock,
+        )
+
+    def finish_window(self, uploads, failures=0, bytes_per_upload=MB):
+        for i in range(uploads):
+            self.clock.now += 10 / uploads
+            self.concurrency.record(0 if i < failures else bytes_per_upload, failed=i < failures)
+
+    def test_errors_halve_concurrency_and_part_size(self):
+        self.finish_window(4, failures=2)
+
+        self.assertEqual(self.concurrency.limit, 2)
+        self.assertEqual(self.part_sizes, [8 * MB])
+
+    def test_busy_improving_link_adds_slots(self):
+        self.finish_window(4, failures=4)
+        self.assertEqual(self.concurrency.limit, 2)
+
+        with self.concurrency.slot(), self.concurrency.slot():
+            self.finish_window(4)
+        self.assertEqual(self.concurrency.limit, 3)
+        self.assertEqual(self.part_sizes, [8 * MB, 16 * MB])
+
+    def test_part_size_recovers_to_its_configured_size(self):
+        for _ in range(3):
+            self.finish_window(4, failures=2)
+            with self.concurrency.slot(), self.concurrency.slot():
+                self.finish_window(4)
+            with self.concurrency.slot(), self.concurrency.slot(), self.concurrency.slot():
+                self.finish_window(4)
+
+        self.assertEqual(self.concurrency.limit, 4)
+        self.assertEqual(self.part_sizes, [8 * MB, 16 * MB] * 3)
+
+    def test_part_size_grows_only_when_enabled(self):
+        self.concurrency.grow_part_size = True
+        self.finish_window(4, failures=4)
+        self.finish_window(4, failures=4)
+        self.assertEqual(self.part_sizes, [8 * MB, 5 * MB])
+
+        for active in range(1, 4):
+            with contextlib.ExitStack() as stack:
+                for _ in range(active):
+                    stack.enter_context(self.concurrency.slot())
+                self.finish_window(4)
+        self.assertEqual(self.part_sizes, [8 * MB, 5 * MB, 8 * MB, 16 * MB, 32 * MB])
+
+    def test_slots_block_at_limit(self):
+        self.finish_window(4, failures=4)
+        self.finish_window(4, failures=4)
+        self.assertEqual(self.concurrency.limit, 1)
+
+        acquired = threading.Event()
+        with self.concurrency.slot():
+            waiter = threading.Thread(
+                target=lambda: self.concurrency.slot().__enter__() or acquired.set()
+            )
+            waiter.start()
+            self.assertFalse(acquired.wait(0.1))
+        self.assertTrue(acquired.wait(1))
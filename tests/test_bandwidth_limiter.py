@@ -0,0 +1,31 @@
+import io
+import time
+import unittest
+
+from services.bandwidth_limiter import BandwidthLimiter, ThrottledFile, TokenBucket
+
+
+class TestBandwidthLimiter(unittest.TestCase):
+    def test_token_bucket_paces_reads(self):
+        bucket = TokenBucket(rate=10000, burst=1000)
+        file = ThrottledFile(io.BytesIO(b"x" * 3000), [bucket])
+
+        started_at = time.monotonic()
+        while file.read(500):
+            pass
+        elapsed = time.monotonic() - started_at
+
+        # 1000 bytes of burst, the other 2000 at 10000 bytes per second
+        self.assertGreaterEqual(elapsed, 0.18)
+        self.assertLess(elapsed, 1)
+
+    def test_applies_global_and_product_type_limits(self):
+        limiter = BandwidthLimiter(max_kbps=800, product_type_kbps={"video": 80})
+
+        self.assertEqual([b.rate for b in limiter.get_buckets("video")], [10000, 100000])
+        self.assertEqual([b.rate for b in limiter.get_buckets("tactical")], [100000])
+
+    def test_unlimited_files_are_not_wrapped(self):
+        file = io.BytesIO(b"data")
+        self.assertIs(BandwidthLimiter().wrap(file, "video"), file)
+        self.assertIsInstance(BandwidthLimiter(max_kbps=8).wrap(file, "video"), ThrottledFile)
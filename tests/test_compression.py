@@ -0,0 +1,46 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from services.compression import Compressor
+
+
+class TestCompressor(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.compressor = Compressor({"tactical": "gzip"})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, name, data):
+        file_path = os.path.join(self.directory.name, name)
+        with open(file_path, "wb") as file:
+            file.write(data)
+        return file_path
+
+    def test_get_codec(self):
+        self.assertEqual(self.compressor.get_codec("detection.kml", "tactical"), "gzip")
+        self.assertIsNone(self.compressor.get_codec("detection.kmz", "tactical"))
+        self.assertIsNone(self.compressor.get_codec("frame.tif", "image"))
+
+    def test_compress(self):
+        data = b"<Placemark><name>Heat</name></Placemark>" * 1000
+
+        compressed, content_encoding = self.compressor.compress(self.write_file("detection.kml", data), "gzip")
+        with compressed:
+            self.assertEqual(content_encoding, "gzip")
+            self.assertEqual(gzip.decompress(compressed.read()), data)
+
+    def test_incompressible_files_are_not_compressed(self):
+        compressed, content_encoding = self.compressor.compress(
+            self.write_file("detection.kml", os.urandom(10000)), "gzip"
+        )
+
+        self.assertIsNone(compressed)
+        self.assertIsNone(content_encoding)
+
+    def test_invalid_codec(self):
+        with self.assertRaises(ValueError):
+            Compressor({"tactical": "brotli"})
@@ -0,0 +1,35 @@
+import unittest
+
+from services.event_coalescer import EventCoalescer
+
+
+class TestEventCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.coalescer = EventCoalescer(self.batches.append, window=60)
+
+    def test_events_for_a_path_are_coalesced(self):
+        for _ in range(3):
+            self.coalescer.notify("/mission/images/EO/frame1.jpg")
+        self.coalescer.notify("/mission/images/EO/frame2.jpg")
+        self.coalescer.mark_closed("/mission/images/EO/frame1.jpg")
+        self.coalescer.notify("/mission/images/EO/frame1.jpg")
+
+        self.assertEqual(self.coalescer.pending, 2)
+        self.coalescer.flush()
+
+        self.assertEqual(
+            self.batches,
+            [{"/mission/images/EO/frame1.jpg": True, "/mission/images/EO/frame2.jpg": False}],
+        )
+        self.assertEqual(self.coalescer.event_count, 6)
+
+    def test_stop_hands_on_the_last_batch(self):
+        self.coalescer.start()
+        self.coalescer.notify("/mission/videos/segment.ts")
+
+        self.coalescer.stop()
+
+        self.assertEqual(self.batches, [{"/mission/videos/segment.ts": False}])
+        self.coalescer.flush()
+        self.assertEqual(len(self.batches), 1)
@@ -0,0 +1,155 @@
+from datetime import datetime, timezone
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+
+from models.product import Product
+from services.fan_out_pipeline import FanOutPipeline, get_journal_file_name
+from services.image_previews import ImagePreviews
+from services.local_file_manager import LocalFileManager
+from services.upload_journal import DONE
+
+
+class OfflineFileManager(LocalFileManager):
+    """Holds every upload until the link comes back"""
+
+    def __init__(self, root_path):
+        super().__init__(root_path)
+        self.online = threading.Event()
+
+    def upload_file(self, *args, **kwargs):
+        self.online.wait()
+        return super().upload_file(*args, **kwargs)
+
+
+class TestFanOutPipeline(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.mission_path = os.path.join(self.directory.name, "mission")
+        os.makedirs(os.path.join(self.mission_path, "tactical", "Detection"))
+        self.file_path = os.path.join(self.mission_path, "tactical", "Detection", "detection.kml")
+        with open(self.file_path, "w") as file:
+            file.write("<kml/>")
+
+        def get_product_and_key(file_path, folder):
+            return Product("tactical", "Detection", datetime.now(timezone.utc)), f"{folder}/TACTICAL/detection.kml"
+
+        self.storage_paths = [os.path.join(self.directory.name, name) for name in ("agency", "archive")]
+        self.pipeline = FanOutPipeline(
+            [
+                (
+                    {"name": name, "settleSeconds": 0.1},
+                    LocalFileManager(storage_path),
+                    lambda file_path, name=name: get_product_and_key(file_path, name),
+                )
+                for name, storage_path in zip(("agency", "archive"), self.storage_paths)
+            ],
+            "TEST",
+            self.mission_path,
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_files_are_uploaded_to_every_destination(self):
+        self.pipeline.start()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and any(
+            pipeline.journal.get_state(self.file_path) != DONE for pipeline in self.pipeline.pipelines
+        ):
+            time.sleep(0.05)
+        self.pipeline.stop_watching()
+        self.pipeline.drain()
+        self.pipeline.close()
+
+        for name, storage_path in zip(("agency", "archive"), self.storage_paths):
+            self.assertTrue(os.path.exists(os.path.join(storage_path, name, "TACTICAL", "detection.kml")))
+        self.assertTrue(os.path.exists(os.path.join(self.mission_path, get_journal_file_name("archive"))))
+        # Read once, for both destinations
+        self.assertEqual(self.pipeline.file_cache.read_count, 1)
+
+    def test_an_offline_destination_does_not_hold_up_the_others(self):
+        detection_path = os.path.join(self.mission_path, "tactical", "Detection")
+        file_paths = [self.file_path]
+        for index in range(9):
+            file_paths.append(os.path.join(detection_path, f"detection-{index}.kml"))
+            with open(file_paths[-1], "w") as file:
+                file.write(f"<kml>{index}</kml>")
+
+        offline = OfflineFileManager(self.storage_paths[1])
+        pipeline = FanOutPipeline(
+            [
+                (
+                    {"name": name, "settleSeconds": 0.1, "uploadQueueSize": 2, "uploadWorkers": 1},
+                    file_manager,
+                    lambda file_path, name=name: (
+                        Product("tactical", "Detection", datetime.now(timezone.utc)),
+                        f"{name}/TACTICAL/{os.path.basename(file_path)}",
+                    ),
+                )
+                for name, file_manager in (("archive", offline), ("agency", LocalFileManager(self.storage_paths[0])))
+            ],
+            "TEST",
+            self.mission_path,
+        )
+        agency = pipeline.pipelines[1]
+        pipeline.start()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and any(
+            agency.journal.get_state(file_path) != DONE for file_path in file_paths
+        ):
+            time.sleep(0.05)
+        uploaded = [file_path for file_path in file_paths if agency.journal.get_state(file_path) == DONE]
+        offline.online.set()
+        pipeline.stop_watching()
+        pipeline.drain()
+        pipeline.close()
+
+        self.assertEqual(len(uploaded), 10)
+        self.assertEqual(len(os.listdir(os.path.join(self.storage_paths[1], "archive", "TACTICAL"))), 10)
+
+    def test_previews_are_rendered_once(self):
+        def get_product_and_key(file_path, folder):
+            product_type = "image" if file_path.endswith(".png") else "tactical"
+            product = Product(product_type, "EO", datetime.now(timezone.utc))
+            return product, f"{folder}/IMAGERY/{os.path.basename(file_path)}"
+
+        os.makedirs(os.path.join(self.mission_path, "images", "EO"))
+        image_path = os.path.join(self.mission_path, "images", "EO", "frame.png")
+        Image.new("RGB", (400, 200), "green").save(image_path)
+        pipeline = FanOutPipeline(
+            [
+                (
+                    {"name": name, "settleSeconds": 0.1, "previewProductTypes": ["image"]},
+                    LocalFileManager(storage_path),
+                    lambda file_path, name=name: get_product_and_key(file_path, name),
+                )
+                for name, storage_path in zip(("agency", "archive"), self.storage_paths)
+            ],
+            "TEST",
+            self.mission_path,
+        )
+        preview_paths = [
+            os.path.join(storage_path, name, "IMAGERY", "frame_preview.jpg")
+            for name, storage_path in zip(("agency", "archive"), self.storage_paths)
+        ]
+
+        with patch.object(
+            ImagePreviews, "_render", autospec=True, side_effect=ImagePreviews._render
+        ) as render:
+            pipeline.start()
+            deadline = time.monotonic() + 30
+            while time.monotonic() < deadline and not all(map(os.path.exists, preview_paths)):
+                time.sleep(0.05)
+            pipeline.stop_watching()
+            pipeline.drain()
+            pipeline.close()
+
+        self.assertTrue(all(map(os.path.exists, preview_paths)))
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(pipeline.file_cache.cached_bytes, 0)
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+import unittest
+
+from services.file_settler import FileSettler
+
+
+class TestFileSettler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.emitted = []
+        self.settler = FileSettler(self.emitted.extend, settle_seconds=0.05)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, file_name, data=b"data"):
+        file_path = os.path.join(self.directory.name, file_name)
+        with open(file_path, "ab") as file:
+            file.write(data)
+        return file_path
+
+    def test_emits_once_file_stops_changing(self):
+        file_path = self.write("frame.tif")
+        self.settler.notify(file_path)
+        self.settler.notify(file_path)
+
+        self.settler.poll()
+        self.assertEqual(self.emitted, [])
+
+        time.sleep(0.1)
+        self.settler.poll()
+        self.settler.notify(file_path)
+        time.sleep(0.1)
+        self.settler.poll()
+        self.settler.poll()
+        self.assertEqual(self.emitted, [file_path])
+
+    def test_batch_of_closed_files_is_emitted_together(self):
+        frames = [self.write(f"frame{i}.jpg") for i in range(3)]
+        events = {frame: True for frame in frames}
+        events[self.write("frame3.jpg.tmp")] = True
+        self.settler.notify_batch(events)
+
+        self.settler.poll()
+
+        self.assertEqual(sorted(self.emitted), frames)
+
+    def test_growing_file_is_not_emitted(self):
+        file_path = self.write("video.ts")
+        self.settler.notify(file_path)
+        self.settler.poll()
+        time.sleep(0.1)
+        self.write("video.ts", b"more data")
+        self.settler.poll()
+
+        self.assertEqual(self.emitted, [])
+
+    def test_closed_file_is_emitted_immediately(self):
+        file_path = self.write("frame.tif")
+        self.settler.mark_closed(file_path)
+        self.settler.poll()
+
+        self.assertEqual(self.emitted, [file_path])
+
+    def test_temporary_and_hidden_files_are_ignored(self):
+        for file_name in ["frame.tif.part", "frame.TMP", ".journal"]:
+            self.settler.mark_closed(self.write(file_name))
+        self.settler.poll()
+
+        self.assertEqual(self.emitted, [])
+
+    def test_waits_for_ready_sidecar(self):
+        settler = FileSettler(self.emitted.extend, settle_seconds=0, ready_suffix=".done")
+        file_path = self.write("mosaic.tif")
+        settler.mark_closed(file_path)
+        settler.poll()
+        self.assertEqual(self.emitted, [])
+
+        settler.notify(self.write("mosaic.tif.done", b""))
+        settler.poll()
+        self.assertEqual(self.emitted, [file_path])
@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from models.product import Product
+from services.image_previews import ImagePreviews, generate_preview, get_preview_key
+from services.mission_uploader import MissionUploader
+from services.upload_journal import UploadJournal
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class TestImagePreviews(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.directory.name, "images", "EO"))
+        self.timestamp = datetime(2024, 8, 1, 12, 30, tzinfo=timezone.utc)
+        self.queued = []
+        self.queued_event = threading.Event()
+        self.previews = ImagePreviews(
+            self.directory.name, self.get_product_and_key, self.queue_preview, max_size=64
+        )
+
+    def tearDown(self):
+        self.previews.stop()
+        self.directory.cleanup()
+
+    def get_product_and_key(self, file_path):
+        name = os.path.basename(file_path)
+        if name.endswith(".kml"):
+            return Product("tactical", "Detection", self.timestamp), f"TACTICAL/{name}"
+        return Product("image", "EO", self.timestamp), f"IMAGERY/{name}"
+
+    def queue_preview(self, file_path):
+        self.queued.append(file_path)
+        self.queued_event.set()
+
+    def write_image(self, name, image):
+        file_path = os.path.join(self.directory.name, "images", "EO", name)
+        image.save(file_path)
+        return file_path
+
+    def test_preview_is_downsampled(self):
+        source = self.write_image("frame.png", Image.new("RGB", (400, 200), "red"))
+        preview_path = os.path.join(self.directory.name, "preview.jpg")
+
+        generate_preview(source, preview_path, 64, 70)
+
+        with Image.open(preview_path) as preview:
+            self.assertEqual(preview.format, "JPEG")
+            self.assertEqual(preview.size, (64, 32))
+
+    def test_16_bit_images_are_stretched_to_8_bits(self):
+        image = Image.new("I;16", (100, 100), 1000)
+        image.paste(3000, (50, 0, 100, 100))
+        source = self.write_image("ir.tif", image)
+        preview_path = os.path.join(self.directory.name, "preview.jpg")
+
+        generate_preview(source, preview_path, 64, 95)
+
+        with Image.open(preview_path) as preview:
+            self.assertEqual(preview.mode, "L")
+            low, high = preview.getextrema()
+            self.assertLess(low, 10)
+            self.assertGreater(high, 245)
+
+    def test_preview_key_is_next_to_the_image(self):
+        self.assertEqual(get_preview_key("IMAGERY/frame.tif"), "IMAGERY/frame_preview.jpg")
+
+    def test_previews_are_generated_and_queued(self):
+        source = self.write_image("frame.png", Image.new("RGB", (400, 200), "blue"))
+        tactical_path = os.path.join(self.directory.name, "detection.kml")
+        with open(tactical_path, "w") as file:
+            file.write("<kml/>")
+
+        self.previews.start()
+        self.previews.add(tactical_path)
+        self.previews.add(source)
+        self.assertTrue(self.queued_event.wait(30))
+
+        self.assertEqual(len(self.queued), 1)
+        preview = self.previews.get_preview(self.queued[0])
+        self.assertEqual(preview.source_path, source)
+        self.assertEqual(preview.key, "IMAGERY/frame_preview.jpg")
+        self.assertTrue(os.path.basename(preview.path).startswith(".preview-"))
+        self.assertEqual(self.previews.pending, 0)
+
+    def test_images_that_cant_be_decoded_get_no_preview(self):
+        source = os.path.join(self.directory.name, "images", "EO", "broken.tif")
+        with open(source, "wb") as file:
+            file.write(b"not an image")
+
+        self.previews.start()
+        self.previews.add(source)
+        self.previews.stop()
+
+        self.assertEqual(self.queued, [])
+        self.assertEqual(self.previews.pending, 0)
+        self.assertEqual(self.previews.remove_stale_previews(), [])
+
+    def test_uploaded_preview_is_deleted(self):
+        source = self.write_image("frame.png", Image.new("RGB", (400, 200), "green"))
+        self.previews.start()
+        self.previews.add(source)
+        self.assertTrue(self.queued_event.wait(30))
+        preview_path = self.queued[0]
+
+        journal = UploadJournal(self.directory.name)
+        file_manager = MagicMock()
+        uploader = MissionUploader(file_manager, journal, self.get_product_and_key, previews=self.previews)
+        self.assertTrue(uploader.prepare(preview_path))
+        uploader.upload(preview_path)
+
+        self.assertEqual(file_manager.upload_file.call_args[0][1], "IMAGERY/frame_preview.jpg")
+        self.assertIsNone(journal.get_state(preview_path))
+        self.assertFalse(os.path.exists(preview_path))
+        self.assertIsNone(self.previews.get_preview(preview_path))
+        journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,22 @@
 from datetime import datetime, timezone
 import unittest
-from unittest.mock import patch
-
-from main import create_product_from_file_path, get_mission_details, get_product_s3_key
+from unittest.mock import MagicMock, patch
+
+from main import (
+    DEFAULT_MEMORY_BUDGET,
+    create_product_from_file_path,
+    create_s3_file_manager,
+    find_account,
+    get_mission_details,
+    get_mission_folder_name,
+    get_product_s3_key,
+    get_run_options,
+    parse_args,
+    parse_mission_folder_name,
+    watch_missions,
+)
 from models.product import Product
+from services.s3_file_manager import MB
 
 
 class TestMain(unittest.TestCase):
@@ -108,3 +121,57 @@ class TestMain(unittest.TestCase):
             f"VIDEO/{product.timestamp.strftime('%Y%m%d_%H%M%SZ')}_Mission789_Video.ts"
         )
         self.assertEqual(s3_key, expected_s3_key)
+
+    def test_parse_mission_folder_name(self):
+        mission_time = datetime(2024, 8, 1, 18, 30)
+
+        self.assertEqual(
+            parse_mission_folder_name(get_mission_folder_name("AZ-ASF-FIRE_2", mission_time)),
+            ("AZ-ASF-FIRE_2", mission_time),
+        )
+        self.assertIsNone(parse_mission_folder_name("notes"))
+
+    def test_find_account(self):
+        accounts = [{"name": "Agency"}, {"name": "Archive"}]
+
+        self.assertEqual(find_account(accounts, "archive"), accounts[1])
+        self.assertEqual(find_account(accounts, "1"), accounts[0])
+        self.assertIsNone(find_account(accounts, None))
+        self.assertEqual(find_account(accounts[:1], None), accounts[0])
+
+    def test_get_run_options(self):
+        config = MagicMock(config={"account": "Agency", "missionTime": "2024-08-01 10:00"})
+
+        with patch.dict("os.environ", {"DSA_MISSION": "Buckwheat Ridge"}):
+            options = get_run_options(parse_args(["--account", "Archive"]), config)
+
+        self.assertTrue(options.headless)
+        self.assertEqual(options.account, "Archive")
+        self.assertEqual(options.mission, "Buckwheat Ridge")
+        self.assertEqual(options.mission_time, "2024-08-01 10:00")
+        self.assertFalse(options.all_missions)
+
+    def test_memory_budget_fits_every_part_in_flight_up_to_a_cap(self):
+        account = {"bucket": "bucket", "uploadWorkers": 1, "multipartConcurrency": 3, "multipartPartSizeMb": 8}
+
+        self.assertEqual(create_s3_file_manager(account).memory_budget.max_bytes, 3 * 8 * MB)
+        account["uploadWorkers"] = 4
+        self.assertEqual(create_s3_file_manager(account).memory_budget.max_bytes, DEFAULT_MEMORY_BUDGET)
+        account["memoryBudgetMb"] = 256
+        self.assertEqual(create_s3_file_manager(account).memory_budget.max_bytes, 256 * MB)
+
+    def test_found_missions_get_their_marker_file(self):
+        pipeline = MagicMock(pipelines={})
+        pipeline.add_mission.side_effect = lambda name, path, *args: pipeline.pipelines.setdefault(path, name)
+        file_manager = MagicMock()
+        file_manager.upload_empty_file.side_effect = [OSError("offline"), None]
+        missions = [("Buckwheat-Ridge", datetime(2024, 8, 1, 10, 0), "/missions/Buckwheat-Ridge_2024-08-01T1000")]
+        unmarked = set()
+
+        watch_missions(pipeline, {"folder": "vendor"}, file_manager, missions, unmarked)
+        self.assertEqual(unmarked, {"/missions/Buckwheat-Ridge_2024-08-01T1000"})
+        watch_missions(pipeline, {"folder": "vendor"}, file_manager, missions, unmarked)
+
+        self.assertEqual(unmarked, set())
+        self.assertEqual(pipeline.add_mission.call_count, 1)
+        file_manager.upload_empty_file.assert_called_with("vendor/MISSION/Buckwheat-Ridge_20240801_1000Z.txt")
@@ -0,0 +1,114 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from services.memory_budget import BufferReader, MemoryBudget
+from services.multipart_uploader import MIN_PART_SIZE, MultipartUploader
+from services.upload_journal import UploadJournal
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def test_reservations_wait_for_room(self):
+        budget = MemoryBudget(100)
+        order = []
+
+        def reserve():
+            with budget.reserve(60):
+                order.append("second")
+
+        with budget.reserve(60):
+            thread = threading.Thread(target=reserve)
+            thread.start()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+            order.append("first")
+        thread.join(5)
+
+        self.assertEqual(order, ["first", "second"])
+        self.assertEqual(budget.in_use, 0)
+        self.assertEqual(budget.peak, 60)
+
+    def test_reservations_larger_than_the_budget_are_capped(self):
+        budget = MemoryBudget(100)
+
+        with budget.reserve(500):
+            self.assertEqual(budget.in_use, 100)
+            self.assertFalse(budget.try_acquire(1))
+        self.assertTrue(budget.try_acquire(1))
+
+    def test_buffers_are_reused(self):
+        budget = MemoryBudget(100)
+
+        with budget.buffer(50) as view:
+            view[:5] = b"hello"
+            first = view.obj
+        with budget.buffer(40) as view:
+            self.assertIs(view.obj, first)
+            self.assertEqual(len(view), 40)
+
+    def test_free_buffers_are_dropped_when_they_no_longer_fit(self):
+        budget = MemoryBudget(100)
+
+        with budget.buffer(80):
+            pass
+        with budget.buffer(90) as view:
+            self.assertEqual(len(view.obj), 90)
+        self.assertEqual(budget.in_use, 0)
+        self.assertEqual([len(buffer) for buffer in budget._free], [90])
+
+
+class TestBufferReader(unittest.TestCase):
+    def test_reads_and_seeks(self):
+        reader = BufferReader(memoryview(b"0123456789"))
+
+        self.assertEqual(reader.read(4), b"0123")
+        self.assertEqual(reader.seek(-2, io.SEEK_END), 8)
+        self.assertEqual(reader.read(), b"89")
+        self.assertEqual(reader.read(), b"")
+        reader.seek(0)
+        self.assertEqual(reader.read(), b"0123456789")
+
+
+class TestMultipartMemory(unittest.TestCase):
+    def test_parts_in_flight_stay_within_the_budget(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "mosaic.tif")
+            with open(file_path, "wb") as file:
+                file.write(bytes(range(256)) * (MIN_PART_SIZE * 4 // 256) + b"end")
+
+            budget = MemoryBudget(MIN_PART_SIZE * 2)
+            s3_client = MagicMock()
+            s3_client.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+            bodies = {}
+
+            def upload_part(**kwargs):
+                self.assertLessEqual(budget.in_use, MIN_PART_SIZE * 2)
+                bodies[kwargs["PartNumber"]] = kwargs["Body"].read()
+                return {"ETag": f"etag-{kwargs['PartNumber']}"}
+
+            s3_client.upload_part.side_effect = upload_part
+            journal = UploadJournal(directory)
+            MultipartUploader(
+                s3_client,
+                "bucket",
+                journal,
+                part_size=MIN_PART_SIZE,
+                max_concurrency=4,
+                memory_budget=budget,
+            ).upload(file_path, "IMAGERY/mosaic.tif")
+            journal.close()
+
+            with open(file_path, "rb") as file:
+                self.assertEqual(b"".join(bodies[number] for number in sorted(bodies)), file.read())
+        self.assertEqual(len(bodies), 5)
+        # How many parts overlap depends on thread timing, but every part went through the budget
+        self.assertLessEqual(budget.peak, MIN_PART_SIZE * 2)
+        self.assertGreaterEqual(budget.peak, MIN_PART_SIZE)
+        self.assertEqual(budget.in_use, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
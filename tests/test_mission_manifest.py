@@ -0,0 +1,141 @@
+from datetime import datetime, timezone
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from models.product import Product
+from services.mission_manifest import MissionManifest, get_mission_key
+from services.mission_uploader import MissionUploader
+from services.upload_journal import UploadJournal
+
+MISSION_TIME = datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc)
+
+
+class TestMissionManifest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = UploadJournal(self.directory.name)
+        self.file_manager = MagicMock()
+        self.uploaded = threading.Event()
+        self.file_manager.upload_metadata_file.side_effect = lambda *args: self.uploaded.set()
+        self.manifest = MissionManifest(
+            "TEST",
+            MISSION_TIME,
+            self.journal,
+            self.file_manager,
+            "MISSION/TEST_20240101_1000Z.json",
+            interval=60,
+            max_pending=2,
+        )
+        self.product = Product("image", "EO", MISSION_TIME)
+
+    def tearDown(self):
+        self.manifest.stop()
+        self.journal.close()
+        self.directory.cleanup()
+
+    def read_manifest(self):
+        with open(self.manifest.file_path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def test_mission_keys(self):
+        self.assertEqual(get_mission_key("TEST", MISSION_TIME), "MISSION/TEST_20240101_1000Z.txt")
+        self.assertEqual(
+            get_mission_key("TEST", MISSION_TIME, "vendor", ".json"), "vendor/MISSION/TEST_20240101_1000Z.json"
+        )
+
+    def test_written_once_enough_uploads_are_waiting(self):
+        self.manifest.start()
+        self.manifest.add("IMAGERY/a.tif", self.product, 10, "hash-a")
+        self.assertFalse(self.uploaded.wait(0.2))
+
+        self.manifest.add("IMAGERY/b.tif", self.product, 20, "hash-b", preview=True)
+        self.assertTrue(self.uploaded.wait(5))
+
+        self.file_manager.upload_metadata_file.assert_called_once_with(
+            self.manifest.file_path, "MISSION/TEST_20240101_1000Z.json"
+        )
+        files = self.read_manifest()["files"]
+        self.assertEqual([file["key"] for file in files], ["IMAGERY/a.tif", "IMAGERY/b.tif"])
+        self.assertEqual(files[0]["sha256"], "hash-a")
+        self.assertEqual(files[0]["type"], "image")
+        self.assertEqual(files[0]["timestamp"], MISSION_TIME.isoformat())
+        self.assertTrue(files[1]["preview"])
+        self.assertEqual(self.manifest.pending, 0)
+
+    def test_failed_writes_keep_entries_pending(self):
+        self.file_manager.upload_metadata_file.side_effect = OSError("offline")
+        self.manifest.add("IMAGERY/a.tif", self.product, 10, "hash-a")
+
+        self.assertFalse(self.manifest.write())
+        self.assertEqual(self.manifest.pending, 1)
+
+        self.file_manager.upload_metadata_file.side_effect = None
+        self.manifest.stop()
+        self.assertEqual(self.file_manager.upload_metadata_file.call_count, 2)
+        self.assertEqual(self.manifest.pending, 0)
+
+    def test_batches_grow_with_the_manifest(self):
+        for index in range(40):
+            self.manifest.add(f"IMAGERY/{index}.tif", self.product, 10, f"hash-{index}")
+        self.assertTrue(self.manifest.write())
+        self.uploaded.clear()
+        self.manifest.start()
+
+        # Started with entries in the journal, which count as one more waiting
+        self.manifest.add("IMAGERY/40.tif", self.product, 10, "hash-40")
+        self.manifest.add("IMAGERY/41.tif", self.product, 10, "hash-41")
+        self.assertFalse(self.uploaded.wait(0.2))
+
+        self.manifest.add("IMAGERY/42.tif", self.product, 10, "hash-42")
+        self.assertTrue(self.uploaded.wait(5))
+        self.assertEqual(len(self.read_manifest()["files"]), 43)
+
+    def test_not_written_while_uploads_are_paused(self):
+        paused = threading.Event()
+        paused.set()
+        self.manifest.is_paused = paused.is_set
+        self.manifest.start()
+        self.manifest.add("IMAGERY/a.tif", self.product, 10, "hash-a")
+        self.manifest.add("IMAGERY/b.tif", self.product, 20, "hash-b")
+        self.assertFalse(self.uploaded.wait(0.2))
+
+        paused.clear()
+        self.manifest.add("IMAGERY/c.tif", self.product, 30, "hash-c")
+        self.assertTrue(self.uploaded.wait(5))
+        self.assertEqual(self.file_manager.upload_metadata_file.call_count, 1)
+
+    def test_entries_survive_a_restart(self):
+        self.manifest.add("IMAGERY/a.tif", self.product, 10, "hash-a")
+
+        restarted = MissionManifest(
+            "TEST", MISSION_TIME, self.journal, self.file_manager, "MISSION/TEST_20240101_1000Z.json"
+        )
+        restarted.start()
+        restarted.stop()
+
+        self.assertEqual([file["key"] for file in self.read_manifest()["files"]], ["IMAGERY/a.tif"])
+
+    def test_uploads_are_added(self):
+        file_path = os.path.join(self.directory.name, "frame.tif")
+        with open(file_path, "wb") as file:
+            file.write(b"data")
+        uploader = MissionUploader(
+            MagicMock(),
+            self.journal,
+            lambda file_path: (self.product, "IMAGERY/frame.tif"),
+            manifest=self.manifest,
+        )
+
+        uploader.prepare(file_path)
+        uploader.upload(file_path)
+
+        self.assertEqual(self.manifest.pending, 1)
+        self.assertEqual(self.journal.get_manifest_entries()[0][:4], ("IMAGERY/frame.tif", "image", "EO", 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from services.mission_poller import MissionPoller, MissionSnapshot
+
+
+class TestMissionSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        for index in range(5):
+            os.makedirs(os.path.join(self.root, "images", f"camera{index}"))
+            for frame in range(20):
+                self.write_file(os.path.join("images", f"camera{index}", f"frame{frame}.jpg"))
+        self.age_tree()
+        self.snapshot = MissionSnapshot(self.root, active_seconds=60)
+        self.assertEqual(len(self.snapshot.scan()), 100)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, relative_path, data=b"frame", age=0):
+        file_path = os.path.join(self.root, relative_path)
+        with open(file_path, "wb") as file:
+            file.write(data)
+        if age:
+            modified = time.time() - age
+            os.utime(file_path, (modified, modified))
+        return file_path
+
+    def age_tree(self, age=600):
+        # Files and directories written long ago, so they aren't active or racy
+        modified = time.time() - age
+        for directory, _, file_names in os.walk(self.root):
+            for name in file_names:
+                os.utime(os.path.join(directory, name), (modified, modified))
+            os.utime(directory, (modified, modified))
+
+    def test_unchanged_tree_only_stats_directories(self):
+        listed_count, stat_count = self.snapshot.listed_count, self.snapshot.stat_count
+
+        self.assertEqual(self.snapshot.scan(), [])
+        self.assertEqual(self.snapshot.listed_count, listed_count)
+        # The root, images and the five camera folders
+        self.assertEqual(self.snapshot.stat_count - stat_count, 7)
+
+    def test_new_file_lists_only_its_directory(self):
+        file_path = self.write_file(os.path.join("images", "camera2", "frame99.jpg"), age=30)
+        listed_count = self.snapshot.listed_count
+
+        self.assertEqual(self.snapshot.scan(), [file_path])
+        self.assertEqual(self.snapshot.listed_count - listed_count, 1)
+        self.assertEqual(self.snapshot.file_count, 101)
+
+    def test_new_files_are_watched_while_being_written(self):
+        file_path = self.write_file(os.path.join("images", "camera1", "frame99.jpg"))
+        self.assertEqual(self.snapshot.scan(), [file_path])
+
+        with open(file_path, "ab") as file:
+            file.write(b" more")
+        os.utime(os.path.dirname(file_path), (time.time() - 600,) * 2)
+
+        self.assertEqual(self.snapshot.scan(), [file_path])
+        self.assertEqual(self.snapshot.scan(), [])
+
+    def test_files_rewritten_in_place_are_found_by_a_full_scan(self):
+        file_path = os.path.join(self.root, "images", "camera0", "frame3.jpg")
+        with open(file_path, "ab") as file:
+            file.write(b" rewritten")
+        os.utime(os.path.dirname(file_path), (time.time() - 600,) * 2)
+
+        self.assertEqual(self.snapshot.scan(), [])
+        self.assertEqual(self.snapshot.scan(full=True), [file_path])
+
+    def test_deleted_directories_are_forgotten(self):
+        shutil.rmtree(os.path.join(self.root, "images", "camera4"))
+
+        self.assertEqual(self.snapshot.scan(), [])
+        self.assertEqual(self.snapshot.file_count, 80)
+
+    def test_hidden_files_are_skipped(self):
+        self.write_file(".upload_journal.sqlite3")
+        self.write_file(os.path.join("images", "camera0", ".frame.jpg.part"))
+
+        self.assertEqual(self.snapshot.scan(), [])
+
+
+class TestMissionPoller(unittest.TestCase):
+    def test_only_changes_after_start_are_handed_on(self):
+        with tempfile.TemporaryDirectory() as root:
+            with open(os.path.join(root, "existing.kml"), "w") as file:
+                file.write("<kml/>")
+            batches = []
+            poller = MissionPoller(root, batches.append, interval=60)
+            poller.start()
+            try:
+                new_path = os.path.join(root, "new.kml")
+                with open(new_path, "w") as file:
+                    file.write("<kml/>")
+                poller.poll()
+            finally:
+                poller.stop()
+
+        self.assertEqual(batches, [{new_path: False}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import os
+import tempfile
+import unittest
+
+from services.mission_scanner import scan_mission_files
+
+
+class TestMissionScanner(unittest.TestCase):
+    def test_yields_files_recursively_skipping_hidden(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, "images", "EO"))
+            os.makedirs(os.path.join(directory, ".hidden"))
+            expected = []
+            for file_path in [
+                os.path.join(directory, "images", "EO", "frame.tif"),
+                os.path.join(directory, "videos.ts"),
+            ]:
+                open(file_path, "w").close()
+                expected.append(file_path)
+            open(os.path.join(directory, ".upload_journal.sqlite3"), "w").close()
+            open(os.path.join(directory, ".hidden", "file.tif"), "w").close()
+
+            scanned = [entry.path for entry in scan_mission_files(directory)]
+
+        self.assertCountEqual(scanned, expected)
+
+    def test_missing_directory_yields_nothing(self):
+        self.assertEqual(list(scan_mission_files("/does/not/exist")), [])
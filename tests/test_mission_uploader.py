@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+import os
+import tempfile
+import unittest
+from unittest.mock import ANY, MagicMock
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from models.product import Product
+from services.mission_uploader import MissionUploader
+from services.upload_journal import DONE, FAILED, QUEUED, UploadJournal
+from services.upload_retry import RetryPolicy, RetryUpload
+
+
+class TestMissionUploader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = UploadJournal(self.directory.name)
+        self.file_path = os.path.join(self.directory.name, "frame.tif")
+        with open(self.file_path, "wb") as file:
+            file.write(b"data")
+
+        self.product = Product("image", "EO", datetime.now(timezone.utc))
+        self.file_manager = MagicMock()
+        self.connectivity_monitor = MagicMock()
+        self.uploader = MissionUploader(
+            self.file_manager,
+            self.journal,
+            lambda file_path: (self.product, "IMAGERY/frame.tif"),
+            RetryPolicy(base_delay=1, max_attempts=2),
+            self.connectivity_monitor,
+        )
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    def test_uploads_each_version_once(self):
+        self.assertTrue(self.uploader.prepare(self.file_path))
+        self.uploader.upload(self.file_path)
+
+        self.file_manager.upload_file.assert_called_once_with(
+            self.file_path, "IMAGERY/frame.tif", "image", ANY
+        )
+        self.assertEqual(self.file_manager.upload_file.call_args.args[3].size, 4)
+        self.assertEqual(self.journal.get_state(self.file_path), DONE)
+        self.assertFalse(self.uploader.prepare(self.file_path))
+
+        metrics = self.uploader.metrics
+        self.assertEqual(metrics.uploads.get(product_type="image", result="done"), 1)
+        self.assertEqual(metrics.upload_bytes.get(product_type="image"), 4)
+        self.assertEqual(metrics.upload_duration.get_count(product_type="image"), 1)
+        self.assertEqual(metrics.queue_wait.get_count(product_type="image"), 1)
+
+    def test_contents_already_uploaded_are_skipped(self):
+        copy_path = os.path.join(self.directory.name, "copy.tif")
+        with open(copy_path, "wb") as file:
+            file.write(b"data")
+
+        for file_path in [self.file_path, copy_path]:
+            self.uploader.prepare(file_path)
+            self.uploader.upload(file_path)
+
+        self.file_manager.upload_file.assert_called_once()
+        self.assertEqual(self.journal.get_state(copy_path), DONE)
+        self.assertEqual(self.uploader.metrics.duplicate_bytes.get(product_type="image"), 4)
+
+    def test_transient_errors_retry_then_fail(self):
+        self.file_manager.upload_file.side_effect = ClientError(
+            {"Error": {"Code": "SlowDown"}}, "PutObject"
+        )
+        self.uploader.prepare(self.file_path)
+
+        with self.assertRaises(RetryUpload):
+            self.uploader.upload(self.file_path)
+        self.assertEqual(self.journal.get_state(self.file_path), QUEUED)
+
+        self.uploader.upload(self.file_path)
+        self.assertEqual(self.journal.get_state(self.file_path), FAILED)
+        self.assertEqual(len(self.journal.get_failed_uploads()), 1)
+
+        metrics = self.uploader.metrics
+        self.assertEqual(metrics.retries.get(product_type="image", reason="transient"), 1)
+        self.assertEqual(metrics.uploads.get(product_type="image", result="failed"), 1)
+
+    def test_permanent_errors_fail_immediately(self):
+        self.file_manager.upload_file.side_effect = ClientError(
+            {"Error": {"Code": "AccessDenied"}}, "PutObject"
+        )
+        self.uploader.prepare(self.file_path)
+        self.uploader.upload(self.file_path)
+
+        self.assertEqual(self.journal.get_state(self.file_path), FAILED)
+
+    def test_connectivity_errors_spool_without_using_attempts(self):
+        self.file_manager.upload_file.side_effect = EndpointConnectionError(
+            endpoint_url="url"
+        )
+        self.uploader.prepare(self.file_path)
+
+        for _ in range(5):
+            with self.assertRaises(RetryUpload) as retry:
+                self.uploader.upload(self.file_path)
+            self.assertEqual(retry.exception.delay, 0)
+
+        self.assertEqual(self.connectivity_monitor.report_offline.call_count, 5)
+        self.assertEqual(self.journal.get_state(self.file_path), QUEUED)
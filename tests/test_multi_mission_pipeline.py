@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+import os
+import tempfile
+import time
+import unittest
+
+from models.product import Product
+from services.local_file_manager import LocalFileManager
+from services.multi_mission_pipeline import MultiMissionPipeline
+from services.upload_journal import DONE
+
+
+class TestMultiMissionPipeline(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pipeline = MultiMissionPipeline(
+            {"settleSeconds": 0.1, "uploadWorkers": 2},
+            LocalFileManager(os.path.join(self.directory.name, "storage")),
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def add_mission(self, mission_name):
+        mission_path = os.path.join(self.directory.name, mission_name)
+        os.makedirs(os.path.join(mission_path, "videos"))
+        file_path = os.path.join(mission_path, "videos", "segment.ts")
+        with open(file_path, "w") as file:
+            file.write(mission_name)
+
+        def get_product_and_key(file_path):
+            return Product("video", None, datetime.now(timezone.utc)), f"VIDEO/{mission_name}.ts"
+
+        return self.pipeline.add_mission(mission_name, mission_path, get_product_and_key), file_path
+
+    def test_missions_share_the_upload_workers(self):
+        first, first_path = self.add_mission("FIRST")
+        self.pipeline.start()
+        # Added while running
+        second, second_path = self.add_mission("SECOND")
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and (
+            first.journal.get_state(first_path) != DONE or second.journal.get_state(second_path) != DONE
+        ):
+            time.sleep(0.05)
+        self.pipeline.stop_watching()
+        self.pipeline.drain()
+        self.pipeline.close()
+
+        self.assertIs(first.upload_queue, second.upload_queue)
+        for mission_name in ("FIRST", "SECOND"):
+            with open(os.path.join(self.directory.name, "storage", "VIDEO", f"{mission_name}.ts")) as file:
+                self.assertEqual(file.read(), mission_name)
+        self.assertEqual(self.pipeline.metrics.uploads.get(product_type="video", result="done"), 2)
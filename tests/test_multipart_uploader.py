@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+
+from services.file_digest import digest_bytes
+from services.multipart_uploader import MIN_PART_SIZE, MultipartUploader
+from services.upload_journal import UploadJournal
+
+
+class TestMultipartUploader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = UploadJournal(self.directory.name)
+        self.file_path = os.path.join(self.directory.name, "video.ts")
+        with open(self.file_path, "wb") as file:
+            file.write(b"x" * (MIN_PART_SIZE * 2 + 10))
+
+        self.s3_client = MagicMock()
+        self.s3_client.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+        self.s3_client.upload_part.side_effect = lambda **kwargs: {
+            "ETag": f"etag-{kwargs['PartNumber']}"
+        }
+        self.uploader = MultipartUploader(
+            self.s3_client, "bucket", self.journal, part_size=MIN_PART_SIZE
+        )
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    def completed_parts(self):
+        return self.s3_client.complete_multipart_upload.call_args.kwargs[
+            "MultipartUpload"
+        ]["Parts"]
+
+    def test_uploads_all_parts(self):
+        self.uploader.upload(self.file_path, "VIDEO/key.ts")
+
+        self.assertEqual(self.s3_client.upload_part.call_count, 3)
+        self.assertEqual(
+            self.completed_parts(),
+            [{"PartNumber": n, "ETag": f"etag-{n}"} for n in [1, 2, 3]],
+        )
+        self.assertIsNone(self.journal.get_multipart_upload("VIDEO/key.ts"))
+
+    def test_parts_are_sent_with_checksums(self):
+        self.uploader.checksums = True
+
+        self.uploader.upload(self.file_path, "VIDEO/key.ts")
+
+        self.assertEqual(
+            self.s3_client.create_multipart_upload.call_args.kwargs["ChecksumAlgorithm"], "SHA256"
+        )
+        first_part = next(
+            call.kwargs
+            for call in self.s3_client.upload_part.call_args_list
+            if call.kwargs["PartNumber"] == 1
+        )
+        self.assertEqual(
+            first_part["ChecksumSHA256"], digest_bytes(b"x" * MIN_PART_SIZE).sha256_base64
+        )
+        self.assertIn("ContentMD5", first_part)
+        self.assertEqual(self.completed_parts()[0]["ChecksumSHA256"], first_part["ChecksumSHA256"])
+
+    def test_resumes_from_recorded_parts(self):
+        stat = os.stat(self.file_path)
+        self.journal.add_multipart_upload(
+            "upload-0", "VIDEO/key.ts", stat.st_size, stat.st_mtime_ns, MIN_PART_SIZE
+        )
+        self.journal.add_multipart_part("upload-0", 1, "etag-1")
+
+        self.uploader.upload(self.file_path, "VIDEO/key.ts")
+
+        self.s3_client.create_multipart_upload.assert_not_called()
+        uploaded = [c.kwargs["PartNumber"] for c in self.s3_client.upload_part.call_args_list]
+        self.assertCountEqual(uploaded, [2, 3])
+        self.assertEqual(len(self.completed_parts()), 3)
+
+    def test_reports_progress_including_resumed_parts(self):
+        stat = os.stat(self.file_path)
+        self.journal.add_multipart_upload(
+            "upload-0", "VIDEO/key.ts", stat.st_size, stat.st_mtime_ns, MIN_PART_SIZE
+        )
+        self.journal.add_multipart_part("upload-0", 1, "etag-1")
+        self.s3_client.upload_part.side_effect = lambda **kwargs: {
+            "ETag": f"etag-{kwargs['PartNumber']}",
+            "Read": kwargs["Body"].read(),
+        }
+        progress = []
+        self.uploader.on_progress = progress.append
+
+        self.uploader.upload(self.file_path, "VIDEO/key.ts")
+
+        self.assertEqual(progress[0], MIN_PART_SIZE)
+        self.assertEqual(sum(progress), stat.st_size)
+
+    def test_failed_part_keeps_completed_parts(self):
+        def upload_part(**kwargs):
+            if kwargs["PartNumber"] == 2:
+                raise ConnectionError("Link lost")
+            return {"ETag": f"etag-{kwargs['PartNumber']}"}
+
+        self.s3_client.upload_part.side_effect = upload_part
+        uploader = MultipartUploader(
+            self.s3_client, "bucket", self.journal, part_size=MIN_PART_SIZE, max_concurrency=1
+        )
+        with self.assertRaises(ConnectionError):
+            uploader.upload(self.file_path, "VIDEO/key.ts")
+
+        completed_parts = self.journal.get_multipart_parts("upload-1")
+        self.assertEqual(completed_parts[1], "etag-1")
+        self.assertNotIn(2, completed_parts)
+        self.s3_client.complete_multipart_upload.assert_not_called()
+
+    def test_restarts_expired_upload(self):
+        stat = os.stat(self.file_path)
+        self.journal.add_multipart_upload(
+            "expired", "VIDEO/key.ts", stat.st_size, stat.st_mtime_ns, MIN_PART_SIZE
+        )
+        self.journal.add_multipart_part("expired", 1, "etag-1")
+        upload_part = self.s3_client.upload_part.side_effect
+
+        def expired_upload_part(**kwargs):
+            if kwargs["UploadId"] == "expired":
+                raise ClientError({"Error": {"Code": "NoSuchUpload"}}, "UploadPart")
+            return upload_part(**kwargs)
+
+        self.s3_client.upload_part.side_effect = expired_upload_part
+        self.uploader.upload(self.file_path, "VIDEO/key.ts")
+
+        self.assertEqual(self.completed_parts()[0]["PartNumber"], 1)
+        self.assertEqual(
+            self.s3_client.complete_multipart_upload.call_args.kwargs["UploadId"], "upload-1"
+        )
+
+    def test_part_size_grows_for_huge_files(self):
+        self.assertEqual(self.uploader.get_part_size(MIN_PART_SIZE * 20000), MIN_PART_SIZE * 2)
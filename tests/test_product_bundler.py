@@ -0,0 +1,138 @@
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+import zipfile
+
+from models.product import Product
+from services.mission_uploader import MissionUploader
+from services.product_bundler import BUNDLE_FILE_PREFIX, ProductBundler
+from services.upload_journal import DONE, UploadJournal
+
+
+class TestProductBundler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.directory.name, "tactical", "Detection"))
+        self.timestamp = datetime(2024, 8, 1, 12, 30, tzinfo=timezone.utc)
+        self.bundles = []
+        self.files = []
+        self.bundler = ProductBundler(
+            self.directory.name,
+            self.get_product_and_key,
+            self.bundles.append,
+            self.files.append,
+            window=60,
+            max_files=3,
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_product_and_key(self, file_path):
+        name = os.path.basename(file_path)
+        if name.endswith(".tif"):
+            return Product("image", "EO", self.timestamp), f"IMAGERY/{name}"
+        return Product("tactical", "Detection", self.timestamp), f"TACTICAL/{name}"
+
+    def write_file(self, name, data=b"<kml/>"):
+        file_path = os.path.join(self.directory.name, "tactical", "Detection", name)
+        with open(file_path, "wb") as file:
+            file.write(data)
+        return file_path
+
+    def test_files_are_bundled_when_the_group_is_full(self):
+        file_paths = [self.write_file(f"detection{index}.kml", b"<kml>%d</kml>" % index) for index in range(3)]
+
+        for file_path in file_paths[:2]:
+            self.assertTrue(self.bundler.add(file_path))
+        self.assertEqual(self.bundles, [])
+        self.assertEqual(self.bundler.pending, 2)
+        self.bundler.add(file_paths[2])
+
+        self.assertEqual(len(self.bundles), 1)
+        bundle = self.bundler.get_bundle(self.bundles[0])
+        self.assertEqual(bundle.key, "TACTICAL/detection0.zip")
+        self.assertEqual([member.path for member in bundle.members], file_paths)
+        with zipfile.ZipFile(bundle.path) as archive:
+            self.assertEqual(archive.read("tactical/Detection/detection1.kml"), b"<kml>1</kml>")
+            manifest = json.loads(archive.read("manifest.json"))
+        self.assertEqual(
+            [entry["key"] for entry in manifest["files"]],
+            ["TACTICAL/detection0.kml", "TACTICAL/detection1.kml", "TACTICAL/detection2.kml"],
+        )
+
+    def test_other_product_types_are_not_bundled(self):
+        self.assertFalse(self.bundler.add(self.write_file("frame.tif")))
+        self.assertEqual(self.bundler.pending, 0)
+
+    def test_stop_bundles_files_still_held(self):
+        self.bundler.start()
+        self.bundler.add(self.write_file("detection.kml"))
+
+        self.bundler.stop()
+
+        self.assertEqual(len(self.bundles), 1)
+        self.assertEqual(self.bundler.pending, 0)
+
+    def test_bundle_upload_marks_its_files_done(self):
+        journal = UploadJournal(self.directory.name)
+        file_manager = MagicMock()
+        uploader = MissionUploader(file_manager, journal, self.get_product_and_key, bundler=self.bundler)
+        file_paths = [self.write_file(f"detection{index}.kml", b"<kml>%d</kml>" % index) for index in range(2)]
+        uploader.prepare_batch(file_paths)
+        for file_path in file_paths:
+            self.bundler.add(file_path)
+        self.bundler.flush()
+        bundle_path = self.bundles[0]
+        uploader.prepare(bundle_path)
+
+        uploader.upload(bundle_path)
+
+        file_manager.upload_file.assert_called_once()
+        self.assertEqual(file_manager.upload_file.call_args.args[:3], (bundle_path, "TACTICAL/detection0.zip", "tactical"))
+        for file_path in file_paths:
+            self.assertEqual(journal.get_state(file_path), DONE)
+        self.assertFalse(os.path.exists(bundle_path))
+        self.assertIsNone(self.bundler.get_bundle(bundle_path))
+        journal.close()
+
+    def test_copies_of_bundled_files_are_skipped_as_those_files(self):
+        journal = UploadJournal(self.directory.name)
+        file_manager = MagicMock()
+        uploader = MissionUploader(file_manager, journal, self.get_product_and_key, bundler=self.bundler)
+        file_paths = [self.write_file(f"detection{index}.kml", b"<kml>%d</kml>" % index) for index in range(2)]
+        uploader.prepare_batch(file_paths)
+        for file_path in file_paths:
+            self.bundler.add(file_path)
+        self.bundler.flush()
+        uploader.prepare(self.bundles[0])
+        uploader.upload(self.bundles[0])
+        copy_path = os.path.join(self.directory.name, "copy.tif")
+        with open(copy_path, "wb") as file:
+            file.write(b"<kml>1</kml>")
+
+        uploader.prepare(copy_path)
+        uploader.upload(copy_path)
+
+        file_manager.upload_file.assert_called_once()
+        self.assertEqual(journal.get_state(copy_path), DONE)
+        self.assertEqual(journal.get_key_for_hash(hashlib.sha256(b"<kml>1</kml>").hexdigest()), "TACTICAL/detection1.kml")
+        journal.close()
+
+    def test_backlog_counts_bundled_files_once(self):
+        journal = UploadJournal(self.directory.name)
+        uploader = MissionUploader(MagicMock(), journal, self.get_product_and_key, bundler=self.bundler)
+        file_paths = [self.write_file(f"detection{index}.kml", b"<kml>%d</kml>" % index) for index in range(2)]
+        uploader.prepare_batch(file_paths)
+        for file_path in file_paths:
+            self.bundler.add(file_path)
+        self.bundler.flush()
+        uploader.prepare(self.bundles[0])
+
+        self.assertEqual(journal.get_backlog()[0], 3)
+        self.assertEqual(journal.get_backlog(BUNDLE_FILE_PREFIX), (2, 24))
+        journal.close()
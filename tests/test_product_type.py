@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+import os
+import unittest
+
+from models.product import Product
+from models.product_type import (
+    PRODUCT_TYPES,
+    classify_mission_folder,
+    get_product_type,
+    get_product_type_for_directory,
+)
+
+
+class TestProductType(unittest.TestCase):
+    def test_classifies_mission_folders(self):
+        self.assertEqual(classify_mission_folder(("images", "IR")).subtype, "IR")
+        self.assertEqual(classify_mission_folder(("images", "EO", "burst1")).subtype, "EO")
+        self.assertEqual(classify_mission_folder(("videos", "camera2")).type, "video")
+        self.assertIsNone(classify_mission_folder(("images",)))
+        self.assertIsNone(classify_mission_folder(("invalid_path",)))
+
+    def test_directory_lookup_skips_users_path(self):
+        directory = os.path.join("images", "missions", "2024_TEST", "tactical", "Detection")
+
+        self.assertEqual(get_product_type_for_directory(directory).subtype, "Detection")
+        self.assertIsNone(get_product_type_for_directory(os.path.join("home", "images", "EO")))
+
+    def test_every_product_type_is_valid_and_round_trips(self):
+        for product_type in PRODUCT_TYPES:
+            product = Product(product_type.type, product_type.subtype, datetime.now(timezone.utc))
+            self.assertIs(get_product_type(product.type, product.subtype), product_type)
+            self.assertIs(classify_mission_folder(product_type.folder), product_type)
+
+    def test_product_is_immutable(self):
+        product = Product("image", "EO", datetime.now(timezone.utc))
+
+        with self.assertRaises(AttributeError):
+            product._type = "video"
+        self.assertEqual(len({product, Product("image", "EO", product.timestamp)}), 1)
+        with self.assertRaises(ValueError):
+            Product("image", "Video", product.timestamp)
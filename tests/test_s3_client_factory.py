@@ -0,0 +1,37 @@
+import unittest
+from unittest.mock import MagicMock
+import threading
+
+from services.s3_client_factory import clear_s3_clients, get_s3_client, warm_up
+
+
+class TestS3ClientFactory(unittest.TestCase):
+    def tearDown(self):
+        clear_s3_clients()
+
+    def test_clients_are_shared_per_account_and_settings(self):
+        client = get_s3_client("key", "secret", max_pool_connections=20)
+
+        self.assertIs(get_s3_client("key", "secret", max_pool_connections=20), client)
+        self.assertIsNot(get_s3_client("other", "secret", max_pool_connections=20), client)
+        self.assertIsNot(get_s3_client("key", "secret", max_pool_connections=5), client)
+
+    def test_client_uses_connection_settings(self):
+        client = get_s3_client(
+            "key", "secret", max_pool_connections=20, connect_timeout=3, read_timeout=30
+        )
+
+        self.assertEqual(client.meta.config.max_pool_connections, 20)
+        self.assertEqual(client.meta.config.connect_timeout, 3)
+        self.assertEqual(client.meta.config.read_timeout, 30)
+        self.assertTrue(client.meta.config.tcp_keepalive)
+
+    def test_warm_up_heads_bucket_in_background(self):
+        s3_client = MagicMock()
+        s3_client.head_bucket.side_effect = ConnectionError("offline")
+
+        thread = warm_up(s3_client, "bucket")
+        thread.join(1)
+
+        self.assertIsInstance(thread, threading.Thread)
+        s3_client.head_bucket.assert_called_once_with(Bucket="bucket")
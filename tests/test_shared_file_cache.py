@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from services.file_digest import digest_bytes
+from services.shared_file_cache import SharedFileCache
+
+
+class TestSharedFileCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = self.write_file("frame.jpg", b"frame data")
+        self.cache = SharedFileCache(2, max_file_size=100, max_bytes=25)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, name, data):
+        file_path = os.path.join(self.directory.name, name)
+        with open(file_path, "wb") as file:
+            file.write(data)
+        return file_path
+
+    def test_file_is_read_once_for_every_reader(self):
+        digests = self.cache.get_digests(self.file_path)
+        self.assertEqual(self.cache.get_digests(self.file_path), digests)
+        self.assertEqual(digests, digest_bytes(b"frame data"))
+
+        self.assertEqual(self.cache.get_data(self.file_path, digests), b"frame data")
+        self.assertEqual(self.cache.get_data(self.file_path, digests), b"frame data")
+
+        self.assertEqual(self.cache.read_count, 1)
+        # Dropped once every reader has it
+        self.assertIsNone(self.cache.get_data(self.file_path, digests))
+        self.assertEqual(self.cache.cached_bytes, 0)
+
+    def test_rewritten_file_is_read_again(self):
+        self.cache.get_digests(self.file_path)
+        os.utime(self.file_path, ns=(0, 0))
+
+        self.cache.get_digests(self.file_path)
+
+        self.assertEqual(self.cache.read_count, 2)
+
+    def test_oldest_contents_are_dropped_to_stay_under_budget(self):
+        digests = self.cache.get_digests(self.file_path)
+        other_path = self.write_file("other.jpg", b"other frame data")
+
+        self.cache.get_digests(other_path)
+
+        self.assertIsNone(self.cache.get_data(self.file_path, digests))
+        self.assertEqual(self.cache.cached_bytes, len(b"other frame data"))
+
+    def test_large_files_are_only_hashed(self):
+        file_path = self.write_file("mosaic.tif", b"x" * 200)
+
+        digests = self.cache.get_digests(file_path)
+
+        self.assertEqual(digests.size, 200)
+        self.assertIsNone(self.cache.get_data(file_path, digests))
+
+    def test_files_made_from_a_file_are_shared(self):
+        made = []
+
+        def make():
+            made.append(True)
+            return b"made"
+
+        self.assertEqual(self.cache.get_derived(self.file_path, "preview", make), b"made")
+        self.assertEqual(self.cache.cached_bytes, 4)
+        self.assertEqual(self.cache.get_derived(self.file_path, "preview", make), b"made")
+
+        self.assertEqual(len(made), 1)
+        self.assertEqual(self.cache.cached_bytes, 0)
+        self.assertIsNone(self.cache.get_derived(self.file_path, "compressed", lambda: None, "gzip"))
+        self.assertIsNone(self.cache.get_derived(self.file_path, "compressed", make, "gzip"))
+        self.assertEqual(len(made), 1)
@@ -0,0 +1,43 @@
+import os
+import statistics
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from benchmarks.startup_benchmark import (
+    STARTUP_BUDGET_SECONDS,
+    get_heavy_modules,
+    measure_startup,
+    parse_importtime,
+)
+
+
+class TestStartup(unittest.TestCase):
+    def test_heavy_dependencies_are_loaded_when_used(self):
+        self.assertEqual(get_heavy_modules("main"), [])
+
+    def test_optional_dependencies_are_loaded_when_used(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Stands in for the optional package, installed or not
+            with open(os.path.join(directory, "zstandard.py"), "w") as file:
+                file.write("")
+            with patch.dict("os.environ", {"PYTHONPATH": directory}):
+                self.assertEqual(get_heavy_modules("main"), [])
+
+    def test_startup_stays_within_budget(self):
+        self.assertLess(statistics.median(measure_startup("main", runs=3)), STARTUP_BUDGET_SECONDS)
+
+    def test_parses_importtime_output(self):
+        import_times = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     json.decoder\n"
+            "import time:       900 |       1020 |   json\n"
+        )
+
+        self.assertEqual([item.module for item in import_times], ["json.decoder", "json"])
+        self.assertEqual((import_times[1].self_us, import_times[1].cumulative_us), (900, 1020))
+        self.assertEqual(import_times[0].depth, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from services.local_file_manager import LocalFileManager
+from services.storage_backend import AsyncStorageBackend
+
+
+class TestStorageBackend(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, "frame.tif")
+        with open(self.file_path, "wb") as file:
+            file.write(b"data")
+        self.backend = LocalFileManager(os.path.join(self.directory.name, "storage"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_local_file_manager_mirrors_keys(self):
+        self.backend.upload_file(self.file_path, "vendor/IMAGERY/frame.tif")
+        self.backend.upload_empty_file("vendor/MISSION/mission.txt")
+
+        with open(self.backend.get_path("vendor/IMAGERY/frame.tif"), "rb") as file:
+            self.assertEqual(file.read(), b"data")
+        self.assertEqual(
+            self.backend.list_keys("vendor/"),
+            {"vendor/IMAGERY/frame.tif", "vendor/MISSION/mission.txt"},
+        )
+        self.assertEqual(self.backend.list_keys("vendor/MISSION/"), {"vendor/MISSION/mission.txt"})
+
+    def test_async_backend_uploads_concurrently(self):
+        async_backend = AsyncStorageBackend(self.backend, max_concurrency=2)
+        uploads = [(self.file_path, f"IMAGERY/{i}.tif", "image") for i in range(5)]
+        uploads.append((os.path.join(self.directory.name, "missing.tif"), "IMAGERY/missing.tif", "image"))
+
+        errors = asyncio.run(async_backend.upload_files(uploads))
+
+        self.assertEqual(errors[:5], [None] * 5)
+        self.assertIsInstance(errors[5], FileNotFoundError)
+        self.assertEqual(len(self.backend.list_keys("IMAGERY/")), 5)
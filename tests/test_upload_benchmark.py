@@ -0,0 +1,136 @@
+import gzip
+from http.client import HTTPConnection
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from urllib.parse import urlparse
+
+from benchmarks.s3_stand_in import S3StandIn
+from benchmarks.upload_benchmark import find_regressions, percentile
+from services.compression import Compressor
+from services.file_digest import digest_bytes
+from services.s3_client_factory import clear_s3_clients
+from services.s3_file_manager import MB, S3FileManager
+from services.shared_file_cache import SharedFileCache
+from services.upload_journal import UploadJournal
+
+
+class TestS3StandIn(unittest.TestCase):
+    def setUp(self):
+        self.stand_in = S3StandIn(keep_data=True).start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_manager = S3FileManager(
+            "key",
+            "secret",
+            "bucket",
+            multipart_threshold=5 * MB,
+            part_size=5 * MB,
+            endpoint_url=self.stand_in.endpoint_url,
+        )
+
+    def tearDown(self):
+        self.stand_in.stop()
+        self.directory.cleanup()
+        clear_s3_clients()
+
+    def write_file(self, name, data):
+        file_path = os.path.join(self.directory.name, name)
+        with open(file_path, "wb") as file:
+            file.write(data)
+        return file_path
+
+    def test_uploads_are_committed(self):
+        data = os.urandom(1000)
+
+        self.file_manager.check_connection()
+        self.file_manager.upload_file(self.write_file("frame.jpg", data), "IMAGERY/frame.jpg")
+
+        self.assertEqual(self.stand_in.objects["IMAGERY/frame.jpg"].data, data)
+        self.assertEqual(
+            self.stand_in.objects["IMAGERY/frame.jpg"].checksum_sha256,
+            digest_bytes(data).sha256_base64,
+        )
+        self.assertEqual(self.file_manager.list_keys("IMAGERY/"), {"IMAGERY/frame.jpg"})
+
+    def test_multipart_uploads_are_assembled(self):
+        data = os.urandom(11 * MB)
+        journal = UploadJournal(self.directory.name)
+        self.file_manager.multipart_store = journal
+
+        self.file_manager.upload_file(self.write_file("mosaic.tif", data), "IMAGERY/mosaic.tif")
+        journal.close()
+
+        self.assertEqual(self.stand_in.objects["IMAGERY/mosaic.tif"].data, data)
+
+    def test_compressed_uploads_are_committed(self):
+        data = b"<Placemark><name>Heat</name></Placemark>" * 1000
+        self.file_manager.compressor = Compressor({"tactical": "gzip"})
+
+        self.file_manager.upload_file(
+            self.write_file("detection.kml", data), "TACTICAL/detection.kml", "tactical"
+        )
+
+        stored = self.stand_in.objects["TACTICAL/detection.kml"]
+        self.assertLess(stored.size, len(data))
+        self.assertEqual(gzip.decompress(stored.data), data)
+
+    def test_shared_files_are_compressed_once(self):
+        data = b"<Placemark><name>Heat</name></Placemark>" * 1000
+        file_path = self.write_file("detection.kml", data)
+        file_cache = SharedFileCache(2, max_file_size=5 * MB, derived_readers={"compressed": 2})
+        self.file_manager.compressor = Compressor({"tactical": "gzip"})
+        self.file_manager.file_cache = file_cache
+
+        with patch.object(
+            Compressor, "compress_fileobj", autospec=True, side_effect=Compressor.compress_fileobj
+        ) as compress_fileobj:
+            for key in ("agency/detection.kml", "archive/detection.kml"):
+                self.file_manager.upload_file(file_path, key, "tactical", file_cache.get_digests(file_path))
+
+        self.assertEqual(compress_fileobj.call_count, 1)
+        self.assertEqual(file_cache.read_count, 1)
+        for key in ("agency/detection.kml", "archive/detection.kml"):
+            self.assertEqual(gzip.decompress(self.stand_in.objects[key].data), data)
+        self.assertEqual(file_cache.cached_bytes, 0)
+
+    def test_corrupted_uploads_are_rejected(self):
+        connection = HTTPConnection(urlparse(self.stand_in.endpoint_url).netloc)
+        connection.request(
+            "PUT",
+            "/bucket/TACTICAL/detection.kml",
+            body=b"<kml/>",
+            headers={"Content-MD5": digest_bytes(b"<kml>").md5_base64},
+        )
+        response = connection.getresponse()
+        connection.close()
+
+        self.assertEqual(response.status, 400)
+        self.assertNotIn("TACTICAL/detection.kml", self.stand_in.objects)
+
+
+class TestUploadBenchmark(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_find_regressions(self):
+        baseline = [{"config": {"uploadWorkers": 4}, "committed": 10, "p95": 1.0, "throughput_mbps": 10.0}]
+        results = [{"config": {"uploadWorkers": 4}, "committed": 10, "p95": 1.5, "throughput_mbps": 9.0}]
+
+        regressions = find_regressions(results, baseline, tolerance=0.2)
+
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("p95", regressions[0])
+
+    def test_engines_are_compared_with_their_own_baseline(self):
+        baseline = [{"config": {}, "committed": 10, "p95": 1.0, "throughput_mbps": 10.0}]
+        results = [{"config": {}, "engine": "async", "committed": 5, "p95": 2.0, "throughput_mbps": 5.0}]
+
+        self.assertEqual(find_regressions(results, baseline, tolerance=0.2), [])
+        baseline[0]["engine"] = "async"
+        self.assertEqual(len(find_regressions(results, baseline, tolerance=0.2)), 3)
+        self.assertTrue(find_regressions(results, baseline, tolerance=0.2)[0].startswith("async {}"))
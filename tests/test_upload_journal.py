@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from services.upload_journal import DONE, FAILED, UPLOADING, UploadJournal, hash_file
+
+
+class TestUploadJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = UploadJournal(self.directory.name)
+        self.file_path = os.path.join(self.directory.name, "images", "EO", "frame.tif")
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    def test_tracks_upload_states(self):
+        self.assertIsNone(self.journal.get_state(self.file_path))
+
+        self.journal.mark_queued(self.file_path, 10, 100)
+        self.journal.mark_uploading(self.file_path)
+        self.assertEqual(self.journal.get_state(self.file_path), UPLOADING)
+
+        self.journal.mark_failed(self.file_path, "Connection reset")
+        self.assertEqual(self.journal.get_state(self.file_path), FAILED)
+
+        self.journal.mark_queued(self.file_path, 10, 100)
+        self.journal.mark_done(self.file_path, "IMAGERY/key.tif", "abc")
+        self.assertEqual(self.journal.get_state(self.file_path), DONE)
+
+    def test_skips_only_the_uploaded_version(self):
+        self.journal.mark_queued(self.file_path, 10, 100)
+        self.journal.mark_done(self.file_path, "IMAGERY/key.tif", "abc")
+
+        self.assertTrue(self.journal.is_uploaded(self.file_path, 10, 100))
+        self.assertFalse(self.journal.is_uploaded(self.file_path, 10, 200))
+        self.assertTrue(self.journal.is_hash_uploaded(self.file_path, "abc"))
+        self.assertFalse(self.journal.is_hash_uploaded(self.file_path, "def"))
+
+    def test_finds_contents_uploaded_by_any_file(self):
+        copy_path = os.path.join(self.directory.name, "images", "EO", "copy.tif")
+        self.journal.mark_queued(self.file_path, 10, 100)
+        self.journal.mark_done(self.file_path, "IMAGERY/key.tif", "abc")
+        self.journal.mark_queued(copy_path, 10, 100)
+        self.journal.mark_duplicate(copy_path, "abc", "IMAGERY/key.tif")
+
+        self.assertEqual(self.journal.get_key_for_hash("abc"), "IMAGERY/key.tif")
+        self.assertIsNone(self.journal.get_key_for_hash("def"))
+        self.assertEqual(self.journal.get_state(copy_path), DONE)
+
+    def test_unfinished_uploads_survive_restart(self):
+        other_path = os.path.join(self.directory.name, "videos", "video.ts")
+        done_path = os.path.join(self.directory.name, "videos", "done.ts")
+        self.journal.mark_queued(self.file_path, 10, 100)
+        self.journal.mark_queued(other_path, 10, 100)
+        self.journal.mark_uploading(other_path)
+        self.journal.mark_queued(done_path, 10, 100)
+        self.journal.mark_done(done_path, "VIDEO/key.ts", "abc")
+        self.journal.close()
+
+        self.journal = UploadJournal(self.directory.name)
+        self.assertEqual(
+            self.journal.get_unfinished_paths(), [self.file_path, other_path]
+        )
+
+    def test_hash_file(self):
+        file_path = os.path.join(self.directory.name, "data.txt")
+        with open(file_path, "wb") as file:
+            file.write(b"abc")
+
+        self.assertEqual(
+            hash_file(file_path, chunk_size=2),
+            "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad",
+        )
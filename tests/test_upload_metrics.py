@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+from urllib.request import urlopen
+
+from services.structured_log import JsonLogFormatter
+from services.upload_metrics import (
+    MetricsRegistry,
+    MetricsServer,
+    MetricsSnapshotWriter,
+)
+
+
+class TestUploadMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+        self.uploads = self.metrics.counter("uploads_total", "Files uploaded")
+        self.duration = self.metrics.histogram("duration_seconds", "Upload time", buckets=(1, 10))
+        self.metrics.gauge("backlog_files", "Files waiting", lambda: 3)
+
+    def test_renders_prometheus_text(self):
+        self.uploads.inc(product_type="image")
+        self.uploads.inc(2, product_type="image")
+        self.duration.observe(0.5, product_type="video")
+        self.duration.observe(5, product_type="video")
+
+        text = self.metrics.render_prometheus()
+
+        self.assertIn("# TYPE uploads_total counter", text)
+        self.assertIn('uploads_total{product_type="image"} 3', text)
+        self.assertIn('duration_seconds_bucket{product_type="video",le="1"} 1', text)
+        self.assertIn('duration_seconds_bucket{product_type="video",le="10"} 2', text)
+        self.assertIn('duration_seconds_bucket{product_type="video",le="+Inf"} 2', text)
+        self.assertIn('duration_seconds_count{product_type="video"} 2', text)
+        self.assertIn("backlog_files 3.0", text)
+
+    def test_writes_json_snapshot(self):
+        self.uploads.inc(product_type="tactical")
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "metrics.json")
+            MetricsSnapshotWriter(self.metrics, file_path).write()
+
+            with open(file_path) as file:
+                snapshot = json.load(file)
+
+        self.assertEqual(
+            snapshot["metrics"]["uploads_total"]["values"],
+            [{"labels": {"product_type": "tactical"}, "value": 1}],
+        )
+        self.assertEqual(snapshot["metrics"]["backlog_files"]["values"][0]["value"], 3)
+
+    def test_serves_metrics(self):
+        server = MetricsServer(self.metrics, 0)
+        server.start()
+        try:
+            with urlopen(server.url) as response:
+                text = response.read().decode()
+        finally:
+            server.stop()
+
+        self.assertIn("backlog_files 3.0", text)
+
+    def test_json_log_lines_include_fields(self):
+        record = logging.LogRecord("airborne_dsa", logging.INFO, "", 0, "upload.done", None, None)
+        record.fields = {"correlation_id": "abc", "size": 4}
+
+        entry = json.loads(JsonLogFormatter().format(record))
+
+        self.assertEqual(entry["event"], "upload.done")
+        self.assertEqual(entry["correlation_id"], "abc")
+        self.assertEqual(entry["level"], "info")
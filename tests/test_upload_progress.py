@@ -0,0 +1,134 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from services.progress_reporter import ProgressReporter, StatusConsole, format_status
+from services.upload_progress import FileProgress, ProgressFile, ProgressSnapshot, UploadProgress
+
+
+class TestProgressFile(unittest.TestCase):
+    def test_bytes_read_again_after_a_seek_are_counted_once(self):
+        counts = []
+        file = ProgressFile(io.BytesIO(b"0123456789"), counts.append)
+
+        file.read(4)
+        file.seek(0)
+        file.read(6)
+        file.read()
+
+        self.assertEqual(counts, [4, 2, 4])
+        self.assertEqual(sum(counts), 10)
+
+
+class TestUploadProgress(unittest.TestCase):
+    @patch("services.upload_progress.time.monotonic")
+    def test_rate_and_time_left(self, monotonic):
+        monotonic.return_value = 100.0
+        progress = UploadProgress(smoothing_seconds=30)
+        progress.sample(2, 3000)
+
+        with progress.track("/mission/IMAGERY/mosaic.tif", 2000) as upload:
+            upload.add(500)
+            monotonic.return_value = 110.0
+            snapshot = progress.sample(2, 3000)
+
+        self.assertEqual(snapshot.rate, 50.0)
+        self.assertEqual(snapshot.smoothed_rate, 50.0)
+        # The bytes already sent of the file in flight aren't left to send
+        self.assertEqual(snapshot.backlog_bytes, 2500)
+        self.assertEqual(snapshot.eta_seconds, 50.0)
+        self.assertEqual(
+            snapshot.files, [FileProgress("/mission/IMAGERY/mosaic.tif", 500, 2000, 50.0, 30.0)]
+        )
+
+    @patch("services.upload_progress.time.monotonic")
+    def test_stalls_are_smoothed(self, monotonic):
+        monotonic.return_value = 0.0
+        progress = UploadProgress(smoothing_seconds=30)
+        progress.sample(1, 10000)
+        with progress.track("/mission/VIDEO/flight.ts", 10000) as upload:
+            upload.add(1000)
+            monotonic.return_value = 10.0
+            progress.sample(1, 10000)
+            monotonic.return_value = 11.0
+            snapshot = progress.sample(1, 10000)
+
+        self.assertEqual(snapshot.rate, 0.0)
+        self.assertGreater(snapshot.smoothed_rate, 90.0)
+        self.assertIsNotNone(snapshot.eta_seconds)
+
+    def test_shared_uploads_drain_at_their_combined_rate(self):
+        first = ProgressSnapshot(smoothed_rate=100.0, backlog_files=1, backlog_bytes=1000, eta_seconds=10.0)
+        second = ProgressSnapshot(smoothed_rate=100.0, backlog_files=1, backlog_bytes=3000, eta_seconds=30.0)
+
+        self.assertEqual(ProgressSnapshot.combine({"a": first, "b": second}).eta_seconds, 30.0)
+        combined = ProgressSnapshot.combine({"a": first, "b": second}, shared=True)
+        self.assertEqual(combined.eta_seconds, 20.0)
+        self.assertEqual(combined.backlog_files, 2)
+        self.assertEqual(combined.to_dict()["parts"]["b"]["backlog_bytes"], 3000)
+
+
+class TestProgressReporter(unittest.TestCase):
+    def test_status_line(self):
+        snapshot = ProgressSnapshot(
+            rate=262144.0,
+            smoothed_rate=131072.0,
+            backlog_files=12,
+            backlog_bytes=3 * 1024**3,
+            eta_seconds=14700.0,
+            files=[
+                FileProgress("/mission/IMAGERY/mosaic.tif", 450, 1000, 10.0, 55.0),
+                FileProgress("/mission/TACTICAL/perimeter.kml", 90, 100, 10.0, 1.0),
+            ],
+        )
+
+        self.assertEqual(
+            format_status(snapshot),
+            "2.1 Mbit/s (avg 1.0) | mosaic.tif 45% +1 | 12 files, 3.0 GB left | ETA 4h05m",
+        )
+
+    def test_printed_lines_go_above_the_status_line(self):
+        stream = io.StringIO()
+        console = StatusConsole(stream)
+
+        console.set_status("ETA 5s")
+        print("Uploading mosaic.tif", file=console)
+        console.clear_status()
+
+        self.assertEqual(stream.getvalue(), "\r\033[KETA 5s\r\033[KUploading mosaic.tif\nETA 5s\r\033[K")
+
+    def test_printing_goes_through_the_console_until_stopped(self):
+        stream = io.StringIO()
+        stdout = sys.stdout
+        reporter = ProgressReporter(
+            MagicMock(return_value=ProgressSnapshot()), console=StatusConsole(stream), interval=60
+        )
+
+        reporter.start()
+        try:
+            print("Uploading mosaic.tif")
+        finally:
+            reporter.stop()
+
+        self.assertIs(sys.stdout, stdout)
+        self.assertIn("Uploading mosaic.tif\n", stream.getvalue())
+
+    def test_writes_the_status_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "status.json")
+            sample = MagicMock(return_value=ProgressSnapshot(backlog_files=1, backlog_bytes=10))
+
+            ProgressReporter(sample, file_path=file_path).report()
+
+            with open(file_path) as file:
+                status = json.load(file)
+        self.assertEqual(status["backlog_bytes"], 10)
+        self.assertIn("time", status)
+
+
+if __name__ == "__main__":
+    unittest.main()
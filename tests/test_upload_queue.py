@@ -0,0 +1,112 @@
+import threading
+import time
+import unittest
+
+from services.upload_queue import UploadQueue
+from services.upload_retry import RetryUpload
+
+
+class TestUploadQueue(unittest.TestCase):
+    def test_uploads_every_queued_file_before_shutdown(self):
+        uploaded = []
+        lock = threading.Lock()
+
+        def handler(file_path):
+            time.sleep(0.01)
+            with lock:
+                uploaded.append(file_path)
+
+        upload_queue = UploadQueue(handler, worker_count=3, max_size=5)
+        upload_queue.start()
+        for i in range(20):
+            upload_queue.put(f"file_{i}")
+        upload_queue.shutdown()
+
+        self.assertCountEqual(uploaded, [f"file_{i}" for i in range(20)])
+
+    def test_slow_upload_does_not_block_other_workers(self):
+        release = threading.Event()
+        fast_done = threading.Event()
+
+        def handler(file_path):
+            if file_path == "slow":
+                release.wait(5)
+            else:
+                fast_done.set()
+
+        upload_queue = UploadQueue(handler, worker_count=2)
+        upload_queue.start()
+        upload_queue.put("slow")
+        upload_queue.put("fast")
+
+        self.assertTrue(fast_done.wait(2))
+        release.set()
+        upload_queue.shutdown()
+
+    def test_put_blocks_while_queue_is_full(self):
+        release = threading.Event()
+        upload_queue = UploadQueue(lambda _: release.wait(5), worker_count=1, max_size=1)
+        upload_queue.start()
+        upload_queue.put("in_flight")
+        time.sleep(0.1)
+        upload_queue.put("queued")
+
+        producer = threading.Thread(target=upload_queue.put, args=("blocked",))
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive())
+
+        release.set()
+        producer.join(2)
+        self.assertFalse(producer.is_alive())
+        upload_queue.shutdown()
+
+    def test_shutdown_without_drain_discards_queued_files(self):
+        release = threading.Event()
+        uploaded = []
+
+        def handler(file_path):
+            release.wait(5)
+            uploaded.append(file_path)
+
+        upload_queue = UploadQueue(handler, worker_count=1)
+        upload_queue.start()
+        upload_queue.put("in_flight")
+        time.sleep(0.1)
+        upload_queue.put("queued")
+
+        threading.Timer(0.1, release.set).start()
+        upload_queue.shutdown(drain=False)
+
+        self.assertEqual(uploaded, ["in_flight"])
+        with self.assertRaises(RuntimeError):
+            upload_queue.put("late")
+
+    def test_retry_upload_queues_file_again(self):
+        attempts = []
+
+        def handler(file_path):
+            attempts.append(file_path)
+            if len(attempts) == 1:
+                raise RetryUpload(0.05)
+
+        upload_queue = UploadQueue(handler, worker_count=1)
+        upload_queue.start()
+        upload_queue.put("flaky")
+        time.sleep(0.3)
+        upload_queue.shutdown()
+
+        self.assertEqual(attempts, ["flaky", "flaky"])
+
+    def test_paused_queue_holds_files_until_resumed(self):
+        uploaded = []
+        upload_queue = UploadQueue(uploaded.append, worker_count=1)
+        upload_queue.pause()
+        upload_queue.start()
+        upload_queue.put("spooled")
+        time.sleep(0.2)
+        self.assertEqual(uploaded, [])
+
+        upload_queue.resume()
+        upload_queue.shutdown()
+        self.assertEqual(uploaded, ["spooled"])
@@ -0,0 +1,68 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from services.upload_retry import (
+    ConnectivityMonitor,
+    RetryPolicy,
+    is_connectivity_error,
+    is_transient_error,
+)
+
+
+def client_error(code, status=400):
+    return ClientError(
+        {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        "PutObject",
+    )
+
+
+class TestUploadRetry(unittest.TestCase):
+    def test_classifies_errors(self):
+        offline = EndpointConnectionError(endpoint_url="https://s3.amazonaws.com")
+        self.assertTrue(is_connectivity_error(offline))
+        self.assertTrue(is_transient_error(offline))
+
+        self.assertTrue(is_transient_error(client_error("SlowDown", 503)))
+        self.assertTrue(is_transient_error(client_error("Unknown", 500)))
+        self.assertFalse(is_connectivity_error(client_error("SlowDown", 503)))
+
+        self.assertFalse(is_transient_error(client_error("AccessDenied", 403)))
+        self.assertFalse(is_transient_error(ValueError("Failed to map product")))
+
+    def test_classifies_wrapped_errors(self):
+        try:
+            try:
+                raise client_error("RequestTimeout")
+            except ClientError as error:
+                raise S3UploadFailedError(f"Failed to upload: {error}")
+        except S3UploadFailedError as wrapped:
+            self.assertTrue(is_transient_error(wrapped))
+
+    def test_backoff_is_capped_exponential_with_jitter(self):
+        policy = RetryPolicy(base_delay=1, max_delay=10)
+        for attempt, cap in [(1, 1), (3, 4), (10, 10)]:
+            delays = [policy.get_delay(attempt) for _ in range(100)]
+            self.assertTrue(all(0 <= delay <= cap for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_connectivity_monitor_probes_until_online(self):
+        check = MagicMock(
+            side_effect=[EndpointConnectionError(endpoint_url="url"), None]
+        )
+        on_offline = MagicMock()
+        online = threading.Event()
+        monitor = ConnectivityMonitor(
+            check, on_offline, online.set, RetryPolicy(base_delay=0.01)
+        )
+
+        monitor.report_offline()
+        monitor.report_offline()
+
+        self.assertTrue(online.wait(2))
+        on_offline.assert_called_once()
+        self.assertEqual(check.call_count, 2)
+        self.assertFalse(monitor.offline)
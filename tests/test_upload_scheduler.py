@@ -0,0 +1,46 @@
+import queue
+import time
+import unittest
+
+from services.upload_scheduler import UploadScheduler
+
+
+def classify(file_path):
+    return file_path.split("/")[0] if "/" in file_path else None
+
+
+class TestUploadScheduler(unittest.TestCase):
+    def test_serves_tactical_before_imagery_before_video(self):
+        scheduler = UploadScheduler(classify)
+        for file_path in ["video/1.ts", "image/1.tif", "unknown", "tactical/1.kml", "image/2.tif"]:
+            scheduler.put(file_path)
+
+        served = [scheduler.get_nowait() for _ in range(5)]
+        self.assertEqual(
+            served, ["tactical/1.kml", "image/1.tif", "image/2.tif", "video/1.ts", "unknown"]
+        )
+
+    def test_configured_weights_override_defaults(self):
+        scheduler = UploadScheduler(classify, weights={"video": 1000})
+        scheduler.put("tactical/1.kml")
+        scheduler.put("video/1.ts")
+
+        self.assertEqual(scheduler.get_nowait(), "video/1.ts")
+
+    def test_starving_file_is_served_first(self):
+        scheduler = UploadScheduler(classify, starvation_seconds=0.05)
+        scheduler.put("video/1.ts")
+        time.sleep(0.1)
+        scheduler.put("tactical/1.kml")
+
+        self.assertEqual(scheduler.get_nowait(), "video/1.ts")
+
+    def test_put_raises_full_when_bounded(self):
+        scheduler = UploadScheduler(classify, max_size=1)
+        scheduler.put("image/1.tif")
+
+        with self.assertRaises(queue.Full):
+            scheduler.put("image/2.tif", timeout=0.05)
+        scheduler.get_nowait()
+        with self.assertRaises(queue.Empty):
+            scheduler.get(timeout=0.05)